@@ -4,7 +4,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from werkzeug.exceptions import RequestEntityTooLarge
+from datetime import date, datetime
 import os
 import logging
 
@@ -12,32 +13,40 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configurar TensorFlow antes de importarlo
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+import importlib
+import importlib.util
+import base64
+import hmac
+import json
+import signal
+import sys
 
-# Importar librerias de tensorflow y keras especificas como en el ejemplo
-try:
-    from tensorflow.keras.preprocessing.image import img_to_array
-    from tensorflow.keras.models import load_model
-    import numpy as np
-    import cv2
-    import time
-    import base64
-    TENSORFLOW_AVAILABLE = True
-    logger.info("TensorFlow cargado correctamente")
-except ImportError as e:
-    logger.error(f"TensorFlow no disponible: {e}")
-    TENSORFLOW_AVAILABLE = False
-    import numpy as np
-    import cv2
-    import time
-    import base64
-
-from models import db, Psicologo, Paciente, Sesion, EmocionDetectada, PasswordResetToken
+from models import (
+    db, enable_emotion_codes, enable_raise_on_lazy_load, Psicologo, Paciente, Sesion, EmocionDetectada, EmocionResumenDiario,
+    PasswordResetToken, SesionTimeline
+)
 from config import Config
-from auth_utils import generate_token, token_required, get_current_psicologo
+from auth_utils import (
+    auth_cache, authenticate, configure_auth, generate_token, token_required, get_current_psicologo,
+    load_current_psicologo
+)
 from email_service import email_service
+from streaming import receive_auth, send_json, serve_stream, stream_stats
+from session_recording import EmotionWriteBuffer, RecordSampler, dominant_emotion, validate_emotion_batch
+import emotion_rollups
+from emotion_labels import EMOTION_CODES
+from emotion_partitions import EmotionPartitions, PartitionDetachedError
+from list_queries import ListParamsError, ListSpec
+
+# Canal WebSocket de sesiones en vivo (flask-sock es opcional)
+try:
+    from flask_sock import Sock
+    STREAMING_AVAILABLE = True
+except ImportError:
+    STREAMING_AVAILABLE = False
+
+# Disponibilidad de TensorFlow (se verifica sin importarlo)
+TENSORFLOW_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
 
 app = Flask(__name__)
 # Configuración simplificada de CORS para permitir todo durante desarrollo
@@ -50,9 +59,21 @@ app.config['SQLALCHEMY_DATABASE_URI'] = Config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = Config.SQLALCHEMY_TRACK_MODIFICATIONS
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 app.config['JWT_SECRET_KEY'] = Config.JWT_SECRET_KEY
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
 
 # Inicializar la base de datos
 db.init_app(app)
+if Config.DB_RAISE_ON_LAZY_LOAD:
+    enable_raise_on_lazy_load()
+if Config.EMOTIONS_PARTITIONED:
+    enable_emotion_codes()
+
+# Autenticación sin consulta a la base de datos por request (ver AuthCache)
+configure_auth(
+    principal_ttl_s=Config.AUTH_PRINCIPAL_CACHE_TTL_S,
+    token_memo_size=Config.AUTH_TOKEN_MEMO_SIZE,
+    stateless=Config.AUTH_STATELESS
+)
 
 # Configurar servicio de email
 if Config.EMAIL_SENDER and Config.EMAIL_PASSWORD:
@@ -70,124 +91,51 @@ limiter = Limiter(
     strategy="fixed-window"
 )
 
-# Tipos de emociones del detector
-classes = ['angry','disgust','fear','happy','neutral','sad','surprise']
-
-# Cargamos el modelo de detección de rostros
-prototxtPath = os.path.join(Config.FACE_DETECTOR_PATH, "deploy.prototxt")
-weightsPath = os.path.join(Config.FACE_DETECTOR_PATH, "res10_300x300_ssd_iter_140000.caffemodel")
-
-# Verificar que los archivos existen
-faceNet = None
-emotionModel = None
-
-# Cargar modelos de forma asíncrona para evitar bloqueos
-def load_models():
-    global faceNet, emotionModel
-    if TENSORFLOW_AVAILABLE:
-        try:
-            if os.path.exists(prototxtPath) and os.path.exists(weightsPath):
-                faceNet = cv2.dnn.readNet(prototxtPath, weightsPath)
-                logger.info("Modelo de detección de rostros cargado correctamente")
-            else:
-                logger.warning("Archivos de detección de rostros no encontrados")
-            
-            if os.path.exists(Config.MODEL_PATH):
-                logger.info("Cargando modelo de emociones...")
-                emotionModel = load_model(Config.MODEL_PATH)
-                logger.info("Modelo de emociones cargado correctamente")
-            else:
-                logger.warning("Modelo de emociones no encontrado")
-        except Exception as e:
-            logger.error(f"Error cargando modelos: {e}")
-            faceNet = None
-            emotionModel = None
-
-# Cargar modelos en un hilo separado
-import threading
-model_thread = threading.Thread(target=load_models, daemon=True)
-model_thread.start()
-
-# La lógica de predict_emotion adaptada para el backend
-def process_image_for_emotion(frame, faceNet, emotionModel):
-    """Procesa una imagen para detectar emociones en rostros"""
-    if faceNet is None or emotionModel is None:
-        return [{'error': 'Modelos de IA no disponibles'}]
-    # Construye un blob de la imagen para el detector de rostros
-    # El ejemplo usa 224x224 para el blob del detector de rostros
-    blob = cv2.dnn.blobFromImage(frame, 1.0, (224, 224), (104.0, 177.0, 123.0))
-
-    # Realiza las detecciones de rostros
-    faceNet.setInput(blob)
-    detections = faceNet.forward()
-
-    emotion_results = []
-	
-    # Recorre cada una de las detecciones
-    for i in range(0, detections.shape[2]):
-        # Fija un umbral de confianza (usando 0.3 como en el ejemplo)
-        confidence = detections[0, 0, i, 2]
-
-        if confidence > 0.3: # Usando el umbral más bajo que probamos
-            # Toma el bounding box escalado
-            (h, w) = frame.shape[:2]
-            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-            (Xi, Yi, Xf, Yf) = box.astype("int")
-
-            # Valida las dimensiones
-            if Xi < 0: Xi = 0
-            if Yi < 0: Yi = 0
-            if Xf > w: Xf = w
-            if Yf > h: Yf = h
-
-            # Extrae el rostro
-            face = frame[Yi:Yf, Xi:Xf]
-
-            # Asegurarse de que la región del rostro no esté vacía
-            if face.shape[0] == 0 or face.shape[1] == 0:
-                continue 
-
-            # Se convierte BGR a GRAY y se escala a 48x48 como en el ejemplo
-            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-            face = cv2.resize(face, (48, 48))
-            
-            # Preparar el array para el modelo de emociones usando img_to_array y expand_dims
-            face2 = img_to_array(face)
-            face2 = np.expand_dims(face2,axis=0)
+# Rol del proceso: 'api' (pacientes, sesiones, estadísticas), 'inference' (predicciones)
+# o 'both'. Solo los procesos que atienden predicciones importan el stack de inferencia
+# (OpenCV, NumPy, runtime del modelo) y cargan los modelos, una sola vez por proceso.
+SERVES_INFERENCE = Config.PROCESS_ROLE in ('inference', 'both')
+inference = None
+if SERVES_INFERENCE:
+    inference = importlib.import_module('inference')
+    inference.start()
 
-            # Realizar la predicción de emociones
-            pred = emotionModel.predict(face2)
-            
-            # Procesar la predicción para obtener confianza y resultados por clase
-            predicted_class = np.argmax(pred[0])
-            confidence = float(pred[0][predicted_class]) # Confianza de la emoción predicha
-
-            # Guardar el resultado para este rostro
-            emotion_results.append({
-                'box': [int(Xi), int(Yi), int(Xf), int(Yf)], # Coordenadas del bounding box (opcional en frontend)
-                'emotion': classes[predicted_class],
-                'confidence': confidence,
-                'all_predictions': {
-                    class_name: float(p) 
-                    for class_name, p in zip(classes, pred[0])
-                }
-            })
+# Endpoints de predicción y endpoints que atiende cualquier rol
+PREDICTION_ENDPOINTS = {'predict', 'predict_frame', 'predict_sesion', 'stream_sesion', 'reload_models'}
+SHARED_ENDPOINTS = {'get_status', 'health_check', 'readiness_check', 'test_cors'}
 
-    return emotion_results
+@app.before_request
+def enforce_process_role():
+    """Restringe los endpoints según PROCESS_ROLE"""
+    if Config.PROCESS_ROLE == 'both' or request.endpoint is None or request.endpoint in SHARED_ENDPOINTS:
+        return None
+    if request.endpoint in PREDICTION_ENDPOINTS:
+        if not SERVES_INFERENCE:
+            return jsonify({'error': 'Este proceso no atiende predicciones (PROCESS_ROLE=api)'}), 503
+    elif Config.PROCESS_ROLE == 'inference':
+        return jsonify({'error': 'Endpoint no disponible en un proceso de inferencia'}), 404
+    return None
 
 # Endpoint para verificar estado del sistema
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Endpoint para verificar el estado del sistema"""
     try:
-        models_loaded = faceNet is not None and emotionModel is not None
-        return jsonify({
+        status = {
             'status': 'running',
-            'tensorflow_available': TENSORFLOW_AVAILABLE,
-            'models_loaded': models_loaded,
-            'face_detector_loaded': faceNet is not None,
-            'emotion_model_loaded': emotionModel is not None
-        }), 200
+            'process_role': Config.PROCESS_ROLE,
+            'tensorflow_available': TENSORFLOW_AVAILABLE
+        }
+        if inference is not None:
+            status.update(inference.get_status())
+        status['emotion_buffer'] = emotion_buffer.get_stats() if emotion_buffer is not None else {'enabled': False}
+        status['auth_cache'] = auth_cache.get_stats()
+        status['streaming'] = {
+            'available': STREAMING_AVAILABLE,
+            'enabled': SERVES_INFERENCE and STREAMING_AVAILABLE and Config.STREAMING_ENABLED,
+            'stats': stream_stats.get_stats()
+        }
+        return jsonify(status), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -199,12 +147,18 @@ def health_check():
         # Verificar conexión a base de datos
         db.session.execute(db.text('SELECT 1'))
         
-        return jsonify({
+        health = {
             'status': 'healthy',
             'database': 'connected',
+            'process_role': Config.PROCESS_ROLE,
             'tensorflow': 'available' if TENSORFLOW_AVAILABLE else 'unavailable',
-            'models': 'loaded' if (faceNet is not None and emotionModel is not None) else 'loading'
-        }), 200
+            'inference_backend': 'disabled',
+            'models': 'disabled'
+        }
+        if inference is not None:
+            health['inference_backend'] = Config.INFERENCE_BACKEND if inference.INFERENCE_AVAILABLE else 'unavailable'
+            health['models'] = 'loaded' if inference.models_ready() else 'loading'
+        return jsonify(health), 200
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return jsonify({
@@ -212,6 +166,49 @@ def health_check():
             'error': str(e)
         }), 503
 
+# Readiness: solo recibe tráfico el proceso con los modelos cargados y calentados
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Responde 200 cuando el proceso puede atender su rol (503 mientras los modelos cargan)"""
+    if inference is None:
+        return jsonify({'ready': True, 'process_role': Config.PROCESS_ROLE}), 200
+    ready = inference.models_ready()
+    body = {'ready': ready, 'process_role': Config.PROCESS_ROLE, 'models': inference.get_status()['models']}
+    return jsonify(body), 200 if ready else 503
+
+# Recarga en caliente de los modelos (nueva versión cargada junto a la vigente). Bajo /predict
+# para que nginx la envíe al proceso de inferencia, que es el que tiene los modelos
+@app.route('/predict/modelos/recargar', methods=['POST'])
+@limiter.limit("5 per minute")
+def reload_models():
+    """Carga una nueva versión de los modelos y la publica sin reiniciar el proceso"""
+    if not Config.MODEL_ADMIN_TOKEN:
+        return jsonify({'error': 'Recarga de modelos deshabilitada (MODEL_ADMIN_TOKEN no definido)'}), 404
+    provided = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(provided.encode(), Config.MODEL_ADMIN_TOKEN.encode()):
+        return jsonify({'error': 'Token de administración inválido'}), 401
+
+    data = request.get_json(silent=True) or {}
+    model_path = data.get('model_path')
+    if model_path:
+        # Solo se aceptan archivos dentro del directorio de la aplicación
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        model_path = os.path.realpath(os.path.join(base_dir, model_path))
+        if os.path.commonpath([base_dir, model_path]) != base_dir:
+            return jsonify({'error': 'model_path debe estar dentro del directorio de la aplicación'}), 400
+    backend = data.get('backend')
+    if backend is not None and backend not in ('keras', 'tflite', 'onnx'):
+        return jsonify({'error': "backend debe ser 'keras', 'tflite' u 'onnx'"}), 400
+
+    try:
+        loaded = inference.reload_models(model_path=model_path, backend=backend, version=data.get('version'))
+    except Exception as e:
+        logger.error(f"Recarga de modelos fallida: {e}")
+        return jsonify({'error': f'No se pudo cargar la nueva versión: {e}'}), 500
+
+    logger.info(f"Modelos recargados: {loaded}")
+    return jsonify({'message': 'Modelos recargados', 'models': loaded}), 200
+
 # Endpoint para registro de psicólogos
 @app.route('/api/register', methods=['POST'])
 @limiter.limit("5 per hour")  # Máximo 5 registros por hora
@@ -281,7 +278,7 @@ def login_psicologo():
         
         if psicologo and psicologo.check_password(password):
             # Generar token JWT
-            token = generate_token(psicologo.id)
+            token = generate_token(psicologo.id, psicologo.nombre_usuario)
             if token:
                 logger.info(f"Login exitoso para: {psicologo.email}")
                 return jsonify({
@@ -463,12 +460,14 @@ def get_psicologo(psicologo_id):
 def actualizar_psicologo(psicologo_id):
     """Actualizar datos del psicólogo"""
     try:
-        psicologo = get_current_psicologo()
-        
         # Verificar que el psicólogo solo pueda actualizar sus propios datos
-        if psicologo.id != psicologo_id:
+        if get_current_psicologo().id != psicologo_id:
             return jsonify({'error': 'No autorizado para actualizar estos datos'}), 403
         
+        psicologo = load_current_psicologo()
+        if not psicologo:
+            return jsonify({'error': 'Usuario no encontrado'}), 404
+        
         data = request.get_json()
         logger.info(f"Actualizando psicólogo {psicologo_id} con datos: {data}")
         
@@ -507,12 +506,14 @@ def actualizar_psicologo(psicologo_id):
 def cambiar_password_psicologo(psicologo_id):
     """Cambiar contraseña del psicólogo"""
     try:
-        psicologo = get_current_psicologo()
-        
         # Verificar que el psicólogo solo pueda cambiar su propia contraseña
-        if psicologo.id != psicologo_id:
+        if get_current_psicologo().id != psicologo_id:
             return jsonify({'error': 'No autorizado'}), 403
         
+        psicologo = load_current_psicologo()
+        if not psicologo:
+            return jsonify({'error': 'Usuario no encontrado'}), 404
+        
         data = request.get_json()
         
         if not data.get('current_password') or not data.get('new_password'):
@@ -609,32 +610,50 @@ def crear_paciente():
         return jsonify({'error': str(e)}), 500
 
 # Endpoint para obtener pacientes de un psicólogo
+def edad_desde(fecha_nacimiento, today=None):
+    """Edad cumplida a la fecha de hoy"""
+    today = today or date.today()
+    return today.year - fecha_nacimiento.year - ((today.month, today.day) < (fecha_nacimiento.month, fecha_nacimiento.day))
+
+# Campos de los listados (?fields=) y su orden estable para la paginación por cursor
+PACIENTE_LIST = ListSpec(
+    columns={
+        'id': Paciente.id,
+        'nombre_completo': Paciente.nombre_completo,
+        'fecha_nacimiento': Paciente.fecha_nacimiento,
+        'telefono': Paciente.telefono,
+        'email': Paciente.email,
+        'genero': Paciente.genero,
+        'psicologo_id': Paciente.psicologo_id,
+        'fecha_registro': Paciente.fecha_registro
+    },
+    computed={
+        'edad': (['fecha_nacimiento'], lambda row: edad_desde(row['fecha_nacimiento']))
+    },
+    sort=['id']
+)
+
+def list_response(key, spec, query_factory):
+    """Respuesta de un listado: completo por defecto, o la página pedida con limit/cursor
+    (incluye siguiente_cursor) y solo los campos de fields"""
+    try:
+        params = spec.parse(request.args, Config.LIST_DEFAULT_PAGE_SIZE, Config.LIST_MAX_PAGE_SIZE)
+    except ListParamsError as e:
+        return jsonify({'error': str(e)}), 400
+    items, next_cursor = spec.fetch(query_factory, params)
+    body = {key: items}
+    if params.paginated:
+        body['siguiente_cursor'] = next_cursor
+    return jsonify(body), 200
+
 @app.route('/api/pacientes/psicologo/<int:psicologo_id>', methods=['GET'])
 @token_required
 def get_pacientes_psicologo(psicologo_id):
+    """Pacientes del psicólogo con su edad. Parámetros opcionales: fields, limit, cursor"""
     try:
-        pacientes = Paciente.query.filter_by(psicologo_id=psicologo_id).all()
-        
-        # Agregar edad y género calculados a cada paciente
-        from datetime import date
-        today = date.today()
-        
-        pacientes_con_datos = []
-        for paciente in pacientes:
-            paciente_dict = paciente.to_dict()
-            
-            # Calcular edad desde fecha_nacimiento
-            birth_date = datetime.strptime(paciente_dict['fecha_nacimiento'], '%Y-%m-%d').date()
-            edad = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-            
-            paciente_dict['edad'] = edad
-            # El género ya viene del to_dict() del modelo
-            
-            pacientes_con_datos.append(paciente_dict)
-        
-        return jsonify({
-            'pacientes': pacientes_con_datos
-        }), 200
+        return list_response('pacientes', PACIENTE_LIST, lambda columns: db.session.query(*columns).filter(
+            Paciente.psicologo_id == psicologo_id
+        ))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -709,6 +728,7 @@ def eliminar_paciente(paciente_id):
         if paciente.psicologo_id != psicologo.id:
             return jsonify({'error': 'No tienes permiso para eliminar este paciente'}), 403
         
+        flush_emotion_buffer()
         db.session.delete(paciente)
         db.session.commit()
         
@@ -747,26 +767,25 @@ def get_paciente(paciente_id):
         return jsonify({'error': str(e)}), 500
 
 # Endpoint para obtener todos los psicólogos
+PSICOLOGO_LIST = ListSpec(
+    columns={
+        'id': Psicologo.id,
+        'nombre_completo': Psicologo.nombre_completo,
+        'cedula_profesional': Psicologo.cedula_profesional,
+        'especializacion': Psicologo.especializacion,
+        'telefono': Psicologo.telefono,
+        'email': Psicologo.email,
+        'nombre_usuario': Psicologo.nombre_usuario,
+        'fecha_registro': Psicologo.fecha_registro
+    },
+    sort=['id']
+)
+
 @app.route('/api/psicologos', methods=['GET'])
 def get_psicologos():
+    """Psicólogos registrados. Parámetros opcionales: fields, limit, cursor"""
     try:
-        psicologos = Psicologo.query.all()
-        psicologos_data = []
-        for psicologo in psicologos:
-            psicologos_data.append({
-                'id': psicologo.id,
-                'nombre_completo': psicologo.nombre_completo,
-                'cedula_profesional': psicologo.cedula_profesional,
-                'especializacion': psicologo.especializacion,
-                'telefono': psicologo.telefono,
-                'email': psicologo.email,
-                'nombre_usuario': psicologo.nombre_usuario,
-                'fecha_registro': psicologo.fecha_registro.isoformat()
-            })
-        
-        return jsonify({
-            'psicologos': psicologos_data
-        }), 200
+        return list_response('psicologos', PSICOLOGO_LIST, lambda columns: db.session.query(*columns))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -819,73 +838,213 @@ def crear_sesion():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+SESION_LIST = ListSpec(
+    columns={
+        'id': Sesion.id,
+        'paciente_id': Sesion.paciente_id,
+        'psicologo_id': Sesion.psicologo_id,
+        'fecha_sesion': Sesion.fecha_sesion,
+        'duracion_minutos': Sesion.duracion_minutos,
+        'notas': Sesion.notas,
+        'emocion_predominante': Sesion.emocion_predominante,
+        'confianza_promedio': Sesion.confianza_promedio,
+        '_paciente_nombre': Paciente.nombre_completo
+    },
+    computed={
+        'paciente_nombre': (['_paciente_nombre'], lambda row: row['_paciente_nombre'] or 'Paciente no encontrado')
+    },
+    sort=['fecha_sesion', 'id'],
+    descending=True,
+    # Sesiones sin fecha al final del listado
+    nulls={'fecha_sesion': datetime.min}
+)
+
 @app.route('/api/sesiones/psicologo/<int:psicologo_id>', methods=['GET'])
 @token_required
 def get_sesiones_psicologo(psicologo_id):
+    """Sesiones del psicólogo, más recientes primero. Parámetros opcionales: fields, limit, cursor"""
     try:
         # Verificar que el psicólogo solo puede ver sus propias sesiones
         psicologo = get_current_psicologo()
         if psicologo.id != psicologo_id:
             return jsonify({'error': 'No tienes permiso para ver estas sesiones'}), 403
         
-        sesiones = Sesion.query.filter_by(psicologo_id=psicologo_id).order_by(Sesion.fecha_sesion.desc()).all()
-        
-        sesiones_con_datos = []
-        for sesion in sesiones:
-            sesion_dict = {
-                'id': sesion.id,
-                'paciente_id': sesion.paciente_id,
-                'psicologo_id': sesion.psicologo_id,
-                'fecha_sesion': sesion.fecha_sesion.isoformat(),
-                'duracion_minutos': sesion.duracion_minutos,
-                'notas': sesion.notas,
-                'emocion_predominante': sesion.emocion_predominante,
-                'confianza_promedio': sesion.confianza_promedio
-            }
-            
-            # Obtener datos del paciente
-            paciente = Paciente.query.get(sesion.paciente_id)
-            if paciente:
-                sesion_dict['paciente_nombre'] = paciente.nombre_completo
-            else:
-                sesion_dict['paciente_nombre'] = 'Paciente no encontrado'
-            
-            sesiones_con_datos.append(sesion_dict)
-        
-        return jsonify({
-            'sesiones': sesiones_con_datos
-        }), 200
+        # El nombre del paciente viene en la misma consulta (JOIN) en lugar de un get por sesión
+        return list_response('sesiones', SESION_LIST, lambda columns: db.session.query(*columns).select_from(
+            Sesion
+        ).outerjoin(
+            Paciente, Paciente.id == Sesion.paciente_id
+        ).filter(
+            Sesion.psicologo_id == psicologo_id
+        ))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def pack_session_timeline(sesion_id):
+    """Agrega a la línea de tiempo compacta de la sesión las emociones registradas desde el
+    último empaquetado (no hace commit). Con SESSION_TIMELINE_PRUNE_ROWS elimina las filas
+    ya empaquetadas."""
+    import emotion_timeline
+    
+    timeline = db.session.get(SesionTimeline, sesion_id)
+    watermark = timeline.ultimo_emocion_id if timeline is not None else 0
+    rows = db.session.query(
+        EmocionDetectada.id, EmocionDetectada.emotion, EmocionDetectada.confidence, EmocionDetectada.timestamp
+    ).filter(
+        EmocionDetectada.sesion_id == sesion_id, EmocionDetectada.id > watermark
+    ).order_by(EmocionDetectada.timestamp, EmocionDetectada.id).all()
+    if not rows:
+        return timeline
+    
+    emotions = [row.emotion for row in rows]
+    confidences = [row.confidence for row in rows]
+    timestamps = [row.timestamp for row in rows]
+    
+    appendable = timeline is not None and timeline.total > 0 and (
+        timestamps[0] >= timeline.inicio + timedelta(milliseconds=timeline.duracion_ms)
+    )
+    if appendable:
+        # Se continúa la línea de tiempo: solo se codifican las filas nuevas
+        encoded = emotion_timeline.encode(
+            emotions, confidences, timestamps,
+            labels=timeline.labels, start=timeline.inicio, end_offset_ms=timeline.duracion_ms
+        )
+        timeline.codigos += encoded['codes']
+        timeline.confianzas += encoded['confidences']
+        timeline.deltas_ms += encoded['deltas']
+        timeline.probabilidades = None
+        timeline.total += encoded['count']
+    else:
+        if timeline is not None and timeline.total > 0:
+            # Filas anteriores al final de la línea de tiempo: se combinan y se recodifica todo
+            columns = emotion_timeline.to_columns(
+                emotion_timeline.decode(timeline.codigos, timeline.confianzas, timeline.deltas_ms),
+                timeline.labels, timeline.inicio
+            )
+            previous = [
+                (timeline.inicio + timedelta(milliseconds=offset), emotion, confidence)
+                for offset, emotion, confidence in zip(columns['offset_ms'], columns['emotion'], columns['confidence'])
+            ]
+            merged = sorted(previous + list(zip(timestamps, emotions, confidences)), key=lambda item: item[0])
+            timestamps, emotions, confidences = (list(column) for column in zip(*merged))
+        encoded = emotion_timeline.encode(emotions, confidences, timestamps)
+        if timeline is None:
+            timeline = SesionTimeline(sesion_id=sesion_id)
+            db.session.add(timeline)
+        timeline.inicio = encoded['start']
+        timeline.codigos = encoded['codes']
+        timeline.confianzas = encoded['confidences']
+        timeline.deltas_ms = encoded['deltas']
+        timeline.probabilidades = None
+        timeline.total = encoded['count']
+    
+    timeline.etiquetas = json.dumps(encoded['labels'])
+    timeline.duracion_ms = encoded['end_offset_ms']
+    timeline.ultimo_emocion_id = max(row.id for row in rows)
+    
+    if Config.SESSION_TIMELINE_PRUNE_ROWS:
+        EmocionDetectada.query.filter(
+            EmocionDetectada.sesion_id == sesion_id, EmocionDetectada.id <= timeline.ultimo_emocion_id
+        ).delete(synchronize_session=False)
+    return timeline
+
+def session_emotion_columns(sesion_id):
+    """Emociones de la sesión como columnas (emotion, confidence, timestamp), para
+    ?formato=columnar.
+
+    Si la sesión tiene línea de tiempo compacta se decodifica de una sola fila y solo se
+    leen como filas las emociones registradas después de empaquetarla: las confianzas
+    empaquetadas tienen precisión float16 y todos los timestamps se dan en milisegundos.
+    Retorna (columnas, línea de tiempo o None).
+    """
+    timeline = db.session.get(SesionTimeline, sesion_id)
+    watermark = 0
+    columns = {'emotion': [], 'confidence': [], 'timestamp': []}
+    if timeline is not None and timeline.total > 0:
+        import emotion_timeline
+        decoded = emotion_timeline.to_columns(
+            emotion_timeline.decode(timeline.codigos, timeline.confianzas, timeline.deltas_ms),
+            timeline.labels, timeline.inicio
+        )
+        columns = {key: decoded[key] for key in columns}
+        watermark = timeline.ultimo_emocion_id
+    
+    rows = db.session.query(
+        EmocionDetectada.emotion, EmocionDetectada.confidence, EmocionDetectada.timestamp
+    ).filter(
+        EmocionDetectada.sesion_id == sesion_id, EmocionDetectada.id > watermark
+    ).order_by(EmocionDetectada.timestamp, EmocionDetectada.id).all()
+    for emotion, confidence, timestamp in rows:
+        columns['emotion'].append(emotion)
+        columns['confidence'].append(confidence)
+        columns['timestamp'].append(timestamp.isoformat(timespec='milliseconds'))
+    return columns, timeline
+
+def session_emotion_rows(sesion_id):
+    """Emociones de la sesión como filas {id, emotion, confidence, timestamp} leídas de
+    emociones_detectadas. Si las filas empaquetadas se eliminaron (SESSION_TIMELINE_PRUNE_ROWS),
+    esa parte se reconstruye de la línea de tiempo: sin id y con la precisión float16."""
+    rows = db.session.query(
+        EmocionDetectada.id, EmocionDetectada.emotion, EmocionDetectada.confidence, EmocionDetectada.timestamp
+    ).filter(EmocionDetectada.sesion_id == sesion_id).order_by(
+        EmocionDetectada.timestamp, EmocionDetectada.id
+    ).all()
+    emociones = [
+        {'id': row.id, 'emotion': row.emotion, 'confidence': row.confidence, 'timestamp': row.timestamp.isoformat()}
+        for row in rows
+    ]
+    timeline = db.session.get(SesionTimeline, sesion_id)
+    if timeline is None or timeline.total == 0:
+        return emociones
+    if sum(1 for row in rows if row.id <= timeline.ultimo_emocion_id) == timeline.total:
+        return emociones
+    
+    import emotion_timeline
+    columns = emotion_timeline.to_columns(
+        emotion_timeline.decode(timeline.codigos, timeline.confianzas, timeline.deltas_ms),
+        timeline.labels, timeline.inicio
+    )
+    # La línea de tiempo guarda milisegundos desde su inicio truncado a milisegundos
+    inicio = timeline.inicio.replace(microsecond=timeline.inicio.microsecond // 1000 * 1000)
+    empaquetadas = [
+        {
+            'id': None,
+            'emotion': emotion,
+            'confidence': confidence,
+            'timestamp': (inicio + timedelta(milliseconds=offset)).isoformat()
+        }
+        for emotion, confidence, offset in zip(columns['emotion'], columns['confidence'], columns['offset_ms'])
+    ]
+    return empaquetadas + [
+        emocion for emocion, row in zip(emociones, rows) if row.id > timeline.ultimo_emocion_id
+    ]
+
 @app.route('/api/sesiones/<int:sesion_id>', methods=['GET'])
 @token_required
 def get_sesion_detalle(sesion_id):
     try:
-        sesion = Sesion.query.get(sesion_id)
-        if not sesion:
+        # Sesión y nombre del paciente en una sola consulta
+        fila = db.session.query(Sesion, Paciente.nombre_completo).outerjoin(
+            Paciente, Paciente.id == Sesion.paciente_id
+        ).filter(Sesion.id == sesion_id).first()
+        if not fila:
             return jsonify({'error': 'Sesión no encontrada'}), 404
+        sesion, paciente_nombre = fila
         
         # Verificar que el psicólogo tiene acceso a esta sesión
         psicologo = get_current_psicologo()
         if sesion.psicologo_id != psicologo.id:
             return jsonify({'error': 'No tienes permiso para ver esta sesión'}), 403
         
-        # Obtener datos del paciente
-        paciente = Paciente.query.get(sesion.paciente_id)
-        paciente_nombre = paciente.nombre_completo if paciente else 'Paciente no encontrado'
+        paciente_nombre = paciente_nombre or 'Paciente no encontrado'
         
         # Obtener emociones detectadas de esta sesión
-        emociones = EmocionDetectada.query.filter_by(sesion_id=sesion_id).all()
-        emociones_data = []
-        for emocion in emociones:
-            emociones_data.append({
-                'id': emocion.id,
-                'emotion': emocion.emotion,
-                'confidence': emocion.confidence,
-                'timestamp': emocion.timestamp.isoformat()
-            })
+        if request.args.get('formato') == 'columnar':
+            # Línea de tiempo compacta: una fila y decodificación vectorizada (con pérdida)
+            emociones_data, _ = session_emotion_columns(sesion_id)
+        else:
+            emociones_data = session_emotion_rows(sesion_id)
         
         sesion_dict = {
             'id': sesion.id,
@@ -919,8 +1078,11 @@ def eliminar_sesion(sesion_id):
         if sesion.psicologo_id != psicologo.id:
             return jsonify({'error': 'No tienes permiso para eliminar esta sesión'}), 403
         
-        # Eliminar emociones detectadas asociadas
+        # Eliminar emociones detectadas asociadas (incluidas las que sigan en el buffer)
+        flush_emotion_buffer()
+        emotion_rollups.record_session_deleted(sesion_id)
         EmocionDetectada.query.filter_by(sesion_id=sesion_id).delete()
+        SesionTimeline.query.filter_by(sesion_id=sesion_id).delete()
         
         # Eliminar la sesión
         db.session.delete(sesion)
@@ -932,81 +1094,107 @@ def eliminar_sesion(sesion_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def month_bucket(column):
+    """Primer día del mes de column; date_trunc en PostgreSQL, strftime en SQLite"""
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.strftime('%Y-%m-01', column)
+    return db.func.date_trunc('month', column)
+
+
+def dashboard_counters(psicologo_id, hoy_inicio, hace_30_dias):
+    """Contadores de pacientes y sesiones en una sola sentencia con agregación condicional"""
+    manana_inicio = hoy_inicio + timedelta(days=1)
+    count = db.func.count
+
+    pacientes = db.select(
+        count(),
+        count().filter(Paciente.fecha_registro >= hace_30_dias)
+    ).where(Paciente.psicologo_id == psicologo_id).subquery()
+    sesiones = db.select(
+        count(),
+        count().filter(Sesion.fecha_sesion >= hoy_inicio, Sesion.fecha_sesion < manana_inicio)
+    ).where(Sesion.psicologo_id == psicologo_id).subquery()
+    total_pacientes, nuevos_pacientes, total_sesiones, sesiones_hoy = db.session.execute(
+        db.select(pacientes, sesiones).select_from(pacientes.join(sesiones, db.true()))
+    ).one()
+
+    return {
+        'total_pacientes': total_pacientes,
+        'nuevos_pacientes': nuevos_pacientes,
+        'total_sesiones': total_sesiones,
+        'sesiones_hoy': sesiones_hoy
+    }
+
+
+def dashboard_emotion_summary(psicologo_id, hoy_inicio, desde_grafica):
+    """Totales de emociones y datos de la gráfica mensual leídos de los rollups diarios.
+
+    Una sola consulta agrupa las filas de emociones_resumen_diario del psicólogo por
+    (mes, emoción) y cuenta con FILTER las de hoy y las de la ventana de la gráfica; el
+    costo depende del número de días con actividad, no del de emociones registradas.
+    Retorna (totales, filas (mes, emoción, cantidad) de la gráfica ordenadas por mes).
+    """
+    total = db.func.sum(EmocionResumenDiario.cantidad)
+    mes = month_bucket(EmocionResumenDiario.dia)
+
+    grupos = db.session.execute(
+        db.select(
+            mes.label('mes'),
+            EmocionResumenDiario.emotion,
+            total.label('cantidad'),
+            total.filter(EmocionResumenDiario.dia == hoy_inicio.date()).label('hoy'),
+            total.filter(EmocionResumenDiario.dia >= desde_grafica.date()).label('en_grafica')
+        ).where(
+            EmocionResumenDiario.psicologo_id == psicologo_id
+        ).group_by(mes, EmocionResumenDiario.emotion).order_by(mes)
+    ).all()
+
+    totales = {
+        'total_emociones': sum(g.cantidad for g in grupos),
+        'emociones_hoy': sum(g.hoy or 0 for g in grupos),
+        'emociones_positivas': sum(g.cantidad for g in grupos if g.emotion in ('happy', 'neutral'))
+    }
+    grafica = [(g.mes, g.emotion, g.en_grafica) for g in grupos if g.en_grafica]
+    return totales, grafica
+
+
 # Endpoint para estadísticas del dashboard
 @app.route('/api/dashboard/stats/<int:psicologo_id>', methods=['GET'])
 @token_required
 def get_dashboard_stats(psicologo_id):
     try:
-        from datetime import datetime, timedelta
-        
-        # Estadísticas básicas
-        total_pacientes = Paciente.query.filter_by(psicologo_id=psicologo_id).count()
-        total_sesiones = Sesion.query.filter_by(psicologo_id=psicologo_id).count()
-        
-        # Pacientes nuevos en los últimos 30 días
-        hace_30_dias = datetime.utcnow() - timedelta(days=30)
-        nuevos_pacientes = Paciente.query.filter(
-            Paciente.psicologo_id == psicologo_id,
-            Paciente.fecha_registro >= hace_30_dias
-        ).count()
-        
-        # Sesiones de hoy
-        hoy = datetime.utcnow().date()
-        sesiones_hoy = Sesion.query.filter(
-            Sesion.psicologo_id == psicologo_id,
-            db.func.date(Sesion.fecha_sesion) == hoy
-        ).count()
-        
-        # Total de emociones detectadas
-        total_emociones = EmocionDetectada.query.join(Sesion).filter(
-            Sesion.psicologo_id == psicologo_id
-        ).count()
-        
-        # Emociones de hoy
-        emociones_hoy = EmocionDetectada.query.join(Sesion).filter(
-            Sesion.psicologo_id == psicologo_id,
-            db.func.date(EmocionDetectada.timestamp) == hoy
-        ).count()
-        
+        ahora = datetime.utcnow()
+        hoy_inicio = datetime(ahora.year, ahora.month, ahora.day)
+        hace_30_dias = ahora - timedelta(days=30)
+        hace_6_meses = ahora - timedelta(days=180)
+
+        # Contadores y gráfica: una consulta para pacientes y sesiones y otra sobre los rollups
+        contadores = dashboard_counters(psicologo_id, hoy_inicio, hace_30_dias)
+        emociones, emociones_por_mes = dashboard_emotion_summary(psicologo_id, hoy_inicio, hace_6_meses)
+        total_emociones = emociones['total_emociones']
+
         # Calcular satisfacción promedio (basado en emociones positivas)
-        emociones_positivas = EmocionDetectada.query.join(Sesion).filter(
-            Sesion.psicologo_id == psicologo_id,
-            EmocionDetectada.emotion.in_(['happy', 'neutral'])
-        ).count()
-        
         satisfaccion_promedio = 0
         if total_emociones > 0:
-            satisfaccion_promedio = round((emociones_positivas / total_emociones) * 100, 1)
-        
-        # Datos de emociones por mes (últimos 6 meses)
-        hace_6_meses = datetime.utcnow() - timedelta(days=180)
-        emociones_por_mes = db.session.query(
-            db.func.date_trunc('month', EmocionDetectada.timestamp).label('mes'),
-            EmocionDetectada.emotion,
-            db.func.count(EmocionDetectada.id).label('cantidad')
-        ).join(Sesion).filter(
-            Sesion.psicologo_id == psicologo_id,
-            EmocionDetectada.timestamp >= hace_6_meses
-        ).group_by(
-            db.func.date_trunc('month', EmocionDetectada.timestamp),
-            EmocionDetectada.emotion
-        ).all()
+            satisfaccion_promedio = round((emociones['emociones_positivas'] / total_emociones) * 100, 1)
         
-        # Procesar datos de emociones por mes
+        # Procesar datos de emociones por mes (últimos 6 meses)
         chart_data = {}
-        for row in emociones_por_mes:
-            mes = row.mes.strftime('%b')
+        for mes_inicio, emotion, cantidad in emociones_por_mes:
+            if not isinstance(mes_inicio, datetime):
+                mes_inicio = datetime.strptime(str(mes_inicio)[:10], '%Y-%m-%d')
+            mes = mes_inicio.strftime('%b')
             if mes not in chart_data:
                 chart_data[mes] = {'feliz': 0, 'triste': 0, 'enojado': 0, 'neutral': 0}
             
-            if row.emotion == 'happy':
-                chart_data[mes]['feliz'] = row.cantidad
-            elif row.emotion == 'sad':
-                chart_data[mes]['triste'] = row.cantidad
-            elif row.emotion == 'angry':
-                chart_data[mes]['enojado'] = row.cantidad
-            elif row.emotion == 'neutral':
-                chart_data[mes]['neutral'] = row.cantidad
+            if emotion == 'happy':
+                chart_data[mes]['feliz'] = cantidad
+            elif emotion == 'sad':
+                chart_data[mes]['triste'] = cantidad
+            elif emotion == 'angry':
+                chart_data[mes]['enojado'] = cantidad
+            elif emotion == 'neutral':
+                chart_data[mes]['neutral'] = cantidad
         
         # Convertir a lista para el frontend
         chart_list = []
@@ -1020,16 +1208,20 @@ def get_dashboard_stats(psicologo_id):
             })
         
         # Actividad reciente (últimas 5 sesiones)
-        sesiones_recientes = Sesion.query.filter_by(psicologo_id=psicologo_id).order_by(
+        # El nombre del paciente viene en la misma consulta en lugar de un get por sesión
+        sesiones_recientes = db.session.query(Sesion, Paciente.nombre_completo).outerjoin(
+            Paciente, Paciente.id == Sesion.paciente_id
+        ).filter(
+            Sesion.psicologo_id == psicologo_id
+        ).order_by(
             Sesion.fecha_sesion.desc()
         ).limit(5).all()
         
         actividad_reciente = []
-        for sesion in sesiones_recientes:
-            paciente = Paciente.query.get(sesion.paciente_id)
+        for sesion, nombre_paciente in sesiones_recientes:
             actividad_reciente.append({
                 'id': sesion.id,
-                'titulo': f'Sesión con {paciente.nombre_completo if paciente else "Paciente desconocido"}',
+                'titulo': f'Sesión con {nombre_paciente or "Paciente desconocido"}',
                 'descripcion': f'Emoción predominante: {sesion.emocion_predominante or "No detectada"}',
                 'tiempo': sesion.fecha_sesion.strftime('%d %b %Y'),
                 'tipo': 'sesion',
@@ -1039,12 +1231,12 @@ def get_dashboard_stats(psicologo_id):
         
         return jsonify({
             'estadisticas': {
-                'total_pacientes': total_pacientes,
-                'nuevos_pacientes': nuevos_pacientes,
-                'total_sesiones': total_sesiones,
-                'sesiones_hoy': sesiones_hoy,
+                'total_pacientes': contadores['total_pacientes'],
+                'nuevos_pacientes': contadores['nuevos_pacientes'],
+                'total_sesiones': contadores['total_sesiones'],
+                'sesiones_hoy': contadores['sesiones_hoy'],
                 'total_emociones': total_emociones,
-                'emociones_hoy': emociones_hoy,
+                'emociones_hoy': emociones['emociones_hoy'],
                 'satisfaccion_promedio': satisfaccion_promedio
             },
             'chart_data': chart_list,
@@ -1057,51 +1249,320 @@ def get_dashboard_stats(psicologo_id):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def read_request_body():
+    """Lee el cuerpo de la request directamente a un búfer preasignado, sin copias intermedias"""
+    length = request.content_length
+    if length is None:
+        return request.get_data(cache=False)
+
+    # El límite se valida antes de reservar el búfer: Content-Length lo declara el cliente
+    max_length = app.config.get('MAX_CONTENT_LENGTH')
+    if max_length is not None and length > max_length:
+        raise RequestEntityTooLarge()
+
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+    while received < length:
+        read = request.stream.readinto(view[received:])
+        if not read:
+            break
+        received += read
+    return view[:received]
+
+def infer_request_image(image_bytes, options, sesion_id=None):
+    """Inferencia común a los endpoints de predicción a partir de la imagen codificada (JPEG/PNG).
+
+    Retorna (resultados, None) o (None, respuesta de error).
+    """
+    # Verificar que los modelos están disponibles
+    if not inference.models_ready():
+        return None, (jsonify({'error': 'Modelos de IA no disponibles'}), 503)
+    
+    # Nivel de calidad solicitado: define el tamaño de entrada del detector
+    quality = options.get('quality') or Config.DETECTOR_DEFAULT_QUALITY
+    if quality not in Config.DETECTOR_QUALITY_TIERS:
+        return None, (jsonify({'error': f"Calidad inválida. Opciones: {', '.join(Config.DETECTOR_QUALITY_TIERS)}"}), 400)
+
+    # En sesiones en vivo se reutilizan las cajas del frame anterior mediante seguimiento
+    # y el resultado de frames casi idénticos al anterior
+    tracker = None
+    session_key = None
+    if sesion_id:
+        try:
+            session_key = (get_current_psicologo().id, int(sesion_id))
+        except (TypeError, ValueError):
+            return None, (jsonify({'error': 'sesion_id inválido'}), 400)
+        if Config.FACE_TRACKING_ENABLED:
+            tracker = inference.face_trackers.get(session_key)
+
+    try:
+        emotion_results = inference.infer_encoded_frame(image_bytes, quality, tracker, session_key)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    
+    logger.info(f"Procesamiento completado. Rostros detectados: {len(emotion_results)}")
+    return emotion_results, None
+
+def prediction_response(body):
+    response = jsonify(body)
+    # Resolución máxima que aprovecha el servidor: los clientes pueden reducir sus frames
+    response.headers['X-Max-Useful-Resolution'] = str(Config.FRAME_MAX_USEFUL_SIZE)
+    return response
+
+def predict_from_bytes(image_bytes, options):
+    """Predicción común a /predict y /predict/frame"""
+    emotion_results, error = infer_request_image(image_bytes, options, options.get('sesion_id'))
+    if error is not None:
+        return error
+    return prediction_response(emotion_results)
+
+def read_prediction_image():
+    """Lee la imagen y las opciones de la request: JSON con data URL base64, cuerpo binario
+    (opciones en la query string) o multipart (archivo en el campo "image").
+
+    Retorna (bytes, opciones, None) o (None, None, respuesta de error).
+    """
+    if request.mimetype == 'application/json':
+        data = request.get_json(silent=True) or {}
+        if not data.get('image'):
+            return None, None, (jsonify({'error': 'Imagen requerida'}), 400)
+        try:
+            return base64.b64decode(data['image'].split(',')[-1]), data, None
+        except Exception as e:
+            logger.error(f"Error decodificando imagen: {e}")
+            return None, None, (jsonify({'error': 'Formato de imagen inválido'}), 400)
+    if request.mimetype == 'multipart/form-data':
+        image_file = request.files.get('image')
+        image_bytes = image_file.read() if image_file else None
+        options = request.form
+    elif request.mimetype in ('image/jpeg', 'image/png', 'application/octet-stream'):
+        image_bytes = read_request_body()
+        options = request.args
+    else:
+        return None, None, (jsonify({'error': 'Content-Type no soportado. Usa image/jpeg, image/png o multipart/form-data'}), 415)
+    if not image_bytes:
+        return None, None, (jsonify({'error': 'Imagen requerida'}), 400)
+    return image_bytes, options, None
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f"La imagen excede el tamaño máximo permitido ({app.config['MAX_CONTENT_LENGTH']} bytes)"}), 413
+
 @app.route('/predict', methods=['POST'])
 @limiter.limit("120 per minute")  # Máximo 120 predicciones por minuto (2 por segundo)
 @token_required
 def predict():
-    """Endpoint para predecir emociones en una imagen"""
+    """Endpoint para predecir emociones en una imagen (JSON con la imagen en base64, con o sin
+    prefijo data:)"""
     try:
-        data = request.json
-        
-        # Validar datos requeridos
-        if not data or not data.get('image'):
-            return jsonify({'error': 'Imagen requerida'}), 400
-        
-        # Verificar que los modelos están disponibles
-        if not TENSORFLOW_AVAILABLE or faceNet is None or emotionModel is None:
-            return jsonify({'error': 'Modelos de IA no disponibles'}), 503
-        
-        image_data = data['image']
+        # Misma lectura que /predict/frame: el prefijo data: del base64 es opcional
+        image_bytes, options, error = read_prediction_image()
+        if error is not None:
+            return error
+
+        return predict_from_bytes(image_bytes, options)
+
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
+    except Exception as e:
+        logger.error(f"Error en predicción: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@app.route('/predict/frame', methods=['POST'])
+@limiter.limit("120 per minute")  # Mismo límite que /predict
+@token_required
+def predict_frame():
+    """Endpoint para predecir emociones con la imagen en binario (image/jpeg, image/png o multipart)"""
+    try:
+        if request.mimetype == 'application/json':
+            return jsonify({'error': 'Content-Type no soportado. Usa image/jpeg, image/png o multipart/form-data'}), 415
+        image_bytes, options, error = read_prediction_image()
+        if error is not None:
+            return error
         
-        # Decodificar la imagen base64 usando OpenCV
+        return predict_from_bytes(image_bytes, options)
+
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
+    except Exception as e:
+        logger.error(f"Error en predicción binaria: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+# Muestreo de los frames que se registran desde el endpoint de predicción por sesión
+record_sampler = RecordSampler(ttl_seconds=Config.FACE_TRACKING_TTL_S)
+
+# Escritura diferida de las emociones detectadas: un INSERT multi-fila cada N filas o M ms.
+# Con los roles separados las emociones se registran en un proceso (inferencia) y la sesión
+# se finaliza en otro (API), que no puede vaciar el buffer ajeno antes de empaquetarla
+if Config.EMOTION_BUFFER_ENABLED and Config.PROCESS_ROLE != 'both':
+    logger.warning("EMOTION_BUFFER_ENABLED requiere PROCESS_ROLE=both; las emociones se escriben sin buffer")
+emotion_buffer = EmotionWriteBuffer(
+    app, db, EmocionDetectada,
+    max_rows=Config.EMOTION_BUFFER_MAX_ROWS,
+    max_delay_ms=Config.EMOTION_BUFFER_MAX_DELAY_MS,
+    max_pending=Config.EMOTION_BUFFER_MAX_PENDING,
+    on_insert=emotion_rollups.record_inserted
+) if Config.EMOTION_BUFFER_ENABLED and Config.PROCESS_ROLE == 'both' else None
+
+# Esquema particionado: la partición de cada mes se crea antes de la primera inserción
+emotion_partitions = EmotionPartitions(
+    db, months_ahead=Config.EMOTIONS_PARTITION_MONTHS_AHEAD
+) if Config.EMOTIONS_PARTITIONED else None
+
+# Con códigos de emoción solo se aceptan las clases del modelo
+ALLOWED_EMOTIONS = EMOTION_CODES if Config.EMOTIONS_PARTITIONED else None
+
+def record_emotion(sesion_id, emotion, confidence):
+    """Registra una emoción detectada (en diferido si el buffer está habilitado).
+
+    Retorna la representación de la fila; su id es None mientras está en el buffer
+    (POST /api/sesiones/<id>/emociones responde entonces 202 con pendiente=true).
+    """
+    timestamp = datetime.utcnow()
+    if emotion_partitions is not None:
+        emotion_partitions.ensure([timestamp])
+    if emotion_buffer is not None:
+        emotion_buffer.add(sesion_id, emotion, confidence, timestamp)
+        return {
+            'id': None,
+            'sesion_id': sesion_id,
+            'emotion': emotion,
+            'confidence': confidence,
+            'timestamp': timestamp.isoformat()
+        }
+    emocion = EmocionDetectada(sesion_id=sesion_id, emotion=emotion, confidence=confidence, timestamp=timestamp)
+    db.session.add(emocion)
+    emotion_rollups.record_inserted([{
+        'sesion_id': sesion_id, 'emotion': emotion, 'confidence': confidence, 'timestamp': timestamp
+    }])
+    db.session.commit()
+    return emocion.to_dict()
+
+def flush_emotion_buffer():
+    """Escribe de inmediato las emociones pendientes del proceso"""
+    if emotion_buffer is not None:
+        emotion_buffer.flush()
+
+@app.route('/predict/sesiones/<int:sesion_id>', methods=['POST'])
+@limiter.limit("120 per minute")  # Mismo límite que /predict
+@token_required
+def predict_sesion(sesion_id):
+    """Predice las emociones del frame y registra la dominante en la sesión en la misma request.
+
+    Acepta la imagen como /predict (JSON) o /predict/frame (binario o multipart). La opción
+    sample_rate (0 < r <= 1, por defecto SESSION_RECORD_SAMPLE_RATE) registra solo una
+    fracción de los frames con rostro. Responde {"results": [...], "recorded": emoción o null}.
+    """
+    try:
+        image_bytes, options, error = read_prediction_image()
+        if error is not None:
+            return error
+
         try:
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            np_arr = np.frombuffer(image_bytes, np.uint8)
-            frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        except Exception as e:
-            logger.error(f"Error decodificando imagen: {e}")
-            return jsonify({'error': 'Formato de imagen inválido'}), 400
+            sample_rate = float(options.get('sample_rate') or Config.SESSION_RECORD_SAMPLE_RATE)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'sample_rate inválido'}), 400
+        if not 0 < sample_rate <= 1:
+            return jsonify({'error': 'sample_rate debe estar entre 0 (excluido) y 1'}), 400
 
-        if frame is None:
-            logger.error("No se pudo decodificar la imagen")
-            return jsonify({'error': 'No se pudo decodificar la imagen'}), 400
+        # Verificar que la sesion existe y pertenece al psicólogo
+        psicologo = get_current_psicologo()
+        propietario = db.session.query(Sesion.psicologo_id).filter(Sesion.id == sesion_id).scalar()
+        if propietario is None:
+            return jsonify({'error': 'Sesion no encontrada'}), 404
+        if propietario != psicologo.id:
+            return jsonify({'error': 'No tienes permiso para modificar esta sesión'}), 403
 
-        # Procesar la imagen y obtener resultados de emociones
-        emotion_results = process_image_for_emotion(frame, faceNet, emotionModel)
-        
-        logger.info(f"Procesamiento completado. Rostros detectados: {len(emotion_results)}")
-        
-        return jsonify(emotion_results)
+        emotion_results, error = infer_request_image(image_bytes, options, sesion_id)
+        if error is not None:
+            return error
+
+        recorded = None
+        dominant = dominant_emotion(emotion_results)
+        if dominant is not None and record_sampler.should_record((psicologo.id, sesion_id), sample_rate):
+            recorded = record_emotion(sesion_id, dominant['emotion'], float(dominant['confidence']))
 
+        return prediction_response({'results': emotion_results, 'recorded': recorded})
+
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
     except Exception as e:
-        logger.error(f"Error en predicción: {e}")
+        db.session.rollback()
+        logger.error(f"Error en predicción de sesión: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': 'Error interno del servidor'}), 500
 
 
+# Canal WebSocket para sesiones en vivo: una sola autenticación al abrir el canal,
+# frames binarios del cliente y predicciones de vuelta por el mismo canal
+if SERVES_INFERENCE and STREAMING_AVAILABLE and Config.STREAMING_ENABLED:
+    app.config['SOCK_SERVER_OPTIONS'] = {
+        'ping_interval': Config.STREAM_PING_INTERVAL_S,
+        'max_message_size': Config.MAX_CONTENT_LENGTH
+    }
+    sock = Sock(app)
+
+    @sock.route('/ws/sesiones/<int:sesion_id>/stream')
+    def stream_sesion(ws, sesion_id):
+        """Protocolo del canal:
+        - Primer mensaje (texto): {"token": "<jwt>", "quality": "low|standard|high"}
+        - Luego frames JPEG/PNG como mensajes binarios; {"quality": ...} cambia el nivel
+        - El servidor responde {"type": "prediction", "frame": n, "results": [...], "dropped": k}
+        Si la inferencia se atrasa, los frames pendientes se reemplazan por el más reciente.
+        """
+        auth = receive_auth(ws, Config.STREAM_AUTH_TIMEOUT_S)
+        if auth is None:
+            send_json(ws, {'type': 'error', 'error': 'Token de acceso requerido'})
+            return
+
+        psicologo = authenticate(auth['token'])
+        if not psicologo:
+            send_json(ws, {'type': 'error', 'error': 'Token inválido o expirado'})
+            return
+        psicologo_id = psicologo.id
+
+        # Verificar que la sesion existe y pertenece al psicólogo
+        sesion = Sesion.query.get(sesion_id)
+        if not sesion:
+            send_json(ws, {'type': 'error', 'error': 'Sesion no encontrada'})
+            return
+        if sesion.psicologo_id != psicologo_id:
+            send_json(ws, {'type': 'error', 'error': 'No tienes permiso para acceder a esta sesión'})
+            return
+
+        # El canal puede durar toda la sesión: no se retiene la conexión a la base de datos
+        db.session.remove()
+
+        if not inference.models_ready():
+            send_json(ws, {'type': 'error', 'error': 'Modelos de IA no disponibles'})
+            return
+
+        options = {'quality': auth.get('quality')}
+        tracker = inference.face_trackers.get((psicologo_id, sesion_id)) if Config.FACE_TRACKING_ENABLED else None
+
+        def process_frame(data, options):
+            quality = options.get('quality') or Config.DETECTOR_DEFAULT_QUALITY
+            if quality not in Config.DETECTOR_QUALITY_TIERS:
+                raise ValueError(f"Calidad inválida. Opciones: {', '.join(Config.DETECTOR_QUALITY_TIERS)}")
+            return inference.infer_encoded_frame(data, quality, tracker, (psicologo_id, sesion_id))
+
+        send_json(ws, {
+            'type': 'ready',
+            'sesion_id': sesion_id,
+            'max_useful_resolution': Config.FRAME_MAX_USEFUL_SIZE,
+            'quality_tiers': list(Config.DETECTOR_QUALITY_TIERS)
+        })
+        logger.info(f"Stream de la sesión {sesion_id} abierto")
+        serve_stream(ws, process_frame, options)
+        logger.info(f"Stream de la sesión {sesion_id} cerrado")
+
+
 # Endpoint para guardar emociones detectadas durante una sesion
 @app.route('/api/sesiones/<int:sesion_id>/emociones', methods=['POST'])
 @token_required
@@ -1112,6 +1573,8 @@ def guardar_emocion_detectada(sesion_id):
         # Validar datos requeridos
         if not data.get('emotion'):
             return jsonify({'error': 'Emocion es requerida'}), 400
+        if ALLOWED_EMOTIONS is not None and data['emotion'] not in ALLOWED_EMOTIONS:
+            return jsonify({'error': f"Emocion desconocida: {data['emotion']}"}), 400
         
         # Verificar que la sesion existe
         sesion = Sesion.query.get(sesion_id)
@@ -1123,20 +1586,20 @@ def guardar_emocion_detectada(sesion_id):
         if sesion.psicologo_id != psicologo.id:
             return jsonify({'error': 'No tienes permiso para modificar esta sesión'}), 403
         
-        # Crear nueva emocion detectada
-        emocion = EmocionDetectada(
-            sesion_id=sesion_id,
-            emotion=data['emotion'],
-            confidence=data.get('confidence', 0.0),
-            timestamp=datetime.utcnow()
-        )
+        # Registrar la emoción (se inserta en el próximo lote del buffer)
+        emocion = record_emotion(sesion_id, data['emotion'], data.get('confidence', 0.0))
         
-        db.session.add(emocion)
-        db.session.commit()
+        if emocion['id'] is None:
+            # Aceptada pero todavía sin id: la fila se inserta con el próximo lote del buffer
+            return jsonify({
+                'message': 'Emocion aceptada; se guardará en el próximo lote',
+                'emocion': emocion,
+                'pendiente': True
+            }), 202
         
         return jsonify({
             'message': 'Emocion guardada exitosamente',
-            'emocion': emocion.to_dict()
+            'emocion': emocion
         }), 201
         
     except Exception as e:
@@ -1144,6 +1607,53 @@ def guardar_emocion_detectada(sesion_id):
         logger.error(f"Error guardando emocion: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Endpoint para guardar un lote de emociones (clientes que acumulan offline o reproducen una sesión)
+@app.route('/api/sesiones/<int:sesion_id>/emociones/lote', methods=['POST'])
+@limiter.limit("30 per minute")
+@token_required
+def guardar_emociones_lote(sesion_id):
+    """Recibe {"emociones": [{"emotion", "confidence", "timestamp"}, ...]} (o la lista directa)
+    y las inserta con una sola sentencia. Los ítems inválidos se reportan por índice sin
+    descartar el resto del lote."""
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('emociones') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Se requiere una lista de emociones'}), 400
+        if len(items) > Config.BULK_EMOTIONS_MAX_ITEMS:
+            return jsonify({'error': f'El lote excede el máximo de {Config.BULK_EMOTIONS_MAX_ITEMS} emociones'}), 413
+        
+        # Verificar una sola vez que la sesion existe y pertenece al psicólogo
+        psicologo = get_current_psicologo()
+        propietario = db.session.query(Sesion.psicologo_id).filter(Sesion.id == sesion_id).scalar()
+        if propietario is None:
+            return jsonify({'error': 'Sesion no encontrada'}), 404
+        if propietario != psicologo.id:
+            return jsonify({'error': 'No tienes permiso para modificar esta sesión'}), 403
+        
+        rows, errores = validate_emotion_batch(items, sesion_id, allowed_emotions=ALLOWED_EMOTIONS)
+        if rows:
+            if emotion_partitions is not None:
+                try:
+                    emotion_partitions.ensure(row['timestamp'] for row in rows)
+                except PartitionDetachedError as e:
+                    return jsonify({'error': f'{e}: no se aceptan emociones de ese mes'}), 400
+            db.session.execute(db.insert(EmocionDetectada), rows)
+            emotion_rollups.record_inserted(rows, psicologo_id=propietario)
+            db.session.commit()
+        
+        return jsonify({
+            'message': f'{len(rows)} emociones guardadas',
+            'insertadas': len(rows),
+            'rechazadas': len(errores),
+            'errores': errores
+        }), 201 if rows else 400
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error guardando lote de emociones: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # Endpoint para actualizar sesion con resumen de emociones
 @app.route('/api/sesiones/<int:sesion_id>/finalizar', methods=['PUT'])
 @token_required
@@ -1161,6 +1671,9 @@ def finalizar_sesion(sesion_id):
         if sesion.psicologo_id != psicologo.id:
             return jsonify({'error': 'No tienes permiso para modificar esta sesión'}), 403
         
+        # Las emociones de la sesión que sigan en el buffer se escriben antes de cerrarla
+        flush_emotion_buffer()
+        
         # Actualizar datos de la sesion
         if data.get('duracion_minutos'):
             sesion.duracion_minutos = data['duracion_minutos']
@@ -1171,8 +1684,22 @@ def finalizar_sesion(sesion_id):
         if data.get('confianza_promedio'):
             sesion.confianza_promedio = data['confianza_promedio']
         
+        # Empaquetar las emociones de la sesión en su línea de tiempo compacta
+        if Config.SESSION_TIMELINE_ENABLED:
+            try:
+                pack_session_timeline(sesion_id)
+            except ValueError as e:
+                # Sin empaquetar (p. ej. un intervalo mayor a un delta uint32): las filas siguen
+                # siendo la fuente de la sesión
+                logger.warning(f"Línea de tiempo de la sesión {sesion_id} sin empaquetar: {e}")
+        
         db.session.commit()
         
+        # La sesión en vivo terminó: se libera su seguimiento de rostros y su caché de frames
+        if inference is not None:
+            inference.discard_session((psicologo.id, sesion_id))
+        record_sampler.discard((psicologo.id, sesion_id))
+        
         return jsonify({
             'message': 'Sesion finalizada exitosamente',
             'sesion': sesion.to_dict()
@@ -1194,29 +1721,32 @@ def obtener_resumen_estadisticas(psicologo_id):
         if psicologo.id != psicologo_id:
             return jsonify({'error': 'No autorizado'}), 403
         
-        # Total de sesiones
-        total_sesiones = Sesion.query.filter_by(psicologo_id=psicologo_id).count()
-        logger.info(f"Total sesiones para psicólogo {psicologo_id}: {total_sesiones}")
-        
-        # Total de pacientes
-        total_pacientes = Paciente.query.filter_by(psicologo_id=psicologo_id).count()
-        logger.info(f"Total pacientes para psicólogo {psicologo_id}: {total_pacientes}")
-        
-        # Confianza promedio
-        sesiones = Sesion.query.filter_by(psicologo_id=psicologo_id).all()
-        if sesiones:
-            confianza_promedio = sum(s.confianza_promedio for s in sesiones if s.confianza_promedio) / len(sesiones)
-        else:
-            confianza_promedio = 0
-        
-        # Emoción predominante
-        emociones = {}
-        for sesion in sesiones:
-            if sesion.emocion_predominante:
-                emocion = sesion.emocion_predominante
-                emociones[emocion] = emociones.get(emocion, 0) + 1
-        
-        emocion_predominante = max(emociones, key=emociones.get) if emociones else 'N/A'
+        # Totales, confianza promedio y emoción predominante en una sola sentencia: las
+        # agregaciones se hacen en SQL en lugar de cargar todas las sesiones
+        total_pacientes = db.select(db.func.count()).where(
+            Paciente.psicologo_id == psicologo_id
+        ).scalar_subquery()
+        # Moda de emocion_predominante (empates por nombre, para un resultado estable)
+        moda = db.select(Sesion.emocion_predominante).where(
+            Sesion.psicologo_id == psicologo_id,
+            Sesion.emocion_predominante.isnot(None),
+            Sesion.emocion_predominante != ''
+        ).group_by(Sesion.emocion_predominante).order_by(
+            db.func.count().desc(), Sesion.emocion_predominante
+        ).limit(1).scalar_subquery()
+        total_sesiones, suma_confianza, total_pacientes, emocion_predominante = db.session.execute(
+            db.select(
+                db.func.count(Sesion.id),
+                db.func.sum(Sesion.confianza_promedio),
+                total_pacientes,
+                moda
+            ).where(Sesion.psicologo_id == psicologo_id)
+        ).one()
+        logger.info(f"Resumen para psicólogo {psicologo_id}: {total_sesiones} sesiones, {total_pacientes} pacientes")
+        
+        # Las sesiones sin confianza cuentan como 0, igual que antes
+        confianza_promedio = (suma_confianza or 0) / total_sesiones if total_sesiones else 0
+        emocion_predominante = emocion_predominante or 'N/A'
         
         # Mapeo de emociones en inglés a español
         emotion_map = {
@@ -1250,22 +1780,14 @@ def obtener_estadisticas_emociones(psicologo_id):
         if psicologo.id != psicologo_id:
             return jsonify({'error': 'No autorizado'}), 403
         
-        # Obtener todas las emociones detectadas
-        sesiones = Sesion.query.filter_by(psicologo_id=psicologo_id).all()
-        sesion_ids = [s.id for s in sesiones]
-        
-        emociones_detectadas = EmocionDetectada.query.filter(
-            EmocionDetectada.sesion_id.in_(sesion_ids)
-        ).all()
-        
-        # Contar emociones
-        emotion_counts = {}
-        total = 0
-        
-        for emocion in emociones_detectadas:
-            emotion = emocion.emotion
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-            total += 1
+        # Conteo por emoción desde los rollups diarios (una fila por día y emoción)
+        emotion_counts = dict(db.session.query(
+            EmocionResumenDiario.emotion,
+            db.func.sum(EmocionResumenDiario.cantidad)
+        ).filter(
+            EmocionResumenDiario.psicologo_id == psicologo_id
+        ).group_by(EmocionResumenDiario.emotion).all())
+        total = sum(emotion_counts.values())
         
         # Calcular porcentajes
         result = []
@@ -1324,7 +1846,9 @@ def obtener_estadisticas_sesiones_mensuales(psicologo_id):
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # SIGTERM (PM2, docker stop) termina con SystemExit para que atexit vacíe el buffer de emociones
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     with app.app_context():
         db.create_all()
         print("Base de datos inicializada")
-    app.run(debug=False, port=5000, use_reloader=False)
\ No newline at end of file
+    app.run(debug=False, port=int(os.environ.get('PORT', 5000)), use_reloader=False)
\ No newline at end of file
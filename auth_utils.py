@@ -1,11 +1,147 @@
 import jwt
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify, current_app
-from models import Psicologo
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import db, Psicologo
 
-def generate_token(psicologo_id):
-    """Genera un token JWT para un psicólogo"""
+class AuthenticatedPsicologo:
+    """Psicólogo autenticado de la request: solo los datos que viajan en el token o que se
+    guardan en caché. Para leer o modificar la fila completa usar load_current_psicologo()"""
+    __slots__ = ('id', 'nombre_usuario')
+
+    def __init__(self, id, nombre_usuario=None):
+        self.id = id
+        self.nombre_usuario = nombre_usuario
+
+class AuthCache:
+    """Caché de autenticación del proceso.
+
+    - Psicólogos autenticados por id durante ttl_s segundos: token_required no consulta la
+      base de datos en cada request. Las entradas se invalidan al hacer commit de una
+      modificación o eliminación de un Psicologo en este proceso; en los demás procesos
+      vencen con el TTL.
+    - Memo LRU de hasta token_memo_size tokens ya verificados (firma y decodificación) hasta
+      su expiración.
+    - stateless: los tokens que traen los claims del psicólogo se aceptan sin consultar la
+      base de datos; un psicólogo eliminado conserva el acceso hasta que su token expira.
+    """
+
+    def __init__(self, ttl_s=0, token_memo_size=0, stateless=False):
+        self._lock = threading.Lock()
+        self._principals = {}
+        self._tokens = OrderedDict()
+        # Invalidaciones por id: una consulta que empezó antes de una invalidación no se guarda
+        self._versions = {}
+        self.configure(ttl_s, token_memo_size, stateless)
+
+        # Estadísticas
+        self.principal_hits = 0
+        self.principal_misses = 0
+        self.token_hits = 0
+        self.token_misses = 0
+
+    def configure(self, ttl_s, token_memo_size, stateless=False):
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.token_memo_size = max(0, int(token_memo_size))
+        self.stateless = stateless
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._principals.clear()
+            self._tokens.clear()
+
+    def version(self, psicologo_id):
+        return self._versions.get(psicologo_id, 0)
+
+    def get_principal(self, psicologo_id):
+        with self._lock:
+            entry = self._principals.get(psicologo_id)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self.principal_hits += 1
+                    return entry[0]
+                del self._principals[psicologo_id]
+            self.principal_misses += 1
+        return None
+
+    def put_principal(self, principal, version):
+        if not self.ttl_s:
+            return
+        with self._lock:
+            if self._versions.get(principal.id, 0) == version:
+                self._principals[principal.id] = (principal, time.monotonic() + self.ttl_s)
+
+    def invalidate(self, psicologo_id):
+        with self._lock:
+            self._versions[psicologo_id] = self._versions.get(psicologo_id, 0) + 1
+            self._principals.pop(psicologo_id, None)
+
+    def get_token(self, token):
+        with self._lock:
+            payload = self._tokens.get(token)
+            if payload is not None:
+                if payload['exp'] > time.time():
+                    self._tokens.move_to_end(token)
+                    self.token_hits += 1
+                    return payload
+                del self._tokens[token]
+        self.token_misses += 1
+        return None
+
+    def put_token(self, token, payload):
+        if not self.token_memo_size:
+            return
+        with self._lock:
+            self._tokens[token] = payload
+            while len(self._tokens) > self.token_memo_size:
+                self._tokens.popitem(last=False)
+
+    def get_stats(self):
+        return {
+            'principal_ttl_s': self.ttl_s,
+            'principals_cached': len(self._principals),
+            'principal_hits': self.principal_hits,
+            'principal_misses': self.principal_misses,
+            'tokens_memoized': len(self._tokens),
+            'token_hits': self.token_hits,
+            'token_misses': self.token_misses,
+            'stateless': self.stateless
+        }
+
+auth_cache = AuthCache()
+
+def configure_auth(principal_ttl_s=0, token_memo_size=0, stateless=False):
+    """Configura la caché de autenticación del proceso (ver AuthCache)"""
+    auth_cache.configure(principal_ttl_s, token_memo_size, stateless)
+
+# Invalidación: los cambios de un psicólogo (datos, contraseña, eliminación) se aplican a la
+# caché cuando la transacción hace commit, no antes
+@event.listens_for(Psicologo, 'after_update')
+@event.listens_for(Psicologo, 'after_delete')
+def _psicologo_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('auth_invalidate', set()).add(target.id)
+    auth_cache.invalidate(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for psicologo_id in session.info.pop('auth_invalidate', ()):
+        auth_cache.invalidate(psicologo_id)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_invalidations(session, previous_transaction):
+    session.info.pop('auth_invalidate', None)
+
+def generate_token(psicologo_id, nombre_usuario=None):
+    """Genera un token JWT para un psicólogo. Con nombre_usuario el token lleva los claims
+    que el modo sin estado (AUTH_STATELESS) necesita para autenticar sin la base de datos"""
     try:
         # Usar la clave secreta directamente desde la configuración
         secret_key = current_app.config.get('JWT_SECRET_KEY') or current_app.config.get('SECRET_KEY')
@@ -18,6 +154,8 @@ def generate_token(psicologo_id):
             'iat': datetime.utcnow(),
             'sub': str(psicologo_id)  # Convertir a string
         }
+        if nombre_usuario is not None:
+            payload['usr'] = nombre_usuario
         token = jwt.encode(
             payload, 
             secret_key, 
@@ -28,8 +166,11 @@ def generate_token(psicologo_id):
         print(f"Error generando token: {e}")
         return None
 
-def verify_token(token):
-    """Verifica un token JWT y retorna el ID del psicólogo"""
+def decode_token(token):
+    """Verifica un token JWT y retorna su payload (None si no es válido o expiró)"""
+    payload = auth_cache.get_token(token)
+    if payload is not None:
+        return payload
     try:
         # Usar la clave secreta directamente desde la configuración
         secret_key = current_app.config.get('JWT_SECRET_KEY') or current_app.config.get('SECRET_KEY')
@@ -42,7 +183,9 @@ def verify_token(token):
             secret_key, 
             algorithms=['HS256']
         )
-        return int(payload['sub'])  # Convertir de string a int
+        payload['sub'] = int(payload['sub'])  # Convertir de string a int
+        auth_cache.put_token(token, payload)
+        return payload
     except jwt.ExpiredSignatureError as e:
         print(f"Token expirado: {e}")
         return None
@@ -53,6 +196,36 @@ def verify_token(token):
         print(f"Error verificando token: {e}")
         return None
 
+def verify_token(token):
+    """Verifica un token JWT y retorna el ID del psicólogo"""
+    payload = decode_token(token)
+    return payload['sub'] if payload else None
+
+def authenticate(token):
+    """Psicólogo autenticado por un token (None si el token no es válido o el psicólogo no existe)"""
+    payload = decode_token(token)
+    return principal_from_payload(payload) if payload else None
+
+def principal_from_payload(payload):
+    """Psicólogo de un token ya verificado (None si el psicólogo no existe)"""
+    psicologo_id = payload['sub']
+
+    if auth_cache.stateless and 'usr' in payload:
+        return AuthenticatedPsicologo(psicologo_id, payload['usr'])
+
+    principal = auth_cache.get_principal(psicologo_id)
+    if principal is not None:
+        return principal
+
+    # Verificar que el psicólogo existe
+    version = auth_cache.version(psicologo_id)
+    row = db.session.query(Psicologo.id, Psicologo.nombre_usuario).filter(Psicologo.id == psicologo_id).first()
+    if row is None:
+        return None
+    principal = AuthenticatedPsicologo(row.id, row.nombre_usuario)
+    auth_cache.put_principal(principal, version)
+    return principal
+
 def token_required(f):
     """Decorador para requerir autenticación JWT"""
     @wraps(f)
@@ -71,12 +244,11 @@ def token_required(f):
             return jsonify({'error': 'Token de acceso requerido'}), 401
         
         try:
-            psicologo_id = verify_token(token)
-            if not psicologo_id:
+            payload = decode_token(token)
+            if not payload:
                 return jsonify({'error': 'Token inválido o expirado'}), 401
             
-            # Verificar que el psicólogo existe
-            psicologo = Psicologo.query.get(psicologo_id)
+            psicologo = principal_from_payload(payload)
             if not psicologo:
                 return jsonify({'error': 'Usuario no encontrado'}), 401
             
@@ -92,5 +264,10 @@ def token_required(f):
     return decorated
 
 def get_current_psicologo():
-    """Obtiene el psicólogo actual del contexto de la request"""
+    """Obtiene el psicólogo actual del contexto de la request (AuthenticatedPsicologo)"""
     return getattr(request, 'current_psicologo', None)
+
+def load_current_psicologo():
+    """Fila de Psicologo del psicólogo actual, para leer o modificar sus datos"""
+    psicologo = get_current_psicologo()
+    return db.session.get(Psicologo, psicologo.id) if psicologo is not None else None
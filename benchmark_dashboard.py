@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark del endpoint de estadísticas del dashboard
+Compara la implementación anterior (un COUNT por contador y un Paciente.query.get por
+sesión reciente) con la actual (agregación condicional sobre los rollups diarios), sobre
+una base de datos sembrada con EMOCIONES filas de EmocionDetectada. Reporta consultas SQL
+por request y mediana de latencia.
+Ejecutar con: python benchmark_dashboard.py [--db /tmp/dashboard_bench.db] [--emociones 1000000] [--repeticiones 5]
+Con DATABASE_URL definida se usa esa base de datos en lugar de --db (no se vuelve a
+sembrar si ya tiene datos).
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='/tmp/dashboard_bench.db', help='Archivo SQLite a sembrar')
+    parser.add_argument('--emociones', type=int, default=1_000_000)
+    parser.add_argument('--psicologos', type=int, default=4, help='El primero es el medido; el resto agrega ruido')
+    parser.add_argument('--pacientes', type=int, default=50, help='Pacientes por psicólogo')
+    parser.add_argument('--sesiones', type=int, default=10, help='Sesiones por paciente')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    return parser.parse_args()
+
+
+args = parse_args()
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(args.db)}"
+os.environ.setdefault('PROCESS_ROLE', 'api')
+
+from sqlalchemy import event, insert
+
+import app as app_module
+import emotion_rollups
+from app import app, db, month_bucket
+from models import EmocionDetectada, EmocionResumenDiario, Paciente, Psicologo, Sesion
+
+EMOCIONES = ['happy', 'neutral', 'sad', 'angry', 'surprise', 'fear', 'disgust']
+LOTE = 50_000
+
+
+def sembrar(args):
+    """Siembra psicólogos, pacientes, sesiones y emociones repartidas en los últimos 200 días"""
+    rng = random.Random(0)
+    ahora = datetime.utcnow()
+    db.create_all()
+    if db.session.query(EmocionDetectada.id).limit(1).first() is not None:
+        print("La base de datos ya tiene emociones; se reutiliza")
+        if db.session.query(EmocionResumenDiario.psicologo_id).limit(1).first() is None:
+            print(f"Rollups construidos: {emotion_rollups.rebuild()} filas")
+            db.session.commit()
+        return
+
+    print(f"Sembrando {args.emociones:,} emociones...")
+    inicio = time.perf_counter()
+    sesiones = []
+    for p in range(args.psicologos):
+        psicologo = Psicologo(
+            nombre_completo=f'Psicólogo {p}', cedula_profesional=f'BENCH{p}', especializacion='Clínica',
+            telefono='5550000000', email=f'bench{p}@example.com', nombre_usuario=f'bench{p}', password_hash='x'
+        )
+        db.session.add(psicologo)
+        db.session.flush()
+        for n in range(args.pacientes):
+            paciente = Paciente(
+                nombre_completo=f'Paciente {p}-{n}', fecha_nacimiento=date(1990, 1, 1), telefono='5550000000',
+                email=f'paciente{p}-{n}@example.com', psicologo_id=psicologo.id,
+                fecha_registro=ahora - timedelta(days=rng.randint(0, 365))
+            )
+            db.session.add(paciente)
+            db.session.flush()
+            for _ in range(args.sesiones):
+                sesion = Sesion(
+                    paciente_id=paciente.id, psicologo_id=psicologo.id,
+                    fecha_sesion=ahora - timedelta(days=rng.randint(0, 200), minutes=rng.randint(60, 120))
+                )
+                db.session.add(sesion)
+                db.session.flush()
+                sesiones.append((sesion.id, sesion.fecha_sesion))
+    db.session.commit()
+
+    restantes = args.emociones
+    while restantes > 0:
+        filas = []
+        for _ in range(min(LOTE, restantes)):
+            sesion_id, fecha = rng.choice(sesiones)
+            filas.append({
+                'sesion_id': sesion_id,
+                'emotion': rng.choice(EMOCIONES),
+                'confidence': rng.random(),
+                'timestamp': fecha + timedelta(seconds=rng.randint(0, 3600))
+            })
+        db.session.execute(insert(EmocionDetectada), filas)
+        db.session.commit()
+        restantes -= len(filas)
+    filas_rollup = emotion_rollups.rebuild()
+    db.session.commit()
+    print(f"Sembrado en {time.perf_counter() - inicio:.1f} s ({filas_rollup} filas de rollup)")
+
+
+def dashboard_anterior(psicologo_id):
+    """Consultas de la implementación previa (date_trunc portado con month_bucket)"""
+    hace_30_dias = datetime.utcnow() - timedelta(days=30)
+    hoy = datetime.utcnow().date()
+    resultado = {
+        'total_pacientes': Paciente.query.filter_by(psicologo_id=psicologo_id).count(),
+        'total_sesiones': Sesion.query.filter_by(psicologo_id=psicologo_id).count(),
+        'nuevos_pacientes': Paciente.query.filter(
+            Paciente.psicologo_id == psicologo_id, Paciente.fecha_registro >= hace_30_dias
+        ).count(),
+        'sesiones_hoy': Sesion.query.filter(
+            Sesion.psicologo_id == psicologo_id, db.func.date(Sesion.fecha_sesion) == hoy
+        ).count(),
+        'total_emociones': EmocionDetectada.query.join(Sesion).filter(Sesion.psicologo_id == psicologo_id).count(),
+        'emociones_hoy': EmocionDetectada.query.join(Sesion).filter(
+            Sesion.psicologo_id == psicologo_id, db.func.date(EmocionDetectada.timestamp) == hoy
+        ).count(),
+        'emociones_positivas': EmocionDetectada.query.join(Sesion).filter(
+            Sesion.psicologo_id == psicologo_id, EmocionDetectada.emotion.in_(['happy', 'neutral'])
+        ).count()
+    }
+    mes_expr = month_bucket(EmocionDetectada.timestamp)
+    db.session.query(mes_expr, EmocionDetectada.emotion, db.func.count(EmocionDetectada.id)).join(Sesion).filter(
+        Sesion.psicologo_id == psicologo_id, EmocionDetectada.timestamp >= datetime.utcnow() - timedelta(days=180)
+    ).group_by(mes_expr, EmocionDetectada.emotion).all()
+    for sesion in Sesion.query.filter_by(psicologo_id=psicologo_id).order_by(Sesion.fecha_sesion.desc()).limit(5).all():
+        Paciente.query.get(sesion.paciente_id)
+    return resultado
+
+
+def dashboard_actual(psicologo_id):
+    """Vista actual sin el decorador de autenticación"""
+    response, status = app_module.get_dashboard_stats.__wrapped__(psicologo_id)
+    assert status == 200, response.get_json()
+    return response.get_json()['estadisticas']
+
+
+class ContadorConsultas:
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args, **kwargs):
+        self.total += 1
+
+
+def medir(fn, psicologo_id, repeticiones, contador):
+    """Retorna (resultado, consultas por llamada, mediana de latencia en ms)"""
+    with app.test_request_context():
+        resultado = fn(psicologo_id)  # Calentamiento (caché de páginas de SQLite)
+        db.session.remove()
+    tiempos = []
+    consultas = 0
+    for _ in range(repeticiones):
+        with app.test_request_context():
+            antes = contador.total
+            inicio = time.perf_counter()
+            fn(psicologo_id)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = contador.total - antes
+            db.session.remove()
+    return resultado, consultas, statistics.median(tiempos)
+
+
+def main():
+    with app.app_context():
+        sembrar(args)
+        psicologo_id = db.session.query(db.func.min(Psicologo.id)).scalar()
+        total = db.session.query(db.func.count(EmocionDetectada.id)).scalar()
+        contador = ContadorConsultas(db.engine)
+
+        motor = db.engine.dialect.name
+    print(f"Motor: {motor}")
+    print(f"Emociones: {total:,} | psicólogo medido: {psicologo_id} | repeticiones: {args.repeticiones}\n")
+
+    anterior, consultas_anterior, ms_anterior = medir(dashboard_anterior, psicologo_id, args.repeticiones, contador)
+    actual, consultas_actual, ms_actual = medir(dashboard_actual, psicologo_id, args.repeticiones, contador)
+
+    for clave in ('total_pacientes', 'nuevos_pacientes', 'total_sesiones', 'sesiones_hoy', 'total_emociones', 'emociones_hoy'):
+        assert anterior[clave] == actual[clave], f"{clave}: {anterior[clave]} != {actual[clave]}"
+
+    print(f"{'implementación':<28}{'consultas':>10}{'mediana ms':>14}")
+    print(f"{'anterior (COUNT por campo)':<28}{consultas_anterior:>10}{ms_anterior:>14.1f}")
+    print(f"{'actual (rollups)':<28}{consultas_actual:>10}{ms_actual:>14.1f}")
+    print(f"\nConsultas: -{consultas_anterior - consultas_actual} | aceleración: {ms_anterior / ms_actual:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
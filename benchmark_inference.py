@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia de inferencia de emociones por frame
+- clasificacion: clasificar cada rostro por separado contra una sola pasada en lote
+- postproceso: bucle por detección contra el post-procesamiento vectorizado (frames 1080p)
+Ejecutar con: python benchmark_inference.py [--modo clasificacion|postproceso] [--max-rostros 8] [--repeticiones 30]
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+
+import cv2
+import numpy as np
+
+from config import Config
+from face_pipeline import detections_to_boxes, crop_faces
+
+
+def generar_rostros(n, seed=0):
+    """Genera n recortes sintéticos de 48x48 en escala de grises"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(n, 48, 48, 1)).astype('float32')
+
+
+def medir(fn, repeticiones):
+    """Retorna la mediana de latencia en milisegundos"""
+    fn()  # Calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def generar_detecciones(n, seed=0):
+    """Salida sintética del detector SSD: 200 detecciones, n por encima del umbral"""
+    rng = np.random.default_rng(seed)
+    detecciones = np.zeros((1, 1, 200, 7), dtype=np.float32)
+    detecciones[0, 0, :, 2] = rng.uniform(0.0, 0.25, 200)
+    detecciones[0, 0, :n, 2] = rng.uniform(0.5, 1.0, n)
+    esquinas = rng.uniform(-0.05, 0.8, (200, 2))
+    detecciones[0, 0, :, 3:5] = esquinas
+    detecciones[0, 0, :, 5:7] = esquinas + rng.uniform(0.05, 0.25, (200, 2))
+    return detecciones
+
+
+def postproceso_anterior(frame, detections):
+    """Bucle por detección con conversión de color por rostro (implementación previa)"""
+    faces = []
+    for i in range(0, detections.shape[2]):
+        confidence = detections[0, 0, i, 2]
+        if confidence > 0.3:
+            (h, w) = frame.shape[:2]
+            box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
+            (Xi, Yi, Xf, Yf) = box.astype("int")
+            if Xi < 0: Xi = 0
+            if Yi < 0: Yi = 0
+            if Xf > w: Xf = w
+            if Yf > h: Yf = h
+            face = frame[Yi:Yf, Xi:Xf]
+            if face.shape[0] == 0 or face.shape[1] == 0:
+                continue
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+            face = cv2.resize(face, (48, 48))
+            face2 = np.asarray(face, dtype='float32')[..., np.newaxis]
+            faces.append(np.expand_dims(face2, axis=0))
+    return np.concatenate(faces) if faces else None
+
+
+def postproceso_vectorizado(frame, detections):
+    boxes = detections_to_boxes(detections, [frame.shape[:2]])
+    faces, _, _ = crop_faces([frame], boxes)
+    return faces
+
+
+def benchmark_postproceso(args):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(1080, 1920, 3), dtype=np.uint8)
+
+    print("\n" + "=" * 60)
+    print("Post-procesamiento de detecciones en frames 1080p")
+    print(f"{'Rostros':>8} | {'Anterior (ms)':>14} | {'Vectorizado (ms)':>17} | {'Mejora':>7}")
+    print("=" * 60)
+
+    for n in range(1, args.max_rostros + 1):
+        detecciones = generar_detecciones(n, seed=n)
+        anterior = postproceso_anterior(frame, detecciones)
+        vectorizado = postproceso_vectorizado(frame, detecciones)
+        assert np.array_equal(anterior, vectorizado), "Los recortes no coinciden"
+
+        t_anterior = medir(lambda: postproceso_anterior(frame, detecciones), args.repeticiones)
+        t_vectorizado = medir(lambda: postproceso_vectorizado(frame, detecciones), args.repeticiones)
+        print(f"{n:>8} | {t_anterior:>14.3f} | {t_vectorizado:>17.3f} | {t_anterior / t_vectorizado:>6.1f}x")
+
+    print("=" * 60)
+
+
+def benchmark_clasificacion(args):
+    from tensorflow.keras.models import load_model
+
+    print(f"Cargando modelo de emociones desde {Config.MODEL_PATH}...")
+    emotionModel = load_model(Config.MODEL_PATH)
+
+    print("\n" + "=" * 60)
+    print(f"{'Rostros':>8} | {'Por rostro (ms)':>16} | {'En lote (ms)':>13} | {'Mejora':>7}")
+    print("=" * 60)
+
+    for n in range(1, args.max_rostros + 1):
+        rostros = generar_rostros(n)
+
+        def por_rostro():
+            for i in range(n):
+                emotionModel.predict(rostros[i:i + 1], verbose=0)
+
+        def en_lote():
+            emotionModel.predict(rostros, verbose=0)
+
+        t_individual = medir(por_rostro, args.repeticiones)
+        t_lote = medir(en_lote, args.repeticiones)
+        print(f"{n:>8} | {t_individual:>16.2f} | {t_lote:>13.2f} | {t_individual / t_lote:>6.1f}x")
+
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inferencia de emociones')
+    parser.add_argument('--modo', choices=['clasificacion', 'postproceso'], default='clasificacion')
+    parser.add_argument('--max-rostros', type=int, default=8)
+    parser.add_argument('--repeticiones', type=int, default=30)
+    args = parser.parse_args()
+
+    if args.modo == 'postproceso':
+        benchmark_postproceso(args)
+    else:
+        benchmark_clasificacion(args)
+
+
+if __name__ == '__main__':
+    main()
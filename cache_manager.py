@@ -3,24 +3,34 @@ Sistema de caché para producción
 Incluye Redis, caché de predicciones y invalidación inteligente
 """
 
-import redis
 import json
 import pickle
 import hashlib
+import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta
 from functools import wraps
 import logging
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
 logger = logging.getLogger(__name__)
 
 class CacheManager:
     """Gestor de caché con Redis"""
     
     def __init__(self, redis_url='redis://localhost:6379/0', default_timeout=300):
-        self.redis_client = redis.from_url(redis_url, decode_responses=True)
         self.default_timeout = default_timeout
         self.prefix = "emotion_detection:"
+        if redis is None:
+            logger.warning("Paquete redis no instalado; caché compartido deshabilitado")
+            self.redis_client = None
+            return
+        self.redis_client = redis.from_url(redis_url, decode_responses=True)
         
         # Verificar conexión
         try:
@@ -121,16 +131,62 @@ class CacheManager:
             return {}
 
 class EmotionCache:
-    """Caché específico para predicciones de emociones"""
+    """Caché específico para predicciones de emociones.
+
+    Con fingerprint_mode='md5' la clave es el MD5 de los bytes de la imagen (solo
+    coinciden imágenes idénticas). Con 'dhash' o 'phash' se usa una huella perceptual
+    del frame decodificado y, dentro de una sesión en vivo, un frame cuya huella está a
+    una distancia de Hamming <= hamming_threshold de un frame ya inferido reutiliza su
+    resultado sin correr la inferencia.
+    """
     
-    def __init__(self, cache_manager):
+    def __init__(self, cache_manager, fingerprint_mode='md5', hamming_threshold=6,
+                 session_history=4, max_age_seconds=2.0, session_ttl=300):
+        if fingerprint_mode not in ('md5', 'dhash', 'phash'):
+            raise ValueError("fingerprint_mode debe ser 'md5', 'dhash' o 'phash'")
         self.cache_manager = cache_manager
         self.emotion_timeout = 3600  # 1 hora
         self.session_timeout = 7200  # 2 horas
+        
+        self.fingerprint_mode = fingerprint_mode
+        self.hamming_threshold = hamming_threshold
+        self.session_history = session_history
+        # Un resultado se reutiliza a lo sumo durante max_age_seconds aunque el frame no cambie
+        self.max_age_seconds = max_age_seconds
+        self.session_ttl = session_ttl
+        
+        # Últimos frames inferidos por sesión: deque de (huella, clave de forma, resultado, instante)
+        self._session_frames = {}
+        self._session_used = {}
+        self._lock = threading.Lock()
+        self._lookups = 0
+        self._hits = 0
+        self._expired_hits = 0
+        # Distancia al frame más parecido de cada consulta (para ajustar el umbral)
+        self._nearest_distances = [0] * 65
+    
+    @property
+    def perceptual(self):
+        return self.fingerprint_mode != 'md5'
     
     def _generate_image_hash(self, image_data):
-        """Generar hash único para imagen"""
-        return hashlib.md5(image_data).hexdigest()
+        """Generar hash para imagen: MD5 de los bytes o huella perceptual en hexadecimal"""
+        if not self.perceptual:
+            return hashlib.md5(image_data).hexdigest()
+        return f"{self._fingerprint(image_data):016x}"
+    
+    def _fingerprint(self, image_data):
+        """Huella perceptual de un frame decodificado o de los bytes de la imagen"""
+        import cv2
+        import numpy as np
+        from frame_fingerprint import image_fingerprint
+        
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            # Basta una versión reducida en gris para la huella
+            image_data = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            if image_data is None:
+                raise ValueError('No se pudo decodificar la imagen')
+        return image_fingerprint(image_data, self.fingerprint_mode)
     
     def cache_emotion_prediction(self, image_data, emotion_result):
         """Almacenar predicción de emoción en caché"""
@@ -158,6 +214,92 @@ class EmotionCache:
         
         return None
     
+    def get_session_frame_prediction(self, session_key, frame, shape_key=None):
+        """Busca el resultado de un frame casi idéntico ya inferido en la sesión.
+        
+        Retorna (resultado o None, huella); la huella se pasa a cache_session_frame_prediction
+        cuando hubo que inferir. shape_key distingue frames que no son comparables aunque
+        se parezcan (resolución, escala de decodificación, calidad).
+        """
+        from frame_fingerprint import hamming_distance
+        
+        fingerprint = self._fingerprint(frame)
+        now = time.monotonic()
+        with self._lock:
+            self._expire_sessions(now)
+            self._lookups += 1
+            self._session_used[session_key] = now
+            entries = self._session_frames.get(session_key, ())
+            
+            best = None
+            best_distance = None
+            for entry_fingerprint, entry_shape, result, stored_at in entries:
+                if entry_shape != shape_key:
+                    continue
+                distance = hamming_distance(fingerprint, entry_fingerprint)
+                if best_distance is None or distance < best_distance:
+                    best, best_distance = (result, stored_at), distance
+            if best_distance is not None:
+                self._nearest_distances[best_distance] += 1
+            
+            if best is None or best_distance > self.hamming_threshold:
+                return None, fingerprint
+            if now - best[1] > self.max_age_seconds:
+                self._expired_hits += 1
+                return None, fingerprint
+            self._hits += 1
+            return best[0], fingerprint
+    
+    def cache_session_frame_prediction(self, session_key, fingerprint, result, shape_key=None):
+        """Registra el resultado de un frame inferido en la sesión.
+        
+        Solo se guardan frames inferidos: comparar contra ellos (y no contra el último frame
+        servido desde el caché) evita que una escena que cambia despacio arrastre un
+        resultado viejo indefinidamente.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entries = self._session_frames.get(session_key)
+            if entries is None:
+                entries = self._session_frames[session_key] = deque(maxlen=max(1, self.session_history))
+            entries.append((fingerprint, shape_key, result, now))
+            self._session_used[session_key] = now
+    
+    def discard_session_frames(self, session_key):
+        """Libera los frames de una sesión finalizada"""
+        with self._lock:
+            self._session_frames.pop(session_key, None)
+            self._session_used.pop(session_key, None)
+    
+    def _expire_sessions(self, now):
+        for key in [k for k, used in self._session_used.items() if now - used > self.session_ttl]:
+            self._session_frames.pop(key, None)
+            self._session_used.pop(key, None)
+    
+    def get_frame_cache_stats(self):
+        """Tasa de aciertos del caché por sesión y distribución de distancias para ajustar el umbral"""
+        with self._lock:
+            lookups = self._lookups
+            compared = sum(self._nearest_distances)
+            # Fracción de consultas que acertarían con cada umbral posible (ignorando la antigüedad)
+            cumulative = 0
+            hit_rate_by_threshold = {}
+            for distance in range(0, 17):
+                cumulative += self._nearest_distances[distance]
+                hit_rate_by_threshold[distance] = round(cumulative / lookups, 3) if lookups else 0
+            return {
+                'mode': self.fingerprint_mode,
+                'hamming_threshold': self.hamming_threshold,
+                'active_sessions': len(self._session_frames),
+                'lookups': lookups,
+                'hits': self._hits,
+                'misses': lookups - self._hits,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0,
+                'expired_hits': self._expired_hits,
+                'compared_lookups': compared,
+                'hit_rate_by_threshold': hit_rate_by_threshold
+            }
+    
     def cache_session_data(self, session_id, session_data):
         """Almacenar datos de sesión en caché"""
         key = f"session_data:{session_id}"
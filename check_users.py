@@ -1,4 +1,9 @@
 """Script para verificar usuarios en la base de datos"""
+import os
+
+# Solo se usa la base de datos: no cargar el stack de inferencia
+os.environ.setdefault('PROCESS_ROLE', 'api')
+
 from app import app, db
 from models import Psicologo
 
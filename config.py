@@ -39,8 +39,22 @@ class Config:
     
     # Configuración de archivos
     MODEL_PATH = os.path.join(os.path.dirname(__file__), 'modelFEC.h5')
+    # Variante del modelo TFLite: float32, float16 o int8 (generadas con quantize_model.py)
+    EMOTION_MODEL_VARIANT = os.environ.get('EMOTION_MODEL_VARIANT', 'float32').lower()
+    TFLITE_MODEL_FILES = {
+        'float32': 'modelFEC.tflite',
+        'float16': 'modelFEC_float16.tflite',
+        'int8': 'modelFEC_int8.tflite'
+    }
+    TFLITE_MODEL_PATH = os.environ.get('TFLITE_MODEL_PATH') or os.path.join(
+        os.path.dirname(__file__), TFLITE_MODEL_FILES.get(EMOTION_MODEL_VARIANT, 'modelFEC.tflite')
+    )
+    ONNX_MODEL_PATH = os.environ.get('ONNX_MODEL_PATH') or os.path.join(os.path.dirname(__file__), 'modelFEC.onnx')
     FACE_DETECTOR_PATH = os.path.join(os.path.dirname(__file__), 'face_detector')
     
+    # Tamaño máximo del cuerpo de las requests (frames en /predict y /predict/frame)
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 10 * 1024 * 1024))  # 10MB
+    
     # Configuración de la aplicación
     FLASK_ENV = os.environ.get('FLASK_ENV', 'development')
     FLASK_DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
@@ -50,3 +64,123 @@ class Config:
     EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD')  # Contraseña de aplicación de Gmail
     SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
     SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+    
+    # Configuración de inferencia por lotes (agrupa frames de requests concurrentes)
+    INFERENCE_BATCHING_ENABLED = os.environ.get('INFERENCE_BATCHING_ENABLED', 'True').lower() == 'true'
+    INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16))
+    INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+    INFERENCE_TIMEOUT_S = float(os.environ.get('INFERENCE_TIMEOUT_S', 30))
+    
+    # Backend del modelo de emociones: keras, tflite u onnx
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras').lower()
+    INFERENCE_NUM_THREADS = int(os.environ.get('INFERENCE_NUM_THREADS', 0)) or None
+    
+    @classmethod
+    def emotion_model_path(cls, backend=None):
+        """Ruta del archivo del modelo de emociones para el backend indicado"""
+        backend = backend or cls.INFERENCE_BACKEND
+        return {
+            'keras': cls.MODEL_PATH,
+            'tflite': cls.TFLITE_MODEL_PATH,
+            'onnx': cls.ONNX_MODEL_PATH
+        }.get(backend, cls.MODEL_PATH)
+    
+    # Seguimiento de rostros por sesión: el detector solo corre cada N frames
+    # o cuando la confianza del seguimiento cae por debajo del umbral
+    FACE_TRACKING_ENABLED = os.environ.get('FACE_TRACKING_ENABLED', 'True').lower() == 'true'
+    FACE_TRACKING_REDETECT_INTERVAL = int(os.environ.get('FACE_TRACKING_REDETECT_INTERVAL', 5))
+    FACE_TRACKING_MIN_SCORE = float(os.environ.get('FACE_TRACKING_MIN_SCORE', 0.6))
+    FACE_TRACKING_TTL_S = int(os.environ.get('FACE_TRACKING_TTL_S', 300))
+    
+    # Tamaño de entrada del detector de rostros y niveles de calidad por request
+    DETECTOR_INPUT_SIZE = int(os.environ.get('DETECTOR_INPUT_SIZE', 224))
+    DETECTOR_QUALITY_TIERS = {
+        'low': int(os.environ.get('DETECTOR_INPUT_SIZE_LOW', 160)),
+        'standard': DETECTOR_INPUT_SIZE,
+        'high': int(os.environ.get('DETECTOR_INPUT_SIZE_HIGH', 300))
+    }
+    DETECTOR_DEFAULT_QUALITY = os.environ.get('DETECTOR_DEFAULT_QUALITY', 'standard')
+    
+    # Caché de frames por sesión en vivo: un frame cuya huella perceptual (dhash o phash)
+    # difiere en <= FRAME_CACHE_HAMMING_THRESHOLD bits de un frame ya inferido reutiliza su resultado.
+    # Con FRAME_CACHE_MODE=md5 las sesiones en vivo no usan el caché de frames
+    FRAME_CACHE_ENABLED = os.environ.get('FRAME_CACHE_ENABLED', 'True').lower() == 'true'
+    FRAME_CACHE_MODE = os.environ.get('FRAME_CACHE_MODE', 'phash').lower()
+    FRAME_CACHE_HAMMING_THRESHOLD = int(os.environ.get('FRAME_CACHE_HAMMING_THRESHOLD', 6))
+    FRAME_CACHE_HISTORY = int(os.environ.get('FRAME_CACHE_HISTORY', 4))
+    FRAME_CACHE_MAX_AGE_S = float(os.environ.get('FRAME_CACHE_MAX_AGE_S', 2))
+    
+    # Fracción de frames con rostro que /predict/sesiones/<id> registra como EmocionDetectada
+    SESSION_RECORD_SAMPLE_RATE = float(os.environ.get('SESSION_RECORD_SAMPLE_RATE', 1.0))
+    
+    # Escritura diferida de EmocionDetectada (opcional): las filas se insertan en lote cada
+    # EMOTION_BUFFER_MAX_ROWS filas o EMOTION_BUFFER_MAX_DELAY_MS milisegundos, y hasta ese
+    # momento solo están en memoria. Con el buffer POST /api/sesiones/<id>/emociones responde
+    # 202 con pendiente=true y la emoción sin id. El buffer es del proceso: solo se usa con
+    # PROCESS_ROLE=both en un único proceso, donde finalizar una sesión vacía el buffer que
+    # tiene sus emociones antes de empaquetar la línea de tiempo
+    EMOTION_BUFFER_ENABLED = os.environ.get('EMOTION_BUFFER_ENABLED', 'False').lower() == 'true'
+    EMOTION_BUFFER_MAX_ROWS = int(os.environ.get('EMOTION_BUFFER_MAX_ROWS', 200))
+    EMOTION_BUFFER_MAX_DELAY_MS = int(os.environ.get('EMOTION_BUFFER_MAX_DELAY_MS', 1000))
+    EMOTION_BUFFER_MAX_PENDING = int(os.environ.get('EMOTION_BUFFER_MAX_PENDING', 50000))
+    
+    # Línea de tiempo compacta por sesión (códigos uint8, confianzas float16, deltas en ms):
+    # se empaqueta al finalizar la sesión y GET /api/sesiones/<id>?formato=columnar se lee de
+    # ella. SESSION_TIMELINE_PRUNE_ROWS elimina las filas de emociones ya empaquetadas (el
+    # detalle por filas de esas emociones queda sin id y con precisión float16)
+    SESSION_TIMELINE_ENABLED = os.environ.get('SESSION_TIMELINE_ENABLED', 'True').lower() == 'true'
+    SESSION_TIMELINE_PRUNE_ROWS = os.environ.get('SESSION_TIMELINE_PRUNE_ROWS', 'False').lower() == 'true'
+    
+    # Esquema particionado de emociones_detectadas (solo PostgreSQL, migrar antes con
+    # partition_emotions.py): particiones mensuales por timestamp creadas bajo demanda,
+    # emoción como código smallint e índice BRIN por tiempo
+    EMOTIONS_PARTITIONED = os.environ.get('EMOTIONS_PARTITIONED', 'False').lower() == 'true'
+    EMOTIONS_PARTITION_MONTHS_AHEAD = int(os.environ.get('EMOTIONS_PARTITION_MONTHS_AHEAD', 2))
+    if EMOTIONS_PARTITIONED and not SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        raise ValueError("EMOTIONS_PARTITIONED requiere PostgreSQL")
+    
+    # Máximo de emociones por request en POST /api/sesiones/<id>/emociones/lote
+    BULK_EMOTIONS_MAX_ITEMS = int(os.environ.get('BULK_EMOTIONS_MAX_ITEMS', 5000))
+    
+    # Paginación por cursor de los listados (?limit=&cursor=); sin limit se devuelve todo
+    LIST_DEFAULT_PAGE_SIZE = int(os.environ.get('LIST_DEFAULT_PAGE_SIZE', 50))
+    LIST_MAX_PAGE_SIZE = int(os.environ.get('LIST_MAX_PAGE_SIZE', 500))
+    
+    # Autenticación: el psicólogo autenticado se guarda en caché AUTH_PRINCIPAL_CACHE_TTL_S
+    # segundos (0 = consultar la base de datos en cada request) y se recuerdan hasta
+    # AUTH_TOKEN_MEMO_SIZE tokens ya verificados. Con AUTH_STATELESS=True los tokens con los
+    # claims del psicólogo se aceptan sin consultar la base de datos: un psicólogo eliminado
+    # conserva el acceso hasta que su token expira
+    AUTH_PRINCIPAL_CACHE_TTL_S = float(os.environ.get('AUTH_PRINCIPAL_CACHE_TTL_S', 30))
+    AUTH_TOKEN_MEMO_SIZE = int(os.environ.get('AUTH_TOKEN_MEMO_SIZE', 4096))
+    AUTH_STATELESS = os.environ.get('AUTH_STATELESS', 'False').lower() == 'true'
+    
+    # Modo de pruebas: acceder a una relación que la consulta no cargó lanza una excepción
+    # en lugar de emitir un SELECT por fila (detecta consultas N+1)
+    DB_RAISE_ON_LAZY_LOAD = os.environ.get('DB_RAISE_ON_LAZY_LOAD', 'False').lower() == 'true'
+    
+    # Lado mayor (px) a partir del cual los frames se decodifican reducidos;
+    # se anuncia a los clientes para que no envíen píxeles que se descartan
+    FRAME_MAX_USEFUL_SIZE = int(os.environ.get('FRAME_MAX_USEFUL_SIZE', 640))
+    
+    # Canal WebSocket de sesiones en vivo (requiere flask-sock)
+    STREAMING_ENABLED = os.environ.get('STREAMING_ENABLED', 'True').lower() == 'true'
+    STREAM_AUTH_TIMEOUT_S = float(os.environ.get('STREAM_AUTH_TIMEOUT_S', 10))
+    STREAM_PING_INTERVAL_S = int(os.environ.get('STREAM_PING_INTERVAL_S', 25))
+    
+    # Procesos de inferencia (0 = inferencia en el proceso de la API). Cada worker carga
+    # sus propios modelos y recibe los frames por memoria compartida
+    INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 0))
+    INFERENCE_WORKER_SLOTS = int(os.environ.get('INFERENCE_WORKER_SLOTS', 0)) or None  # 0 = 4 por worker
+    INFERENCE_WORKER_SLOT_BYTES = int(os.environ.get('INFERENCE_WORKER_SLOT_BYTES', 1920 * 1080 * 3))
+    
+    # Rol del proceso: api (pacientes, sesiones, estadísticas), inference (predicciones) o both.
+    # Los procesos con rol api no importan TensorFlow/OpenCV ni cargan los modelos
+    PROCESS_ROLE = os.environ.get('PROCESS_ROLE', 'both').lower()
+    if PROCESS_ROLE not in ('api', 'inference', 'both'):
+        raise ValueError("PROCESS_ROLE debe ser 'api', 'inference' o 'both'")
+    
+    # Ciclo de vida de los modelos: pasadas de calentamiento antes de declararlos listos y
+    # token para POST /predict/modelos/recargar (sin token el endpoint queda deshabilitado)
+    MODEL_WARMUP_RUNS = int(os.environ.get('MODEL_WARMUP_RUNS', 2))
+    MODEL_ADMIN_TOKEN = os.environ.get('MODEL_ADMIN_TOKEN')
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Convierte modelFEC.h5 a los formatos de los backends alternativos (TFLite y ONNX)
+y verifica que sus salidas coincidan con el modelo Keras original
+Ejecutar con: python convert_model.py [--formatos tflite onnx] [--frames carpeta/]
+"""
+import argparse
+import glob
+import os
+import sys
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+
+import cv2
+import numpy as np
+
+from config import Config
+from inference_backends import KerasBackend, load_emotion_backend
+
+
+def cargar_frames_parity(carpeta=None, cantidad=32, seed=1234):
+    """Conjunto fijo de rostros 48x48 para comparar salidas entre backends.
+
+    Si se indica una carpeta se usan sus imágenes (recortes de rostro), en orden
+    alfabético; si no, se generan recortes sintéticos con una semilla fija.
+    """
+    if carpeta:
+        rutas = sorted(
+            p for ext in ('*.jpg', '*.jpeg', '*.png')
+            for p in glob.glob(os.path.join(carpeta, ext))
+        )
+        rostros = []
+        for ruta in rutas:
+            imagen = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+            if imagen is not None:
+                rostros.append(cv2.resize(imagen, (48, 48)))
+        if not rostros:
+            raise ValueError(f"No se encontraron imágenes válidas en {carpeta}")
+        return np.stack(rostros).astype('float32')[..., np.newaxis]
+
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(cantidad, 48, 48, 1)).astype('float32')
+
+
+def convertir_tflite(keras_model, destino):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    with open(destino, 'wb') as f:
+        f.write(converter.convert())
+
+
+def convertir_onnx(keras_model, destino):
+    import tensorflow as tf
+    import tf2onnx
+    spec = (tf.TensorSpec((None, 48, 48, 1), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, output_path=destino)
+
+
+CONVERSORES = {
+    'tflite': convertir_tflite,
+    'onnx': convertir_onnx,
+}
+
+
+def verificar_paridad(referencia, backend, frames, tolerancia):
+    """Compara las salidas de un backend contra las del modelo Keras"""
+    salida = backend.predict(frames)
+    diferencia = float(np.max(np.abs(salida - referencia)))
+    coincidencia = float(np.mean(np.argmax(salida, axis=1) == np.argmax(referencia, axis=1)))
+    return diferencia, coincidencia, diferencia <= tolerancia and coincidencia == 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Conversión del modelo de emociones')
+    parser.add_argument('--formatos', nargs='+', choices=list(CONVERSORES), default=list(CONVERSORES))
+    parser.add_argument('--frames', help='Carpeta con recortes de rostro para la verificación')
+    parser.add_argument('--tolerancia', type=float, default=1e-3,
+                        help='Diferencia absoluta máxima permitida en las probabilidades')
+    args = parser.parse_args()
+
+    print(f"Cargando modelo Keras desde {Config.MODEL_PATH}...")
+    keras_backend = KerasBackend(Config.MODEL_PATH)
+    frames = cargar_frames_parity(args.frames)
+    referencia = keras_backend.predict(frames)
+    print(f"Frames de verificación: {len(frames)}")
+
+    todo_ok = True
+    for formato in args.formatos:
+        destino = Config.emotion_model_path(formato)
+        print(f"\n🔄 Convirtiendo a {formato}: {destino}")
+        try:
+            CONVERSORES[formato](keras_backend.model, destino)
+        except ImportError as e:
+            print(f"   ❌ Dependencia no instalada: {e}")
+            todo_ok = False
+            continue
+
+        backend = load_emotion_backend(formato, destino)
+        diferencia, coincidencia, ok = verificar_paridad(referencia, backend, frames, args.tolerancia)
+        estado = "✅" if ok else "❌"
+        print(f"   {estado} Diferencia máxima: {diferencia:.6f} | Coincidencia de clase: {coincidencia * 100:.1f}%")
+        todo_ok = todo_ok and ok
+
+    sys.exit(0 if todo_ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -193,6 +193,23 @@ install_application() {
     success "Aplicación instalada exitosamente"
 }
 
+# Migrar la base de datos (antes de iniciar la aplicación)
+migrate_database() {
+    log "Migrando la base de datos..."
+    
+    cd $PROJECT_DIR
+    source $PROJECT_DIR/venv/bin/activate
+    
+    # Índices declarados en models.py que falten en una base de datos existente
+    python migrate_indexes.py
+    
+    # Rollups diarios de emociones: el dashboard y /api/estadisticas/emociones solo leen
+    # emociones_resumen_diario, que nace vacía en una base de datos con historial
+    python rebuild_emotion_rollups.py --si-vacia
+    
+    success "Base de datos migrada exitosamente"
+}
+
 # Configurar PM2
 setup_pm2() {
     log "Configurando PM2..."
@@ -323,6 +340,7 @@ main() {
     setup_nginx
     setup_ssl
     install_application
+    migrate_database
     setup_pm2
     setup_monitoring
     setup_backup
@@ -6,14 +6,17 @@ module.exports = {
       interpreter: 'python3',
       instances: 4,
       exec_mode: 'cluster',
+      // Solo CRUD y estadísticas: no carga TensorFlow ni los modelos
       env: {
         FLASK_ENV: 'production',
         FLASK_DEBUG: 'False',
+        PROCESS_ROLE: 'api',
         PORT: 5000
       },
       env_production: {
         FLASK_ENV: 'production',
         FLASK_DEBUG: 'False',
+        PROCESS_ROLE: 'api',
         PORT: 5000,
         NODE_ENV: 'production'
       },
@@ -51,6 +54,37 @@ module.exports = {
       notify: true,
       notify_mode: 'always'
     },
+    {
+      // Predicciones (/predict, /predict/frame y /ws/): carga los modelos una sola vez
+      name: 'emotion-detection-inference',
+      script: 'app.py',
+      interpreter: 'python3',
+      instances: 1,
+      exec_mode: 'fork',
+      env: {
+        FLASK_ENV: 'production',
+        FLASK_DEBUG: 'False',
+        PROCESS_ROLE: 'inference',
+        PORT: 5010
+      },
+      env_production: {
+        FLASK_ENV: 'production',
+        FLASK_DEBUG: 'False',
+        PROCESS_ROLE: 'inference',
+        PORT: 5010,
+        NODE_ENV: 'production'
+      },
+      log_file: 'logs/pm2/inference-combined.log',
+      out_file: 'logs/pm2/inference-out.log',
+      error_file: 'logs/pm2/inference-error.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      max_restarts: 10,
+      min_uptime: '30s',
+      max_memory_restart: '2G',
+      watch: false,
+      kill_timeout: 10000,
+      env_file: '.env.production'
+    },
     {
       name: 'emotion-detection-worker',
       script: 'worker.py',
@@ -1,6 +1,6 @@
-import { Component, ElementRef, ViewChild, OnDestroy, Output, EventEmitter } from '@angular/core';
+import { Component, ElementRef, ViewChild, OnDestroy, Input, Output, EventEmitter } from '@angular/core';
 import { CommonModule } from '@angular/common';
-import { EmotionService, EmotionPrediction } from '../../services/emotion.service';
+import { EmotionService, EmotionPrediction, EmotionStream } from '../../services/emotion.service';
 import { finalize } from 'rxjs/operators';
 import { HttpClientModule } from '@angular/common/http';
 
@@ -15,6 +15,9 @@ export class EmotionDetectorComponent implements OnDestroy {
   @ViewChild('video') videoElement!: ElementRef;
   @ViewChild('canvas') canvasElement!: ElementRef;
 
+  // Con una sesión en vivo los frames viajan por el canal WebSocket en lugar de una request por frame
+  @Input() sesionId: number | null = null;
+
   @Output() predictionsChange = new EventEmitter<EmotionPrediction[]>();
   @Output() strongestPredictionChange = new EventEmitter<EmotionPrediction | null>();
   @Output() loadingChange = new EventEmitter<boolean>();
@@ -29,6 +32,7 @@ export class EmotionDetectorComponent implements OnDestroy {
   isLoading = false;
   private captureInterval: any;
   private animationFrameId: number | null = null;
+  private emotionStream: EmotionStream | null = null;
 
   constructor(private emotionService: EmotionService) {}
 
@@ -113,6 +117,11 @@ export class EmotionDetectorComponent implements OnDestroy {
 
     this.animationFrameId = requestAnimationFrame(drawFrame);
 
+    if (this.sesionId) {
+      this.startStreamCapture(canvas, video);
+      return;
+    }
+
     // --- Reactivado: Intervalo para enviar imagen al backend ---
     this.captureInterval = setInterval(() => {
       if (!this.isCapturing || !canvas || !video || !video.videoWidth || this.isLoading) {
@@ -122,45 +131,77 @@ export class EmotionDetectorComponent implements OnDestroy {
       this.isLoading = true;
       this.loadingChange.emit(this.isLoading);
 
-      const imageData = canvas.toDataURL('image/jpeg');
-      this.emotionService.predictEmotion(imageData)
-        .pipe(finalize(() => {
-            this.isLoading = false;
-            this.loadingChange.emit(this.isLoading);
-        }))
-        .subscribe({
-          next: (response: EmotionPrediction[]) => {
-            this.predictions = response;
-            this.predictionsChange.emit(this.predictions);
-
-            this.error = null;
-            this.errorChange.emit(this.error);
-
-            if (this.predictions && this.predictions.length > 0) {
-              this.strongestPrediction = this.predictions.reduce((prev, current) => {
-                return (prev.confidence > current.confidence) ? prev : current;
-              });
-            } else {
-              this.strongestPrediction = null;
-            }
-            this.strongestPredictionChange.emit(this.strongestPrediction);
-          },
-          error: (err) => {
-            this.error = 'Error al procesar la imagen';
-            this.errorChange.emit(this.error);
-            console.error('Error en la predicción:', err);
-
-            this.predictions = [];
-            this.predictionsChange.emit(this.predictions);
-
-            this.strongestPrediction = null;
-            this.strongestPredictionChange.emit(this.strongestPrediction);
-          }
-        });
+      canvas.toBlob((frame: Blob | null) => {
+        if (!frame) {
+          this.isLoading = false;
+          this.loadingChange.emit(this.isLoading);
+          return;
+        }
+
+        this.emotionService.predictEmotionFrame(frame)
+          .pipe(finalize(() => {
+              this.isLoading = false;
+              this.loadingChange.emit(this.isLoading);
+          }))
+          .subscribe({
+            next: (response: EmotionPrediction[]) => this.handlePredictions(response),
+            error: (err) => this.handlePredictionError(err)
+          });
+      }, 'image/jpeg');
     }, 500); // Ajusta el intervalo según sea necesario
     // --- Fin: Reactivado ---
   }
 
+  // Envía frames por el canal de la sesión sin esperar la respuesta anterior:
+  // si la inferencia se atrasa el servidor descarta los frames obsoletos
+  private startStreamCapture(canvas: HTMLCanvasElement, video: HTMLVideoElement) {
+    this.emotionStream = this.emotionService.openEmotionStream(this.sesionId as number);
+    this.emotionStream.predictions$.subscribe({
+      next: (response: EmotionPrediction[]) => this.handlePredictions(response),
+      error: (err) => this.handlePredictionError(err)
+    });
+
+    this.captureInterval = setInterval(() => {
+      if (!this.isCapturing || !video.videoWidth || !this.emotionStream) {
+        return;
+      }
+      canvas.toBlob((frame: Blob | null) => {
+        if (frame && this.emotionStream) {
+          this.emotionStream.sendFrame(frame);
+        }
+      }, 'image/jpeg');
+    }, 200);
+  }
+
+  private handlePredictions(response: EmotionPrediction[]) {
+    this.predictions = response;
+    this.predictionsChange.emit(this.predictions);
+
+    this.error = null;
+    this.errorChange.emit(this.error);
+
+    if (this.predictions && this.predictions.length > 0) {
+      this.strongestPrediction = this.predictions.reduce((prev, current) => {
+        return (prev.confidence > current.confidence) ? prev : current;
+      });
+    } else {
+      this.strongestPrediction = null;
+    }
+    this.strongestPredictionChange.emit(this.strongestPrediction);
+  }
+
+  private handlePredictionError(err: any) {
+    this.error = 'Error al procesar la imagen';
+    this.errorChange.emit(this.error);
+    console.error('Error en la predicción:', err);
+
+    this.predictions = [];
+    this.predictionsChange.emit(this.predictions);
+
+    this.strongestPrediction = null;
+    this.strongestPredictionChange.emit(this.strongestPrediction);
+  }
+
   stopContinuousCapture() {
     if (this.animationFrameId !== null) {
       cancelAnimationFrame(this.animationFrameId);
@@ -170,6 +211,10 @@ export class EmotionDetectorComponent implements OnDestroy {
       clearInterval(this.captureInterval);
       this.captureInterval = null;
     }
+    if (this.emotionStream) {
+      this.emotionStream.close();
+      this.emotionStream = null;
+    }
     this.isLoading = false;
     this.loadingChange.emit(this.isLoading);
   }
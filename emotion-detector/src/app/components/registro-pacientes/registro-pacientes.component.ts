@@ -652,52 +652,24 @@ export class RegistroPacientesComponent implements AfterViewInit, OnDestroy {
     });
   }
 
-  // Método para guardar emociones en la base de datos
+  // Método para guardar emociones en la base de datos (una sola request para todo el historial)
   private guardarEmocionesEnBD(sesionId: number) {
-    // Importamos HttpClient directamente para hacer las peticiones
-    import('../../services/emotion.service').then(() => {
-      let emocionesGuardadas = 0;
-      let erroresGuardado = 0;
-      
-      // Guardar cada emoción del historial
-      this.emotionsHistory.forEach((emotionData, index) => {
-        // Crear petición HTTP para guardar cada emoción
-        const url = `http://localhost:5000/api/sesiones/${sesionId}/emociones`;
-        const data = {
-          emotion: emotionData.emotion,
-          confidence: emotionData.confidence,
-          timestamp: emotionData.timestamp.toISOString()
-        };
-        
-        // Usamos fetch directamente para no bloquear el flujo
-        fetch(url, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${this.authService.getToken()}`
-          },
-          body: JSON.stringify(data)
-        })
-        .then(response => response.json())
-        .then(result => {
-          emocionesGuardadas++;
-          console.log(`✅ Emoción ${index + 1}/${this.emotionsHistory.length} guardada:`, result);
-          
-          // Mostrar resumen al final
-          if (emocionesGuardadas + erroresGuardado === this.emotionsHistory.length) {
-            console.log(`✅ Resumen: ${emocionesGuardadas} emociones guardadas, ${erroresGuardado} errores`);
-          }
-        })
-        .catch(error => {
-          erroresGuardado++;
-          console.error(`❌ Error guardando emoción ${index + 1}:`, error);
-          
-          // Mostrar resumen al final
-          if (emocionesGuardadas + erroresGuardado === this.emotionsHistory.length) {
-            console.log(`⚠️ Resumen: ${emocionesGuardadas} emociones guardadas, ${erroresGuardado} errores`);
-          }
-        });
-      });
+    const emociones = this.emotionsHistory.map(emotionData => ({
+      emotion: emotionData.emotion,
+      confidence: emotionData.confidence,
+      timestamp: emotionData.timestamp.toISOString()
+    }));
+
+    this.sessionService.guardarEmocionesLote(sesionId, emociones).subscribe({
+      next: (result) => {
+        console.log(`✅ Resumen: ${result.insertadas} emociones guardadas, ${result.rechazadas} rechazadas`);
+        if (result.errores?.length) {
+          console.warn('⚠️ Emociones rechazadas:', result.errores);
+        }
+      },
+      error: (error) => {
+        console.error('❌ Error guardando las emociones de la sesión:', error);
+      }
     });
   }
 
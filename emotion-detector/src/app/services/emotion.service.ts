@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, Subject } from 'rxjs';
 import { environment } from '../../environments/environment';
 import { Psicologo } from './auth.service';
 
@@ -11,6 +11,20 @@ export interface EmotionPrediction {
   box?: [number, number, number, number];
 }
 
+// Predicción de una sesión en vivo con la emoción dominante ya registrada por el servidor
+export interface SessionPrediction {
+  results: EmotionPrediction[];
+  recorded: { id: number, sesion_id: number, emotion: string, confidence: number, timestamp: string } | null;
+}
+
+// Canal WebSocket de una sesión en vivo: se autentica una vez y envía frames de forma continua
+export interface EmotionStream {
+  predictions$: Observable<EmotionPrediction[]>;
+  sendFrame(frame: Blob): void;
+  setQuality(quality: string): void;
+  close(): void;
+}
+
 export interface LoginResponse {
   message: string;
   token: string;
@@ -53,6 +67,82 @@ export class EmotionService {
     return request;
   }
 
+  // Envía el frame en binario (image/jpeg) en lugar de un data URL base64 dentro de JSON
+  predictEmotionFrame(frame: Blob, options: { quality?: string, sesionId?: number } = {}): Observable<EmotionPrediction[]> {
+    const url = `${this.apiUrl.replace('/api', '')}/predict/frame`;
+    const params: { [key: string]: string } = {};
+    if (options.quality) {
+      params['quality'] = options.quality;
+    }
+    if (options.sesionId) {
+      params['sesion_id'] = String(options.sesionId);
+    }
+
+    return this.http.post<EmotionPrediction[]>(url, frame, {
+      headers: { 'Content-Type': frame.type || 'image/jpeg' },
+      params
+    });
+  }
+
+  // Predice y registra la emoción dominante en la sesión en una sola request
+  // (reemplaza /predict/frame + POST /api/sesiones/<id>/emociones por frame)
+  predictAndRecordFrame(frame: Blob, sesionId: number, options: { quality?: string, sampleRate?: number } = {}): Observable<SessionPrediction> {
+    const url = `${this.apiUrl.replace('/api', '')}/predict/sesiones/${sesionId}`;
+    const params: { [key: string]: string } = {};
+    if (options.quality) {
+      params['quality'] = options.quality;
+    }
+    if (options.sampleRate) {
+      params['sample_rate'] = String(options.sampleRate);
+    }
+
+    return this.http.post<SessionPrediction>(url, frame, {
+      headers: { 'Content-Type': frame.type || 'image/jpeg' },
+      params
+    });
+  }
+
+  openEmotionStream(sesionId: number, options: { quality?: string } = {}): EmotionStream {
+    const url = `${this.apiUrl.replace('/api', '').replace(/^http/, 'ws')}/ws/sesiones/${sesionId}/stream`;
+    const socket = new WebSocket(url);
+    socket.binaryType = 'arraybuffer';
+    const predictions = new Subject<EmotionPrediction[]>();
+    let ready = false;
+
+    socket.onopen = () => {
+      // Única autenticación del canal: el token viaja en el primer mensaje
+      socket.send(JSON.stringify({ token: localStorage.getItem('token'), quality: options.quality }));
+    };
+    socket.onmessage = (event: MessageEvent) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'ready') {
+        ready = true;
+      } else if (message.type === 'prediction') {
+        predictions.next(message.results);
+      } else if (message.type === 'error' && !ready) {
+        predictions.error(new Error(message.error));
+      }
+    };
+    socket.onerror = () => predictions.error(new Error('Error en el canal de streaming'));
+    socket.onclose = () => predictions.complete();
+
+    return {
+      predictions$: predictions.asObservable(),
+      // El servidor descarta los frames obsoletos si la inferencia se atrasa
+      sendFrame: (frame: Blob) => {
+        if (ready && socket.readyState === WebSocket.OPEN) {
+          socket.send(frame);
+        }
+      },
+      setQuality: (quality: string) => {
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(JSON.stringify({ quality }));
+        }
+      },
+      close: () => socket.close()
+    };
+  }
+
   registerPsicologo(psicologoData: any): Observable<RegisterResponse> {
     return this.http.post<RegisterResponse>(`${this.apiUrl}/register`, psicologoData);
   }
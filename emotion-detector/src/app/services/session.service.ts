@@ -53,6 +53,12 @@ export class SessionService {
     return this.http.get(`${this.apiUrl}/sesiones/${sesionId}`);
   }
 
+  // Guardar varias emociones detectadas en una sola request; los ítems inválidos
+  // se reportan en "errores" sin descartar el resto del lote
+  guardarEmocionesLote(sesionId: number, emociones: { emotion: string, confidence: number, timestamp: string }[]): Observable<any> {
+    return this.http.post(`${this.apiUrl}/sesiones/${sesionId}/emociones/lote`, { emociones });
+  }
+
   // Eliminar una sesión
   eliminarSesion(sesionId: number): Observable<any> {
     return this.http.delete(`${this.apiUrl}/sesiones/${sesionId}`);
@@ -0,0 +1,10 @@
+"""
+Clases de emociones del modelo
+El índice de cada clase es la salida del modelo y, con el esquema particionado de
+emociones_detectadas (EMOTIONS_PARTITIONED), el código smallint guardado en la tabla.
+Solo agregar clases al final: los códigos existentes no deben cambiar.
+"""
+
+EMOTION_CLASSES = ['angry','disgust','fear','happy','neutral','sad','surprise']
+
+EMOTION_CODES = {label: code for code, label in enumerate(EMOTION_CLASSES)}
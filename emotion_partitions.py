@@ -0,0 +1,171 @@
+"""
+Particiones mensuales de emociones_detectadas (PostgreSQL, EMOTIONS_PARTITIONED)
+Con el esquema particionado (ver partition_emotions.py) emociones_detectadas es una
+tabla particionada por rango de timestamp con una partición por mes: las consultas con
+un rango de fechas solo leen los meses que lo cubren, vacuum e índices trabajan por mes
+y un mes antiguo se desacopla con DETACH PARTITION sin reescribir la tabla.
+EmotionPartitions crea la partición de un mes antes de insertar la primera emoción de
+ese mes.
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'emociones_detectadas'
+
+
+class PartitionDetachedError(ValueError):
+    """El mes ya tuvo una partición que se desacopló: sus emociones no se aceptan"""
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months_between(first, last):
+    """Inicios de mes desde el mes de first hasta el de last, inclusive"""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def upcoming_months(months_ahead):
+    """Mes actual y los months_ahead siguientes"""
+    month = month_start(datetime.utcnow())
+    months = []
+    for _ in range(months_ahead + 1):
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y_%m}'
+
+
+def detached_name(month):
+    """Nombre con el que partition_emotions.py --detach-before conserva un mes desacoplado"""
+    return f'{partition_name(month)}_detached'
+
+
+def partition_month(name):
+    """Mes de una partición a partir de su nombre (None si no sigue la convención)"""
+    try:
+        return datetime.strptime(name[len(TABLE) + 1:], '%Y_%m')
+    except ValueError:
+        return None
+
+
+def create_partition_sql(month):
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF {TABLE} '
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+    )
+
+
+def is_partitioned(conn):
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_catalog.pg_table_is_visible(c.oid))"
+    ), {'table': TABLE}).scalar()
+
+
+def partition_names(conn):
+    """Nombres de las particiones adjuntas a emociones_detectadas"""
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {'table': TABLE}).scalars())
+
+
+def existing_tables(conn, names):
+    """Nombres de la lista que corresponden a tablas existentes (adjuntas o no)"""
+    return set(conn.execute(text(
+        "SELECT relname FROM pg_class WHERE relname = ANY(:names) AND relkind IN ('r', 'p') "
+        "AND pg_catalog.pg_table_is_visible(oid)"
+    ), {'names': list(names)}).scalars())
+
+
+def ensure_partitions(conn, months):
+    """Crea las particiones que falten para los meses indicados; retorna las creadas.
+
+    conn debe estar en autocommit: cada partición se crea y se publica por separado. Lanza
+    PartitionDetachedError si un mes fue desacoplado (o su nombre lo ocupa una tabla que no
+    es partición): crear otra partición vacía para ese mes mezclaría datos archivados y nuevos.
+    """
+    existing = partition_names(conn)
+    missing = [month for month in sorted(set(months)) if partition_name(month) not in existing]
+    if not missing:
+        return []
+
+    occupied = existing_tables(
+        conn, [partition_name(month) for month in missing] + [detached_name(month) for month in missing]
+    )
+    for month in missing:
+        if partition_name(month) in occupied or detached_name(month) in occupied:
+            raise PartitionDetachedError(f"El mes {month:%Y-%m} de {TABLE} está desacoplado")
+
+    created = []
+    for month in missing:
+        name = partition_name(month)
+        try:
+            conn.execute(text(create_partition_sql(month)))
+        except DBAPIError:
+            # Otro proceso pudo crearla al mismo tiempo
+            if name not in partition_names(conn):
+                raise
+            continue
+        if name not in partition_names(conn):
+            # IF NOT EXISTS no crea nada si otra tabla ya ocupa el nombre
+            raise PartitionDetachedError(f"El mes {month:%Y-%m} de {TABLE} está desacoplado")
+        created.append(name)
+    return created
+
+
+class EmotionPartitions:
+    """Crea bajo demanda las particiones mensuales de emociones_detectadas.
+
+    ensure(timestamps) se llama antes de insertar emociones. Los meses ya verificados se
+    recuerdan en el proceso, así que el caso común no consulta la base de datos. La
+    primera verificación crea también los months_ahead meses siguientes al actual: el
+    cambio de mes no ejecuta DDL durante una sesión en vivo.
+    """
+
+    def __init__(self, db, months_ahead=2, lock_timeout_ms=2000):
+        self.db = db
+        self.months_ahead = max(0, int(months_ahead))
+        self.lock_timeout_ms = int(lock_timeout_ms)
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, timestamps):
+        months = {month_start(timestamp) for timestamp in timestamps}
+        if months <= self._ready:
+            return
+        with self._lock:
+            missing = months - self._ready
+            if not missing:
+                return
+            if not self._ready:
+                missing.update(upcoming_months(self.months_ahead))
+
+            # DDL en una conexión propia: no entra en la transacción de la request. Crear una
+            # partición bloquea la tabla padre; lock_timeout evita encolar las inserciones
+            # detrás de una consulta larga (la inserción falla y se reintenta)
+            with self.db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text(f"SET lock_timeout = {self.lock_timeout_ms}"))
+                created = ensure_partitions(conn, missing)
+            if created:
+                logger.info(f"Particiones de emociones creadas: {', '.join(created)}")
+            self._ready |= missing
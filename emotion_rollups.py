@@ -0,0 +1,227 @@
+"""
+Rollups diarios de emociones
+Mantiene emociones_resumen_diario, con una fila por (psicólogo, día, emoción) y la
+cantidad y la suma de confianzas, a medida que se insertan o eliminan emociones. Las
+estadísticas leen esas filas, así que su costo depende del número de días y no del
+número de emociones registradas. rebuild() recalcula los rollups desde cero.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import delete, func, insert, select, update
+
+from models import db, emotion_label_sql, EmocionDetectada, EmocionResumenDiario, Sesion, SesionTimeline
+
+logger = logging.getLogger(__name__)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _as_date(value):
+    # date() de SQLite retorna texto 'YYYY-MM-DD'; PostgreSQL retorna date
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _new_deltas():
+    return defaultdict(lambda: [0, 0.0])
+
+
+def row_deltas(rows, psicologo_id=None):
+    """Agrupa filas {sesion_id, emotion, confidence, timestamp} por clave del rollup.
+
+    Sin psicologo_id el dueño de cada sesión se resuelve con una sola consulta; las filas
+    de sesiones inexistentes se ignoran (su inserción fallará por la llave foránea).
+    """
+    if psicologo_id is None:
+        owners = dict(db.session.execute(
+            select(Sesion.id, Sesion.psicologo_id).where(Sesion.id.in_({row['sesion_id'] for row in rows}))
+        ).all())
+    deltas = _new_deltas()
+    for row in rows:
+        owner = psicologo_id if psicologo_id is not None else owners.get(row['sesion_id'])
+        if owner is None:
+            continue
+        entry = deltas[(owner, _as_date(row['timestamp']), row['emotion'])]
+        entry[0] += 1
+        entry[1] += row['confidence'] or 0.0
+    return deltas
+
+
+def apply_deltas(deltas, sign=1):
+    """Suma (sign=1) o resta (sign=-1) los deltas a los rollups en la transacción actual"""
+    if not deltas:
+        return
+    table = EmocionResumenDiario.__table__
+    # Orden fijo de las claves: dos transacciones concurrentes bloquean filas en el mismo orden
+    values = [
+        {
+            'psicologo_id': psicologo_id, 'dia': dia, 'emotion': emotion,
+            'cantidad': sign * cantidad, 'suma_confianza': sign * suma
+        }
+        for (psicologo_id, dia, emotion), (cantidad, suma) in sorted(deltas.items())
+    ]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.psicologo_id, table.c.dia, table.c.emotion],
+            set_={
+                'cantidad': table.c.cantidad + stmt.excluded.cantidad,
+                'suma_confianza': table.c.suma_confianza + stmt.excluded.suma_confianza
+            }
+        )
+        db.session.execute(stmt, values)
+    else:
+        for value in values:
+            result = db.session.execute(
+                update(table).where(
+                    table.c.psicologo_id == value['psicologo_id'],
+                    table.c.dia == value['dia'],
+                    table.c.emotion == value['emotion']
+                ).values(
+                    cantidad=table.c.cantidad + value['cantidad'],
+                    suma_confianza=table.c.suma_confianza + value['suma_confianza']
+                )
+            )
+            if result.rowcount == 0:
+                db.session.execute(insert(table), [value])
+
+    if sign < 0:
+        db.session.execute(delete(table).where(
+            table.c.psicologo_id.in_({key[0] for key in deltas}),
+            table.c.cantidad <= 0
+        ))
+
+
+def record_inserted(rows, psicologo_id=None):
+    """Registra en los rollups filas recién insertadas (antes del commit que las inserta)"""
+    apply_deltas(row_deltas(rows, psicologo_id))
+
+
+def _grouped_rows(*criteria):
+    """Filas de emociones agrupadas por (psicólogo, día, emoción) en SQL"""
+    dia = func.date(EmocionDetectada.timestamp)
+    return db.session.execute(
+        select(
+            Sesion.psicologo_id, dia, EmocionDetectada.emotion,
+            func.count(), func.coalesce(func.sum(EmocionDetectada.confidence), 0.0)
+        ).join(Sesion, Sesion.id == EmocionDetectada.sesion_id).where(*criteria).group_by(
+            Sesion.psicologo_id, dia, EmocionDetectada.emotion
+        )
+    ).all()
+
+
+def _add_grouped(deltas, grouped, sign=1):
+    for psicologo_id, dia, emotion, cantidad, suma in grouped:
+        entry = deltas[(psicologo_id, _as_date(dia), emotion)]
+        entry[0] += sign * cantidad
+        entry[1] += sign * suma
+
+
+def _add_timeline(deltas, timeline, psicologo_id):
+    """Agrega a los deltas las emociones de una línea de tiempo compacta"""
+    import numpy as np
+    import emotion_timeline
+
+    decoded = emotion_timeline.decode(timeline.codigos, timeline.confianzas, timeline.deltas_ms)
+    days = (
+        np.datetime64(timeline.inicio, 'ms') + decoded['offsets_ms'].astype('timedelta64[ms]')
+    ).astype('datetime64[D]').astype(np.int64)
+    # Una clave entera por (día, código): los códigos caben en un byte
+    keys = days * 256 + decoded['codes']
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse)
+    sums = np.bincount(inverse, weights=decoded['confidences'])
+    labels = timeline.labels
+    for key, cantidad, suma in zip(unique.tolist(), counts.tolist(), sums.tolist()):
+        entry = deltas[(psicologo_id, date.fromordinal(_EPOCH_ORDINAL + key // 256), labels[key % 256])]
+        entry[0] += cantidad
+        entry[1] += suma
+
+
+def _pruned_timelines(*criteria):
+    """Líneas de tiempo cuyas filas empaquetadas ya no están todas en emociones_detectadas
+    (SESSION_TIMELINE_PRUNE_ROWS): para esas sesiones la línea de tiempo es la fuente"""
+    present = select(func.count(EmocionDetectada.id)).where(
+        EmocionDetectada.sesion_id == SesionTimeline.sesion_id,
+        EmocionDetectada.id <= SesionTimeline.ultimo_emocion_id
+    ).scalar_subquery()
+    return db.session.execute(
+        select(SesionTimeline, Sesion.psicologo_id).join(Sesion, Sesion.id == SesionTimeline.sesion_id).where(
+            SesionTimeline.total > present, *criteria
+        )
+    ).all()
+
+
+def _replace_pruned_rows(deltas, pruned):
+    # Las filas hasta la marca de agua se cuentan desde la línea de tiempo, no desde la tabla
+    for timeline, psicologo_id in pruned:
+        _add_grouped(deltas, _grouped_rows(
+            EmocionDetectada.sesion_id == timeline.sesion_id,
+            EmocionDetectada.id <= timeline.ultimo_emocion_id
+        ), sign=-1)
+        _add_timeline(deltas, timeline, psicologo_id)
+
+
+def session_deltas(sesion_id):
+    """Aporte de una sesión a los rollups (filas y, si se podaron, su línea de tiempo)"""
+    deltas = _new_deltas()
+    _add_grouped(deltas, _grouped_rows(EmocionDetectada.sesion_id == sesion_id))
+    _replace_pruned_rows(deltas, _pruned_timelines(SesionTimeline.sesion_id == sesion_id))
+    return deltas
+
+
+def record_session_deleted(sesion_id):
+    """Descuenta de los rollups las emociones de una sesión que se va a eliminar"""
+    apply_deltas(session_deltas(sesion_id), sign=-1)
+
+
+def rebuild(psicologo_id=None):
+    """Recalcula los rollups desde cero (de un psicólogo o de todos) sin hacer commit.
+
+    Retorna el número de filas de rollup escritas.
+    """
+    table = EmocionResumenDiario.__table__
+    criteria = [Sesion.psicologo_id == psicologo_id] if psicologo_id is not None else []
+
+    deleted = delete(table)
+    if psicologo_id is not None:
+        deleted = deleted.where(table.c.psicologo_id == psicologo_id)
+    db.session.execute(deleted)
+
+    dia = func.date(EmocionDetectada.timestamp)
+    db.session.execute(insert(table).from_select(
+        ['psicologo_id', 'dia', 'emotion', 'cantidad', 'suma_confianza'],
+        select(
+            # La copia se hace en SQL: con códigos de emoción se traducen a etiqueta ahí mismo
+            Sesion.psicologo_id, dia, emotion_label_sql(EmocionDetectada.emotion),
+            func.count(), func.coalesce(func.sum(EmocionDetectada.confidence), 0.0)
+        ).join(Sesion, Sesion.id == EmocionDetectada.sesion_id).where(*criteria).group_by(
+            Sesion.psicologo_id, dia, EmocionDetectada.emotion
+        )
+    ))
+
+    pruned = _pruned_timelines(*criteria)
+    if pruned:
+        deltas = _new_deltas()
+        _replace_pruned_rows(deltas, pruned)
+        apply_deltas({key: value for key, value in deltas.items() if value[0] or value[1]})
+        # Los días cuyo total queda en cero tras el ajuste no se conservan
+        db.session.execute(delete(table).where(table.c.cantidad <= 0))
+        logger.info(f"Rollups: {len(pruned)} sesiones contadas desde su línea de tiempo")
+
+    count = select(func.count()).select_from(table)
+    if psicologo_id is not None:
+        count = count.where(table.c.psicologo_id == psicologo_id)
+    return db.session.execute(count).scalar()
@@ -0,0 +1,88 @@
+"""
+Línea de tiempo compacta de emociones por sesión
+Empaqueta las emociones de una sesión en columnas binarias: códigos de clase uint8,
+confianzas float16 (opcionalmente las 7 probabilidades) y desplazamientos en
+milisegundos codificados como deltas uint32. Una sesión de 60 minutos a 2 fps ocupa
+~50 KB en una sola fila y se decodifica con NumPy sin construir un objeto por emoción.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+
+CODE_DTYPE = np.dtype('u1')
+CONFIDENCE_DTYPE = np.dtype('<f2')
+DELTA_DTYPE = np.dtype('<u4')
+MAX_LABELS = 255
+
+
+def encode(emotions, confidences, timestamps, labels=None, start=None, end_offset_ms=0, probabilities=None):
+    """Codifica emociones ordenadas por timestamp.
+
+    labels es la lista de etiquetas ya usada por la línea de tiempo (los códigos
+    existentes no cambian; las etiquetas nuevas se agregan al final). start y
+    end_offset_ms permiten continuar una línea de tiempo existente: el primer delta
+    se mide desde su último desplazamiento. Retorna un dict con las columnas binarias.
+    """
+    labels = list(labels or [])
+    if start is None:
+        start = timestamps[0]
+
+    index = {label: code for code, label in enumerate(labels)}
+    for emotion in emotions:
+        if emotion not in index:
+            index[emotion] = len(labels)
+            labels.append(emotion)
+    if len(labels) > MAX_LABELS:
+        raise ValueError(f'La línea de tiempo admite a lo sumo {MAX_LABELS} etiquetas')
+
+    codes = np.fromiter((index[emotion] for emotion in emotions), dtype=CODE_DTYPE, count=len(emotions))
+    offsets = np.fromiter(
+        ((timestamp - start) // timedelta(milliseconds=1) for timestamp in timestamps),
+        dtype=np.int64, count=len(timestamps)
+    )
+    deltas = np.diff(offsets, prepend=end_offset_ms)
+    if len(deltas) and deltas.min() < 0:
+        raise ValueError('Los timestamps deben estar ordenados y ser posteriores al final de la línea de tiempo')
+    if len(deltas) and deltas.max() > np.iinfo(DELTA_DTYPE).max:
+        # astype(uint32) truncaría el delta en silencio
+        raise ValueError('Un intervalo entre emociones excede el máximo de un delta uint32 (~49.7 días)')
+
+    encoded = {
+        'labels': labels,
+        'start': start,
+        'count': len(emotions),
+        'end_offset_ms': int(offsets[-1]) if len(offsets) else end_offset_ms,
+        'codes': codes.tobytes(),
+        'confidences': np.asarray(confidences, dtype=CONFIDENCE_DTYPE).tobytes(),
+        'deltas': deltas.astype(DELTA_DTYPE).tobytes(),
+        'probabilities': None
+    }
+    if probabilities is not None:
+        encoded['probabilities'] = np.asarray(probabilities, dtype=CONFIDENCE_DTYPE).reshape(len(emotions), -1).tobytes()
+    return encoded
+
+
+def decode(codes, confidences, deltas, probabilities=None, num_classes=None):
+    """Decodifica las columnas binarias a arreglos NumPy (códigos, confianzas, desplazamientos ms)"""
+    decoded = {
+        'codes': np.frombuffer(codes, dtype=CODE_DTYPE),
+        'confidences': np.frombuffer(confidences, dtype=CONFIDENCE_DTYPE).astype(np.float32),
+        'offsets_ms': np.cumsum(np.frombuffer(deltas, dtype=DELTA_DTYPE), dtype=np.int64)
+    }
+    if probabilities is not None:
+        decoded['probabilities'] = np.frombuffer(probabilities, dtype=CONFIDENCE_DTYPE).astype(np.float32).reshape(
+            len(decoded['codes']), num_classes or -1
+        )
+    return decoded
+
+
+def to_columns(decoded, labels, start):
+    """Columnas listas para JSON: etiquetas, confianzas redondeadas y timestamps ISO"""
+    timestamps = np.datetime64(start, 'ms') + decoded['offsets_ms'].astype('timedelta64[ms]')
+    return {
+        'emotion': np.asarray(labels, dtype=object)[decoded['codes']].tolist(),
+        'confidence': np.round(decoded['confidences'].astype(np.float64), 4).tolist(),
+        'timestamp': np.datetime_as_string(timestamps, unit='ms').tolist(),
+        'offset_ms': decoded['offsets_ms'].tolist()
+    }
@@ -0,0 +1,156 @@
+"""
+Post-procesamiento vectorizado de detecciones de rostros
+Convierte la salida del detector SSD en cajas y prepara el lote de rostros 48x48
+para el modelo de emociones sin recorrer las detecciones una por una en Python
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+# Tipos de emociones del detector
+from emotion_labels import EMOTION_CLASSES
+
+# Tamaño de entrada del detector cuando no se indica otro
+DEFAULT_INPUT_SIZE = 224
+
+# Umbral de confianza del detector (usando 0.3 como en el ejemplo)
+DETECTION_THRESHOLD = 0.3
+
+# Tamaño de entrada del modelo de emociones
+FACE_SIZE = 48
+
+
+def detections_to_boxes(detections, frame_sizes, threshold=DETECTION_THRESHOLD):
+    """Filtra, escala y recorta las cajas de la salida del detector.
+
+    detections es la salida de faceNet.forward() con forma (1, 1, K, 7), donde la
+    columna 0 es el índice del frame dentro del blob. frame_sizes es una lista de
+    (h, w) por frame. Retorna una lista con un arreglo int (n_i, 4) por frame.
+    """
+    detections = detections.reshape(-1, 7)
+    detections = detections[detections[:, 2] > threshold]
+
+    frame_idx = detections[:, 0].astype(np.intp)
+    sizes = np.asarray(frame_sizes, dtype=np.float32).reshape(-1, 2)
+    # (w, h, w, h) por detección para escalar y limitar en una sola operación
+    scale = sizes[frame_idx][:, [1, 0, 1, 0]]
+
+    boxes = (detections[:, 3:7] * scale).astype(np.int64)
+    np.clip(boxes, 0, scale.astype(np.int64), out=boxes)
+
+    return [boxes[frame_idx == idx] for idx in range(len(sizes))]
+
+
+def crop_faces(frames, boxes_per_frame):
+    """Recorta todos los rostros en un búfer preasignado (N, 48, 48, 1) float32.
+
+    De cada frame se convierte a escala de grises una sola vez la región que cubre
+    sus rostros (no el frame completo: en 1080p eso cuesta más que los recortes).
+    Las cajas vacías se descartan. Retorna (lote, frame de cada rostro, cajas (N, 4)).
+    """
+    owners = []
+    valid_boxes = []
+    for idx, boxes in enumerate(boxes_per_frame):
+        if boxes is None or len(boxes) == 0:
+            continue
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        keep = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        if keep.any():
+            valid_boxes.append(boxes[keep])
+            owners.append(np.full(int(keep.sum()), idx, dtype=np.intp))
+
+    if not valid_boxes:
+        return (np.empty((0, FACE_SIZE, FACE_SIZE, 1), dtype=np.float32),
+                np.empty(0, dtype=np.intp), np.empty((0, 4), dtype=np.int64))
+
+    owners = np.concatenate(owners)
+    valid_boxes = np.concatenate(valid_boxes)
+    crops = np.empty((len(valid_boxes), FACE_SIZE, FACE_SIZE), dtype=np.uint8)
+
+    for idx in np.unique(owners).tolist():
+        positions = np.flatnonzero(owners == idx)
+        frame_boxes = valid_boxes[positions]
+        x0, y0 = frame_boxes[:, :2].min(axis=0).tolist()
+        x1, y1 = frame_boxes[:, 2:].max(axis=0).tolist()
+        crop_area = int(((frame_boxes[:, 2] - frame_boxes[:, 0]) * (frame_boxes[:, 3] - frame_boxes[:, 1])).sum())
+
+        if crop_area >= (x1 - x0) * (y1 - y0):
+            # Se convierte a gris una sola vez la región que cubre todos los rostros del frame
+            gray = cv2.cvtColor(frames[idx][y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+            for k, (bx0, by0, bx1, by1) in zip(positions.tolist(), (frame_boxes - [x0, y0, x0, y0]).tolist()):
+                cv2.resize(gray[by0:by1, bx0:bx1], (FACE_SIZE, FACE_SIZE), dst=crops[k])
+        else:
+            # Rostros dispersos: convertir cada recorte cuesta menos que la región completa
+            for k, (bx0, by0, bx1, by1) in zip(positions.tolist(), frame_boxes.tolist()):
+                gray = cv2.cvtColor(frames[idx][by0:by1, bx0:bx1], cv2.COLOR_BGR2GRAY)
+                cv2.resize(gray, (FACE_SIZE, FACE_SIZE), dst=crops[k])
+
+    return crops.astype(np.float32)[..., np.newaxis], owners, valid_boxes
+
+
+def load_face_detector(detector_dir):
+    """Carga el detector SSD res10 desde su carpeta, o retorna None si faltan los archivos"""
+    prototxt_path = os.path.join(detector_dir, "deploy.prototxt")
+    weights_path = os.path.join(detector_dir, "res10_300x300_ssd_iter_140000.caffemodel")
+    if not (os.path.exists(prototxt_path) and os.path.exists(weights_path)):
+        return None
+    return cv2.dnn.readNet(prototxt_path, weights_path)
+
+
+def process_frames_for_emotion(frames, faceNet, emotionModel, boxes=None, input_sizes=None,
+                               default_input_size=DEFAULT_INPUT_SIZE):
+    """Procesa varios frames en una sola pasada del detector y del modelo de emociones.
+
+    boxes es una lista opcional alineada con frames: si una entrada no es None
+    (por ejemplo, cajas obtenidas por seguimiento) ese frame no pasa por el detector.
+    input_sizes indica el tamaño de entrada del detector por frame (None usa default_input_size).
+    Retorna una lista de resultados por frame, en el mismo orden de entrada.
+    """
+    boxes = list(boxes) if boxes is not None else [None] * len(frames)
+    input_sizes = input_sizes or [None] * len(frames)
+
+    # Solo los frames sin cajas conocidas pasan por el detector, agrupados por tamaño de entrada
+    pending_by_size = {}
+    for idx, frame_boxes in enumerate(boxes):
+        if frame_boxes is None:
+            size = input_sizes[idx] or default_input_size
+            pending_by_size.setdefault(size, []).append(idx)
+
+    for size, pending in pending_by_size.items():
+        # Construye un blob con todos los frames para el detector de rostros
+        # El ejemplo usa 224x224 para el blob del detector de rostros
+        blob = cv2.dnn.blobFromImages([frames[idx] for idx in pending], 1.0, (size, size), (104.0, 177.0, 123.0))
+
+        # Realiza las detecciones de rostros; la columna 0 indica el frame de origen
+        faceNet.setInput(blob)
+        detections = faceNet.forward()
+
+        # Umbral, escalado y recorte de todas las cajas en operaciones de arreglo
+        detected = detections_to_boxes(detections, [frames[idx].shape[:2] for idx in pending])
+        for idx, frame_boxes in zip(pending, detected):
+            boxes[idx] = frame_boxes
+
+    # Rostros de todos los frames en un solo tensor (N, 48, 48, 1)
+    faces, owners, face_boxes = crop_faces(frames, boxes)
+
+    results = [[] for _ in frames]
+    if len(faces) == 0:
+        return results
+
+    # Una sola pasada del modelo para todos los rostros
+    preds = np.asarray(emotionModel.predict(faces))
+    predicted_classes = np.argmax(preds, axis=1)
+
+    for frame_idx, box, pred, predicted_class in zip(
+            owners.tolist(), face_boxes.tolist(), preds.tolist(), predicted_classes.tolist()):
+        # Guardar el resultado para este rostro
+        results[frame_idx].append({
+            'box': box, # Coordenadas del bounding box (opcional en frontend)
+            'emotion': EMOTION_CLASSES[predicted_class],
+            'confidence': pred[predicted_class], # Confianza de la emoción predicha
+            'all_predictions': dict(zip(EMOTION_CLASSES, pred))
+        })
+
+    return results
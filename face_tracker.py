@@ -0,0 +1,174 @@
+"""
+Seguimiento de rostros por sesión en vivo
+Reutiliza las cajas del último frame detectado y las sigue con correlación de
+plantillas sobre una versión reducida en escala de grises del frame, de modo que
+el detector SSD solo corre cada N frames o cuando el seguimiento pierde confianza
+"""
+
+import threading
+import time
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Ancho del frame reducido sobre el que se hace el seguimiento
+TRACKING_WIDTH = 320
+
+
+class FaceTracker:
+    """Sigue las cajas de rostros de una sesión entre frames consecutivos"""
+
+    def __init__(self, redetect_interval=5, min_score=0.6, search_margin=0.5):
+        self.redetect_interval = max(1, int(redetect_interval))
+        self.min_score = min_score
+        self.search_margin = search_margin
+
+        self.boxes = []
+        self.templates = []
+        self.frame_shape = None
+        self.frames_since_detection = 0
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self.tracked_frames = 0
+        self.detected_frames = 0
+
+    @staticmethod
+    def _prepare(frame):
+        """Convierte el frame a gris reducido y retorna la escala aplicada"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        scale = min(1.0, TRACKING_WIDTH / gray.shape[1])
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    def reset(self, frame, boxes):
+        """Reinicia el seguimiento con las cajas de una detección completa"""
+        gray, scale = self._prepare(frame)
+        tracked_boxes = []
+        templates = []
+        for box in boxes:
+            x0, y0, x1, y1 = (np.array(box, dtype=np.float32) * scale).astype(int)
+            template = gray[y0:y1, x0:x1]
+            if template.shape[0] < 4 or template.shape[1] < 4:
+                continue
+            tracked_boxes.append((x0, y0, x1, y1))
+            templates.append(template.copy())
+
+        with self._lock:
+            self.boxes = tracked_boxes
+            self.templates = templates
+            self.frame_shape = frame.shape
+            self.frames_since_detection = 0
+            self.detected_frames += 1
+            self.last_used = time.monotonic()
+
+    def track(self, frame):
+        """Retorna las cajas seguidas en coordenadas del frame, o None si hay que detectar"""
+        with self._lock:
+            self.last_used = time.monotonic()
+            if (not self.boxes or frame.shape != self.frame_shape
+                    or self.frames_since_detection + 1 >= self.redetect_interval):
+                return None
+            boxes = list(self.boxes)
+            templates = list(self.templates)
+
+        gray, scale = self._prepare(frame)
+        h, w = gray.shape[:2]
+        new_boxes = []
+        new_templates = []
+
+        for (x0, y0, x1, y1), template in zip(boxes, templates):
+            th, tw = template.shape[:2]
+            margin_x = int(tw * self.search_margin)
+            margin_y = int(th * self.search_margin)
+            sx0, sy0 = max(0, x0 - margin_x), max(0, y0 - margin_y)
+            sx1, sy1 = min(w, x1 + margin_x), min(h, y1 + margin_y)
+            window = gray[sy0:sy1, sx0:sx1]
+            if window.shape[0] < th or window.shape[1] < tw:
+                return None
+
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if score < self.min_score:
+                # El seguimiento perdió confianza: se fuerza una nueva detección
+                return None
+
+            nx0, ny0 = sx0 + dx, sy0 + dy
+            new_boxes.append((nx0, ny0, nx0 + tw, ny0 + th))
+            new_templates.append(gray[ny0:ny0 + th, nx0:nx0 + tw].copy())
+
+        with self._lock:
+            self.boxes = new_boxes
+            self.templates = new_templates
+            self.frames_since_detection += 1
+            self.tracked_frames += 1
+
+        frame_h, frame_w = frame.shape[:2]
+        return [
+            [
+                int(max(0, x0 / scale)), int(max(0, y0 / scale)),
+                int(min(frame_w, x1 / scale)), int(min(frame_h, y1 / scale))
+            ]
+            for (x0, y0, x1, y1) in new_boxes
+        ]
+
+
+class FaceTrackerRegistry:
+    """Mantiene un FaceTracker por sesión en vivo y descarta los inactivos"""
+
+    def __init__(self, redetect_interval=5, min_score=0.6, ttl_seconds=300):
+        self.redetect_interval = redetect_interval
+        self.min_score = min_score
+        self.ttl_seconds = ttl_seconds
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._expired = 0
+        self._tracked_frames = 0
+        self._detected_frames = 0
+
+    def _retire(self, tracker):
+        self._tracked_frames += tracker.tracked_frames
+        self._detected_frames += tracker.detected_frames
+
+    def get(self, key):
+        """Obtiene (o crea) el tracker de la sesión indicada"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, t in self._trackers.items() if now - t.last_used > self.ttl_seconds]
+            for k in expired:
+                self._retire(self._trackers.pop(k))
+            self._expired += len(expired)
+
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = FaceTracker(self.redetect_interval, self.min_score)
+                self._trackers[key] = tracker
+                self._created += 1
+            return tracker
+
+    def discard(self, key):
+        """Elimina el tracker de una sesión finalizada"""
+        with self._lock:
+            tracker = self._trackers.pop(key, None)
+            if tracker is not None:
+                self._retire(tracker)
+
+    def get_stats(self):
+        with self._lock:
+            tracked = self._tracked_frames + sum(t.tracked_frames for t in self._trackers.values())
+            detected = self._detected_frames + sum(t.detected_frames for t in self._trackers.values())
+            total = tracked + detected
+            return {
+                'active_sessions': len(self._trackers),
+                'trackers_created': self._created,
+                'trackers_expired': self._expired,
+                'tracked_frames': tracked,
+                'detected_frames': detected,
+                'detector_skip_rate': round(tracked / total, 3) if total else 0
+            }
@@ -0,0 +1,93 @@
+"""
+Decodificación de frames según la resolución útil para el detector
+Lee las dimensiones desde la cabecera JPEG/PNG sin decodificar la imagen y, si el
+frame es mucho más grande de lo necesario, lo decodifica reducido (IMREAD_REDUCED_*)
+"""
+
+import struct
+
+import cv2
+import numpy as np
+
+# Factores de reducción soportados por libjpeg al decodificar, de mayor a menor
+REDUCED_MODES = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# Marcadores JPEG de inicio de frame (SOF) que contienen las dimensiones
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def image_dimensions(data):
+    """Retorna (ancho, alto) leyendo solo la cabecera JPEG o PNG, o None si no se reconoce"""
+    data = memoryview(data)
+    if len(data) >= 24 and bytes(data[:8]) == _PNG_SIGNATURE:
+        width, height = struct.unpack('>II', data[16:24])
+        return width, height
+
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Byte de relleno
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # Marcadores sin longitud
+            pos += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return width, height
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        pos += 2 + length
+    return None
+
+
+def decode_frame(data, max_useful_size=None):
+    """Decodifica un frame BGR reduciéndolo si su lado mayor excede la resolución útil.
+
+    Retorna (frame, (escala_x, escala_y)) donde la escala convierte coordenadas del
+    frame decodificado a coordenadas de la imagen original. frame es None si la
+    imagen no se pudo decodificar.
+    """
+    buffer = np.frombuffer(data, np.uint8)
+    dimensions = image_dimensions(data) if max_useful_size else None
+
+    flag = cv2.IMREAD_COLOR
+    if dimensions:
+        long_side = max(dimensions)
+        for factor, reduced_flag in REDUCED_MODES:
+            if long_side / factor >= max_useful_size:
+                flag = reduced_flag
+                break
+
+    frame = cv2.imdecode(buffer, flag)
+    if frame is None or not dimensions or flag == cv2.IMREAD_COLOR:
+        return frame, (1.0, 1.0)
+
+    width, height = dimensions
+    return frame, (width / frame.shape[1], height / frame.shape[0])
+
+
+def scale_results(emotion_results, scale):
+    """Lleva las cajas de los resultados a las coordenadas de la imagen original"""
+    scale_x, scale_y = scale
+    if scale_x == 1.0 and scale_y == 1.0:
+        return emotion_results
+    for result in emotion_results:
+        if 'box' in result:
+            x0, y0, x1, y1 = result['box']
+            result['box'] = [
+                int(round(x0 * scale_x)), int(round(y0 * scale_y)),
+                int(round(x1 * scale_x)), int(round(y1 * scale_y))
+            ]
+    return emotion_results
@@ -0,0 +1,51 @@
+"""
+Huellas perceptuales de frames
+dHash y pHash de una versión reducida en escala de grises del frame: dos frames de
+webcam casi idénticos difieren en pocos bits aunque el ruido JPEG cambie todos sus
+bytes, así que la distancia de Hamming entre huellas mide qué tan parecidos son.
+"""
+
+import cv2
+import numpy as np
+
+# Lado de la miniatura en gris de la que salen ambas huellas: reducir primero a un
+# tamaño fijo es mucho más barato que ir directo a 9x8 con INTER_AREA
+THUMBNAIL_SIZE = 32
+
+
+def _thumbnail(frame):
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(frame, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def _pack(bits):
+    """Empaqueta 64 booleanos en un entero"""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def dhash(frame, hash_size=8):
+    """Hash de diferencias: compara cada píxel con su vecino derecho en una imagen de 9x8"""
+    small = cv2.resize(_thumbnail(frame), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def phash(frame, hash_size=8):
+    """Hash perceptual: signo de las frecuencias bajas de la DCT respecto a su mediana"""
+    low = cv2.dct(_thumbnail(frame).astype(np.float32))[:hash_size, :hash_size]
+    # El término DC solo refleja el brillo medio; se excluye de la mediana
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+def image_fingerprint(frame, mode='dhash'):
+    """Huella del frame decodificado (BGR o gris) con el algoritmo indicado"""
+    if mode == 'phash':
+        return phash(frame)
+    if mode == 'dhash':
+        return dhash(frame)
+    raise ValueError(f"Modo de huella desconocido: {mode}")
+
+
+def hamming_distance(a, b):
+    """Bits distintos entre dos huellas"""
+    return (a ^ b).bit_count()
@@ -0,0 +1,277 @@
+"""
+Stack de inferencia de emociones
+Reúne todo lo que depende de OpenCV, NumPy y el runtime del modelo. app.py solo lo
+importa en procesos cuyo rol atiende predicciones (PROCESS_ROLE=inference o both),
+de modo que los procesos de la API arrancan sin cargar TensorFlow ni los modelos.
+"""
+
+import os
+import signal
+import logging
+import threading
+
+# Configurar TensorFlow antes de importarlo (solo se importa si el backend es keras)
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+
+from config import Config
+from cache_manager import EmotionCache, cache_manager
+from face_pipeline import EMOTION_CLASSES, process_frames_for_emotion
+from face_tracker import FaceTrackerRegistry
+from frame_decoding import decode_frame, scale_results
+from inference_backends import backend_available
+from inference_scheduler import InferenceScheduler
+from inference_workers import InferenceWorkerPool
+from model_manager import ModelManager, load_models as load_model_bundle, warm_up
+
+logger = logging.getLogger(__name__)
+
+# Disponibilidad del runtime del backend (se verifica sin importarlo)
+INFERENCE_AVAILABLE = backend_available(Config.INFERENCE_BACKEND)
+
+# Tipos de emociones del detector
+classes = EMOTION_CLASSES
+
+# Pool de workers (None si la inferencia corre en este proceso)
+inference_pool = None
+
+_started = False
+_start_lock = threading.Lock()
+
+def model_spec(**overrides):
+    """Descripción de la versión de modelos a cargar según la configuración"""
+    spec = {
+        'backend': Config.INFERENCE_BACKEND,
+        'model_path': Config.emotion_model_path(),
+        'detector_path': Config.FACE_DETECTOR_PATH,
+        'num_threads': Config.INFERENCE_NUM_THREADS
+    }
+    spec.update({key: value for key, value in overrides.items() if value is not None})
+    return spec
+
+# Modelos del proceso: se calientan antes de publicarse y se reemplazan en caliente
+model_manager = ModelManager(
+    loader=load_model_bundle,
+    warmup=lambda faceNet, emotionModel: warm_up(
+        faceNet, emotionModel, sorted(set(Config.DETECTOR_QUALITY_TIERS.values())),
+        Config.INFERENCE_MAX_BATCH_SIZE, Config.MODEL_WARMUP_RUNS
+    )
+)
+
+# Cargar modelos de forma asíncrona para evitar bloqueos
+def load_models():
+    try:
+        model_manager.load(model_spec())
+    except Exception as e:
+        logger.error(f"Error cargando modelos: {e}")
+
+def _process_with_current_models(frames, boxes=None, input_sizes=None):
+    # Se toma el bundle una vez por lote: un reemplazo no mezcla versiones en el mismo lote
+    bundle = model_manager.current()
+    if bundle is None:
+        raise RuntimeError('Modelos de IA no disponibles')
+    return process_frames_for_emotion(
+        frames, bundle.faceNet, bundle.emotionModel, boxes, input_sizes, Config.DETECTOR_INPUT_SIZE
+    )
+
+# Planificador que agrupa frames de requests concurrentes en un solo lote
+inference_scheduler = InferenceScheduler(
+    _process_with_current_models,
+    max_batch_size=Config.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=Config.INFERENCE_MAX_WAIT_MS
+)
+
+# Seguimiento de rostros por sesión en vivo (evita correr el detector en cada frame)
+face_trackers = FaceTrackerRegistry(
+    redetect_interval=Config.FACE_TRACKING_REDETECT_INTERVAL,
+    min_score=Config.FACE_TRACKING_MIN_SCORE,
+    ttl_seconds=Config.FACE_TRACKING_TTL_S
+)
+
+# Caché de frames casi idénticos por sesión en vivo (huella perceptual + distancia de Hamming)
+frame_cache = EmotionCache(
+    cache_manager,
+    fingerprint_mode=Config.FRAME_CACHE_MODE,
+    hamming_threshold=Config.FRAME_CACHE_HAMMING_THRESHOLD,
+    session_history=Config.FRAME_CACHE_HISTORY,
+    max_age_seconds=Config.FRAME_CACHE_MAX_AGE_S,
+    session_ttl=Config.FACE_TRACKING_TTL_S
+)
+
+def start():
+    """Inicia la inferencia del proceso una sola vez (carga de modelos, workers y planificador).
+
+    Debe llamarse desde el hilo principal antes de iniciar otros hilos: con
+    INFERENCE_WORKERS > 0 los procesos de inferencia se crean con fork.
+    """
+    global inference_pool, _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+    if INFERENCE_AVAILABLE:
+        logger.info(f"Backend de inferencia '{Config.INFERENCE_BACKEND}' disponible")
+    else:
+        logger.error(f"Backend de inferencia '{Config.INFERENCE_BACKEND}' no disponible")
+        return
+
+    # Con INFERENCE_WORKERS > 0 la inferencia corre en procesos aparte, cada uno con sus
+    # propios modelos; los frames se les pasan por memoria compartida
+    if Config.INFERENCE_WORKERS > 0:
+        inference_pool = InferenceWorkerPool(
+            Config.INFERENCE_WORKERS,
+            settings=dict(
+                model_spec(),
+                default_input_size=Config.DETECTOR_INPUT_SIZE,
+                max_batch_size=Config.INFERENCE_MAX_BATCH_SIZE,
+                warmup_input_sizes=sorted(set(Config.DETECTOR_QUALITY_TIERS.values())),
+                warmup_runs=Config.MODEL_WARMUP_RUNS
+            ),
+            slot_bytes=Config.INFERENCE_WORKER_SLOT_BYTES,
+            num_slots=Config.INFERENCE_WORKER_SLOTS,
+            timeout=Config.INFERENCE_TIMEOUT_S
+        )
+        inference_pool.start()
+    else:
+        # Cargar modelos en un hilo separado
+        threading.Thread(target=load_models, name='load-models', daemon=True).start()
+
+    # Los workers de inferencia ya agrupan los frames encolados; el planificador solo aplica en proceso
+    if Config.INFERENCE_BATCHING_ENABLED and inference_pool is None:
+        inference_scheduler.start()
+
+    # SIGHUP recarga los modelos desde la configuración sin reiniciar el proceso
+    if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+            target=_reload_from_signal, name='model-reload', daemon=True
+        ).start())
+
+def _reload_from_signal():
+    try:
+        reload_models()
+    except Exception as e:
+        logger.error(f"Recarga de modelos por SIGHUP fallida: {e}")
+
+def reload_models(model_path=None, backend=None, version=None):
+    """Carga una nueva versión de los modelos y la publica de forma atómica.
+
+    Las requests en curso terminan con la versión anterior; si la carga falla esa versión
+    sigue atendiendo y se lanza la excepción. Retorna un resumen de la versión cargada.
+    """
+    spec = model_spec(model_path=model_path, backend=backend, version=version)
+    if inference_pool is not None:
+        versions = inference_pool.reload(spec)
+        return {'version': sorted(set(versions.values())), 'workers': versions}
+    return model_manager.load(spec).to_dict()
+
+def models_ready():
+    """Indica si hay modelos cargados para atender predicciones (en este proceso o en los workers)"""
+    if not INFERENCE_AVAILABLE:
+        return False
+    if inference_pool is not None:
+        return inference_pool.ready
+    return model_manager.ready
+
+# La lógica de predict_emotion adaptada para el backend
+def process_image_for_emotion(frame, faceNet, emotionModel):
+    """Procesa una imagen para detectar emociones en rostros"""
+    if faceNet is None or emotionModel is None:
+        return [{'error': 'Modelos de IA no disponibles'}]
+    return process_frames_for_emotion([frame], faceNet, emotionModel,
+                                      default_input_size=Config.DETECTOR_INPUT_SIZE)[0]
+
+def run_emotion_inference(frame, tracker=None, input_size=None):
+    """Obtiene las emociones de un frame, usando el seguimiento de la sesión si existe"""
+    boxes = tracker.track(frame) if tracker is not None else None
+
+    if inference_pool is not None:
+        emotion_results = inference_pool.submit(frame, boxes, input_size).result(timeout=Config.INFERENCE_TIMEOUT_S)
+    elif Config.INFERENCE_BATCHING_ENABLED:
+        emotion_results = inference_scheduler.submit(frame, boxes, input_size).result(timeout=Config.INFERENCE_TIMEOUT_S)
+    else:
+        emotion_results = _process_with_current_models([frame], [boxes], [input_size])[0]
+
+    # Tras una detección completa se reinicia el seguimiento con las nuevas cajas
+    if tracker is not None and boxes is None:
+        tracker.reset(frame, [result['box'] for result in emotion_results])
+
+    return emotion_results
+
+def infer_encoded_frame(image_bytes, quality, tracker=None, session_key=None):
+    """Decodifica un frame JPEG/PNG y retorna sus emociones en coordenadas de la imagen original.
+
+    Con session_key, un frame casi idéntico a uno ya inferido en la sesión reutiliza su
+    resultado. Lanza ValueError si la imagen no se puede decodificar.
+    """
+    # Decodificar la imagen usando OpenCV (reducida si excede la resolución útil)
+    try:
+        frame, scale = decode_frame(image_bytes, Config.FRAME_MAX_USEFUL_SIZE)
+    except Exception as e:
+        logger.error(f"Error decodificando imagen: {e}")
+        raise ValueError('Formato de imagen inválido')
+
+    if frame is None:
+        logger.error("No se pudo decodificar la imagen")
+        raise ValueError('No se pudo decodificar la imagen')
+
+    # El caché por sesión compara huellas perceptuales: con FRAME_CACHE_MODE=md5 no se usa
+    use_cache = session_key is not None and Config.FRAME_CACHE_ENABLED and frame_cache.perceptual
+    if use_cache:
+        shape_key = (frame.shape, scale, quality)
+        cached, fingerprint = frame_cache.get_session_frame_prediction(session_key, frame, shape_key)
+        if cached is not None:
+            return cached
+
+    # Procesar la imagen y obtener resultados de emociones
+    emotion_results = run_emotion_inference(frame, tracker, Config.DETECTOR_QUALITY_TIERS[quality])
+    emotion_results = scale_results(emotion_results, scale)
+
+    if use_cache:
+        frame_cache.cache_session_frame_prediction(session_key, fingerprint, emotion_results, shape_key)
+    return emotion_results
+
+def discard_session(session_key):
+    """Libera el seguimiento de rostros y el caché de frames de una sesión finalizada"""
+    face_trackers.discard(session_key)
+    frame_cache.discard_session_frames(session_key)
+
+def get_status():
+    """Estado de los modelos, el batching, los workers y el seguimiento para /api/status"""
+    models_loaded = models_ready()
+    return {
+        'inference_backend': Config.INFERENCE_BACKEND,
+        'inference_backend_available': INFERENCE_AVAILABLE,
+        'emotion_model_variant': Config.EMOTION_MODEL_VARIANT if Config.INFERENCE_BACKEND == 'tflite' else 'float32',
+        'models_loaded': models_loaded,
+        'face_detector_loaded': models_loaded,
+        'emotion_model_loaded': models_loaded,
+        'models': model_manager.get_status() if inference_pool is None else {
+            'state': 'ready' if models_loaded else 'loading',
+            'ready': models_loaded,
+            'versions': inference_pool.get_stats()['model_versions']
+        },
+        'inference_batching': {
+            'enabled': Config.INFERENCE_BATCHING_ENABLED,
+            'max_batch_size': Config.INFERENCE_MAX_BATCH_SIZE,
+            'max_wait_ms': Config.INFERENCE_MAX_WAIT_MS,
+            'stats': inference_scheduler.get_stats()
+        },
+        'frame_input': {
+            'max_useful_resolution': Config.FRAME_MAX_USEFUL_SIZE,
+            'detector_input_size': Config.DETECTOR_INPUT_SIZE,
+            'default_quality': Config.DETECTOR_DEFAULT_QUALITY,
+            'quality_tiers': Config.DETECTOR_QUALITY_TIERS
+        },
+        'inference_workers': inference_pool.get_stats() if inference_pool is not None else {'workers': 0},
+        'face_tracking': {
+            'enabled': Config.FACE_TRACKING_ENABLED,
+            'redetect_interval': Config.FACE_TRACKING_REDETECT_INTERVAL,
+            'stats': face_trackers.get_stats()
+        },
+        'frame_cache': {
+            'enabled': Config.FRAME_CACHE_ENABLED,
+            'max_age_s': Config.FRAME_CACHE_MAX_AGE_S,
+            'stats': frame_cache.get_frame_cache_stats()
+        }
+    }
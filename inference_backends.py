@@ -0,0 +1,130 @@
+"""
+Backends de inferencia para el modelo de emociones
+Permite servir el mismo modelo con Keras, el intérprete de TFLite u ONNX Runtime
+Todos exponen predict(batch) con batch de forma (N, 48, 48, 1) y retornan (N, 7)
+"""
+
+import importlib.util
+import threading
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Módulos requeridos por cada backend (se importan solo al cargar el modelo)
+BACKEND_MODULES = {
+    'keras': ('tensorflow',),
+    'tflite': ('tflite_runtime', 'tensorflow'),
+    'onnx': ('onnxruntime',),
+}
+
+
+def backend_available(name):
+    """Verifica si el runtime del backend está instalado sin importarlo"""
+    modules = BACKEND_MODULES.get(name)
+    if not modules:
+        return False
+    return any(importlib.util.find_spec(module) is not None for module in modules)
+
+
+class KerasBackend:
+    """Modelo .h5 servido con tensorflow.keras"""
+
+    name = 'keras'
+
+    def __init__(self, model_path):
+        from tensorflow.keras.models import load_model
+        self.model = load_model(model_path)
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict(batch, verbose=0))
+
+
+class TFLiteBackend:
+    """Modelo .tflite servido con el intérprete de TFLite (float32, float16 o INT8)"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input_details['shape'][0])
+        # El intérprete no es seguro entre hilos
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(
+                self.input_details['index'], [batch_size, 48, 48, 1]
+            )
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    @staticmethod
+    def _quantize(batch, details):
+        """Convierte la entrada float a la escala del tensor cuantizado (INT8/UINT8)"""
+        scale, zero_point = details['quantization']
+        info = np.iinfo(details['dtype'])
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(details['dtype'])
+
+    @staticmethod
+    def _dequantize(output, details):
+        scale, zero_point = details['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if self.input_details['dtype'] != np.float32:
+            batch = self._quantize(batch, self.input_details)
+        with self._lock:
+            self._resize(batch.shape[0])
+            self.interpreter.set_tensor(self.input_details['index'], batch)
+            self.interpreter.invoke()
+            output = np.array(self.interpreter.get_tensor(self.output_details['index']))
+        if self.output_details['dtype'] != np.float32:
+            output = self._dequantize(output, self.output_details)
+        return output
+
+
+class OnnxBackend:
+    """Modelo .onnx servido con ONNX Runtime"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': OnnxBackend,
+}
+
+
+def load_emotion_backend(name, model_path, **kwargs):
+    """Crea el backend indicado por configuración"""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de inferencia desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+    logger.info(f"Cargando modelo de emociones con backend '{name}' desde {model_path}")
+    if name == 'keras':
+        return KerasBackend(model_path)
+    return BACKENDS[name](model_path, **kwargs)
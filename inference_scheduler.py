@@ -0,0 +1,125 @@
+"""
+Planificador de inferencia por micro-lotes
+Agrupa los frames de requests concurrentes dentro de una ventana corta de tiempo
+y los procesa en una sola pasada del detector y del modelo de emociones
+"""
+
+import queue
+import threading
+import time
+import logging
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """Agrupa frames de distintas requests y reparte los resultados a cada una"""
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait_ms=10):
+        # process_batch recibe (frames, cajas, tamaños de entrada) y retorna resultados por frame
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self._batches = 0
+        self._frames = 0
+        self._errors = 0
+        self._batch_sizes = Counter()
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._total_inference = 0.0
+
+    def start(self):
+        """Inicia el hilo que consume la cola de frames"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+            self._thread.start()
+            logger.info(
+                f"Planificador de inferencia iniciado (lote máx: {self.max_batch_size}, "
+                f"espera máx: {self.max_wait * 1000:.1f} ms)"
+            )
+
+    def submit(self, frame, boxes=None, input_size=None):
+        """Encola un frame y retorna un Future con la lista de resultados de ese frame.
+
+        boxes son cajas de rostros ya conocidas (seguimiento); si es None el frame pasa por el detector.
+        input_size es el tamaño de entrada del detector para ese frame (nivel de calidad).
+        """
+        future = Future()
+        self._queue.put((frame, boxes, input_size, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        with self._lock:
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        return future
+
+    def _collect_batch(self):
+        """Espera el primer frame y acumula más hasta llenar el lote o agotar la ventana"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            frames = [item[0] for item in batch]
+            boxes = [item[1] for item in batch]
+            input_sizes = [item[2] for item in batch]
+            started = time.perf_counter()
+
+            try:
+                results = self.process_batch(frames, boxes, input_sizes)
+                error = None
+            except Exception as e:
+                logger.error(f"Error procesando lote de {len(frames)} frames: {e}")
+                results = None
+                error = e
+
+            finished = time.perf_counter()
+            with self._lock:
+                self._batches += 1
+                self._frames += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._total_inference += finished - started
+                self._total_wait += sum(started - enqueued for *_, enqueued in batch)
+                if error is not None:
+                    self._errors += 1
+
+            for i, (_, _, _, future, _) in enumerate(batch):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[i])
+
+    def get_stats(self):
+        """Obtener estadísticas de profundidad de cola y tamaño de lotes"""
+        with self._lock:
+            batches = self._batches
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'batches_processed': batches,
+                'frames_processed': self._frames,
+                'errors': self._errors,
+                'avg_batch_size': round(self._frames / batches, 2) if batches else 0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'avg_queue_wait_ms': round(self._total_wait / self._frames * 1000, 2) if self._frames else 0,
+                'avg_batch_inference_ms': round(self._total_inference / batches * 1000, 2) if batches else 0
+            }
@@ -0,0 +1,445 @@
+"""
+Procesos de inferencia con traspaso de frames por memoria compartida
+Cada worker es un proceso con su propio faceNet y modelo de emociones, de modo que
+el pre-procesamiento y la inferencia no compiten por el GIL con los hilos de la API.
+Los frames decodificados se copian a búferes de multiprocessing.shared_memory y por
+la cola solo viaja su descriptor (nombre, forma, cajas), nunca los píxeles serializados.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def load_worker_models(settings):
+    """Carga el detector de rostros y el modelo de emociones dentro del proceso worker"""
+    import cv2
+    import model_manager
+
+    if settings.get('num_threads'):
+        cv2.setNumThreads(settings['num_threads'])
+    return model_manager.load_models(settings)
+
+
+def _worker_main(task_queue, result_conn, settings):
+    """Bucle de un proceso worker: toma lotes de su cola, infiere y publica los resultados.
+
+    Cada worker tiene su propia cola de tareas y su propio canal de resultados, así un
+    worker que muere abruptamente no deja bloqueados los canales de los demás.
+    """
+    from face_pipeline import process_frames_for_emotion
+    from model_manager import ModelManager, warm_up
+
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            result_conn.send(message)
+
+    manager = ModelManager(
+        loader=load_worker_models,
+        warmup=lambda faceNet, emotionModel: warm_up(
+            faceNet, emotionModel, settings.get('warmup_input_sizes') or [settings['default_input_size']],
+            settings.get('max_batch_size', 16), settings.get('warmup_runs', 2)
+        )
+    )
+    try:
+        # El worker se anuncia listo solo después del calentamiento
+        manager.load(settings)
+    except Exception as e:
+        send(('failed', str(e)))
+        return
+    send(('ready', manager.current().version))
+
+    def reload(spec):
+        # La nueva versión se carga junto a la vigente; el bucle sigue atendiendo mientras tanto
+        try:
+            bundle = manager.load(spec)
+            send(('reloaded', bundle.version))
+        except Exception as e:
+            send(('reload_failed', str(e)))
+
+    segments = {}
+    max_batch_size = settings.get('max_batch_size', 16)
+    stopping = False
+
+    while not stopping:
+        task = task_queue.get()
+        if task is None:
+            break
+        # Se agrupan las tareas ya encoladas en un solo lote
+        batch = [task]
+        while len(batch) < max_batch_size:
+            try:
+                task = task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                stopping = True
+                break
+            batch.append(task)
+
+        # Mensajes de control: ('reload', spec)
+        for message in [t for t in batch if isinstance(t[0], str)]:
+            if message[0] == 'reload':
+                threading.Thread(target=reload, args=(message[1],), name='model-reload', daemon=True).start()
+        batch = [t for t in batch if not isinstance(t[0], str)]
+        if not batch:
+            continue
+
+        job_ids = [job_id for job_id, *_ in batch]
+        # Todo el lote usa el mismo bundle aunque un reemplazo termine a mitad de camino
+        bundle = manager.current()
+
+        frames = []
+        try:
+            for _, shm_name, shape, _, _ in batch:
+                segment = segments.get(shm_name)
+                if segment is None:
+                    segment = shared_memory.SharedMemory(name=shm_name)
+                    segments[shm_name] = segment
+                # Vista sobre la memoria compartida: el frame no se copia
+                frames.append(np.ndarray(shape, dtype=np.uint8, buffer=segment.buf))
+
+            results = process_frames_for_emotion(
+                frames, bundle.faceNet, bundle.emotionModel,
+                [boxes for *_, boxes, _ in batch],
+                [input_size for *_, input_size in batch],
+                settings['default_input_size']
+            )
+            send(('done', list(zip(job_ids, results))))
+        except Exception as e:
+            send(('error', [(job_id, str(e)) for job_id in job_ids]))
+        # Se sueltan las vistas antes de cerrar los búferes
+        frames = None
+
+        # Los búferes de frames sobredimensionados son de un solo uso
+        for shm_name in [name for name in segments if not name.startswith(settings['slot_prefix'])]:
+            segments.pop(shm_name).close()
+
+    for segment in segments.values():
+        segment.close()
+    with send_lock:
+        result_conn.close()
+
+
+class InferenceWorkerPool:
+    """Reparte frames entre N procesos de inferencia y entrega los resultados como Futures"""
+
+    def __init__(self, num_workers, settings, slot_bytes, num_slots=None, timeout=30, mp_context=None):
+        self.num_workers = max(1, int(num_workers))
+        self.slot_bytes = int(slot_bytes)
+        self.num_slots = int(num_slots or self.num_workers * 4)
+        self.timeout = timeout
+        self.settings = dict(settings)
+        # fork evita reimportar la aplicación en cada worker; spawn donde fork no existe
+        if mp_context is None:
+            methods = multiprocessing.get_all_start_methods()
+            mp_context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        self._ctx = mp_context
+
+        self._workers = {}
+        self._task_queues = {}
+        self._result_conns = {}
+        self._slots = []
+        self._free_slots = queue.Queue()
+        self._pending = {}
+        self._assigned = {}
+        self._ready = set()
+        # Workers que no pudieron cargar los modelos: no se reinician ni reciben frames
+        self._failed = set()
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._collector = None
+        self._running = False
+        self._versions = {}
+        self._reload_acks = None
+        self._reload_lock = threading.Lock()
+
+        # Estadísticas
+        self._submitted = 0
+        self._completed = 0
+        self._errors = 0
+        self._restarts = 0
+        self._oversize = 0
+        self._total_roundtrip = 0.0
+
+    def start(self):
+        """Crea los búferes compartidos, lanza los procesos y el hilo que recoge resultados.
+
+        Debe llamarse antes de iniciar otros hilos del proceso (los workers se crean con fork).
+        """
+        if self._running:
+            return
+
+        # Los workers distinguen los búferes permanentes por su prefijo
+        self.settings['slot_prefix'] = f'emotion_frames_{os.getpid()}_'
+        for idx in range(self.num_slots):
+            segment = shared_memory.SharedMemory(
+                name=f"{self.settings['slot_prefix']}{idx}", create=True, size=self.slot_bytes
+            )
+            self._slots.append(segment)
+            self._free_slots.put(segment)
+
+        self._running = True
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id)
+
+        self._collector = threading.Thread(target=self._collect, name='inference-workers', daemon=True)
+        self._collector.start()
+        atexit.register(self.shutdown)
+        logger.info(
+            f"Pool de inferencia iniciado ({self.num_workers} procesos, {self.num_slots} búferes "
+            f"de {self.slot_bytes / (1024 * 1024):.1f} MB)"
+        )
+
+    def _spawn(self, worker_id):
+        task_queue = self._ctx.Queue()
+        reader, writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(task_queue, writer, self.settings),
+            name=f'inference-worker-{worker_id}',
+            daemon=True
+        )
+        process.start()
+        # El extremo de escritura queda solo en el worker: si muere, el lector recibe EOF
+        writer.close()
+        with self._lock:
+            self._workers[worker_id] = process
+            self._task_queues[worker_id] = task_queue
+            self._result_conns[worker_id] = reader
+            self._assigned[worker_id] = set()
+            self._failed.discard(worker_id)
+
+    def _pick_worker(self):
+        """Worker listo con menos frames asignados. Si aún ninguno está listo, uno que siga
+        cargando los modelos; None si ninguno puede recibir frames (todos fallaron)"""
+        candidates = [w for w in self._workers if w in self._ready] or [
+            w for w, process in self._workers.items() if w not in self._failed and process.is_alive()
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda w: len(self._assigned[w]))
+
+    @property
+    def ready(self):
+        """Hay al menos un worker con los modelos cargados"""
+        return bool(self._ready)
+
+    def submit(self, frame, boxes=None, input_size=None):
+        """Copia el frame a memoria compartida y lo encola; retorna un Future con sus resultados"""
+        future = Future()
+        with self._lock:
+            available = self._pick_worker() is not None
+        if not available:
+            # Sin workers que puedan cargar los modelos el frame fallaría recién con el timeout
+            future.set_exception(RuntimeError('Ningún worker de inferencia puede procesar frames'))
+            return future
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+        one_off = frame.nbytes > self.slot_bytes
+        if one_off:
+            # Frame más grande que los búferes permanentes: búfer propio de un solo uso
+            segment = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        else:
+            try:
+                # Si todos los búferes están ocupados la request espera (contrapresión)
+                segment = self._free_slots.get(timeout=self.timeout)
+            except queue.Empty:
+                future.set_exception(TimeoutError('No hay búferes de frames disponibles'))
+                return future
+
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=segment.buf)[...] = frame
+        if boxes is not None:
+            boxes = np.asarray(boxes).tolist()
+
+        job_id = next(self._job_ids)
+        with self._lock:
+            worker_id = self._pick_worker()
+            if worker_id is None:
+                self._release(segment, one_off)
+                future.set_exception(RuntimeError('Ningún worker de inferencia puede procesar frames'))
+                return future
+            self._pending[job_id] = (future, segment, one_off, worker_id, time.perf_counter())
+            self._assigned[worker_id].add(job_id)
+            self._submitted += 1
+            if one_off:
+                self._oversize += 1
+            task_queue = self._task_queues[worker_id]
+        task_queue.put((job_id, segment.name, frame.shape, boxes, input_size))
+        return future
+
+    def _finish(self, job_id, result=None, error=None):
+        with self._lock:
+            entry = self._pending.pop(job_id, None)
+            if entry is None:
+                return
+            future, segment, one_off, worker_id, submitted = entry
+            self._assigned[worker_id].discard(job_id)
+            self._total_roundtrip += time.perf_counter() - submitted
+            if error is None:
+                self._completed += 1
+            else:
+                self._errors += 1
+
+        self._release(segment, one_off)
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _release(self, segment, one_off):
+        if one_off:
+            segment.close()
+            segment.unlink()
+        else:
+            self._free_slots.put(segment)
+
+    def _collect(self):
+        while self._running:
+            with self._lock:
+                conns = {conn: worker_id for worker_id, conn in self._result_conns.items()}
+            for conn in wait(list(conns), timeout=1.0):
+                worker_id = conns[conn]
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    # El worker terminó; _check_workers lo reemplaza
+                    with self._lock:
+                        self._result_conns.pop(worker_id, None)
+                    conn.close()
+                    continue
+
+                if kind == 'ready':
+                    self._ready.add(worker_id)
+                    self._versions[worker_id] = payload
+                    logger.info(f"Worker de inferencia {worker_id} listo (modelos {payload})")
+                elif kind in ('reloaded', 'reload_failed'):
+                    if kind == 'reloaded':
+                        self._versions[worker_id] = payload
+                    acks = self._reload_acks
+                    if acks is not None:
+                        acks.put((worker_id, kind, payload))
+                elif kind == 'failed':
+                    self._failed.add(worker_id)
+                    logger.error(f"Worker de inferencia {worker_id} no pudo cargar los modelos: {payload}")
+                elif kind == 'done':
+                    for job_id, result in payload:
+                        self._finish(job_id, result=result)
+                elif kind == 'error':
+                    for job_id, message in payload:
+                        self._finish(job_id, error=RuntimeError(message))
+            self._check_workers()
+
+    def _check_workers(self):
+        """Reemplaza los workers caídos y falla los frames que tenían asignados"""
+        for worker_id, process in list(self._workers.items()):
+            if process.is_alive() or not self._running:
+                continue
+            if worker_id not in self._ready:
+                # Falló al cargar los modelos: reiniciarlo solo repetiría el error
+                with self._lock:
+                    self._failed.add(worker_id)
+                    orphaned = list(self._assigned[worker_id])
+                for job_id in orphaned:
+                    self._finish(job_id, error=RuntimeError('El worker de inferencia no pudo cargar los modelos'))
+                continue
+            logger.error(f"Worker de inferencia {worker_id} terminó (código {process.exitcode}); reiniciando")
+            self._ready.discard(worker_id)
+            for job_id in list(self._assigned[worker_id]):
+                self._finish(job_id, error=RuntimeError('El worker de inferencia terminó inesperadamente'))
+            self._restarts += 1
+            self._spawn(worker_id)
+
+    def reload(self, settings_update, timeout=None):
+        """Recarga los modelos en todos los workers sin detenerlos.
+
+        Cada worker carga y calienta la nueva versión junto a la vigente y la reemplaza al
+        terminar. Retorna {worker_id: versión o error}; lanza RuntimeError si algún worker
+        no pudo cargarla (ese worker sigue con la versión anterior).
+        """
+        timeout = timeout if timeout is not None else max(self.timeout, 120)
+        with self._reload_lock:
+            settings = dict(self.settings, **settings_update)
+            with self._lock:
+                targets = {w: self._task_queues[w] for w in self._workers if w in self._ready}
+            if not targets:
+                raise RuntimeError('No hay workers de inferencia listos')
+
+            acks = queue.Queue()
+            self._reload_acks = acks
+            try:
+                for task_queue in targets.values():
+                    task_queue.put(('reload', settings))
+
+                outcome = {}
+                deadline = time.monotonic() + timeout
+                while len(outcome) < len(targets):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        worker_id, kind, payload = acks.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if worker_id in targets:
+                        outcome[worker_id] = (kind, payload)
+            finally:
+                self._reload_acks = None
+
+        failed = {w: payload for w, (kind, payload) in outcome.items() if kind != 'reloaded'}
+        failed.update({w: 'sin respuesta' for w in targets if w not in outcome})
+        if failed:
+            raise RuntimeError(f"Recarga de modelos fallida en workers {failed}")
+        # Los workers que se reinicien después cargan la nueva versión
+        self.settings = settings
+        return {w: payload for w, (_, payload) in outcome.items()}
+
+    def shutdown(self):
+        """Detiene los workers y libera la memoria compartida"""
+        if not self._running:
+            return
+        self._running = False
+        for task_queue in self._task_queues.values():
+            task_queue.put(None)
+        for process in self._workers.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for segment in self._slots:
+            segment.close()
+            segment.unlink()
+        self._slots = []
+
+    def get_stats(self):
+        with self._lock:
+            finished = self._completed + self._errors
+            return {
+                'workers': self.num_workers,
+                'ready_workers': len(self._ready),
+                'failed_workers': len(self._failed),
+                'model_versions': sorted(set(self._versions[w] for w in self._ready if w in self._versions)),
+                'alive_workers': sum(1 for p in self._workers.values() if p.is_alive()),
+                'restarts': self._restarts,
+                'frames_submitted': self._submitted,
+                'frames_completed': self._completed,
+                'errors': self._errors,
+                'in_flight': len(self._pending),
+                'free_slots': self._free_slots.qsize(),
+                'oversize_frames': self._oversize,
+                'avg_roundtrip_ms': round(self._total_roundtrip / finished * 1000, 2) if finished else 0
+            }
@@ -3,7 +3,12 @@
 """
 Script para inicializar la base de datos
 """
+import os
 import sys
+
+# Solo se usa la base de datos: no cargar el stack de inferencia
+os.environ.setdefault('PROCESS_ROLE', 'api')
+
 from app import app, db
 from models import Psicologo, Paciente, Sesion, EmocionDetectada, PasswordResetToken
 
@@ -0,0 +1,163 @@
+"""
+Listados con proyección de campos y paginación por cursor (keyset)
+Un ListSpec describe los campos que un endpoint puede devolver (columna o valor
+calculado a partir de otras columnas) y su orden estable. Con fields= solo se
+seleccionan en SQL las columnas pedidas; con limit= o cursor= la página siguiente se
+obtiene con WHERE (claves) < (últimas claves) en lugar de OFFSET, así que su costo no
+crece con la profundidad. Sin parámetros se devuelve el listado completo como antes.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import func, tuple_
+
+
+class ListParamsError(ValueError):
+    """Parámetros de listado inválidos (fields, limit o cursor)"""
+
+
+class ListParams:
+    def __init__(self, fields, limit=None, cursor=None):
+        self.fields = fields
+        self.limit = limit
+        self.cursor = cursor
+
+    @property
+    def paginated(self):
+        return self.limit is not None
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    """Cursor opaco con las claves de orden de la última fila de la página"""
+    raw = json.dumps([_to_json(value) for value in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Claves de orden de un cursor, convertidas al tipo de cada columna"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        raise ListParamsError('cursor inválido')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ListParamsError('cursor inválido')
+
+    decoded = []
+    for value, column in zip(values, columns):
+        python_type = column.type.python_type
+        try:
+            if value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None and python_type is date:
+                value = date.fromisoformat(value)
+            elif value is not None and not isinstance(value, python_type):
+                raise TypeError
+        except (TypeError, ValueError):
+            raise ListParamsError('cursor inválido')
+        decoded.append(value)
+    return decoded
+
+
+class ListSpec:
+    """Campos y orden de un listado.
+
+    columns: nombre -> expresión de columna; las que empiezan con _ son internas (solo
+    sirven a un campo calculado). computed: nombre -> (nombres de columnas requeridas,
+    función(dict de columnas) -> valor). sort: nombres de columnas que forman la clave de
+    orden, la última única (p. ej. id). descending aplica a toda la clave. nulls: columna de
+    orden que admite NULL -> valor con el que se ordenan y se comparan sus NULL (la
+    comparación de tuplas con NULL no es verdadera y esas filas quedarían fuera de las
+    páginas siguientes).
+    """
+
+    def __init__(self, columns, sort, descending=False, computed=None, nulls=None):
+        self.columns = columns
+        self.computed = computed or {}
+        self.sort = sort
+        self.descending = descending
+        self.nulls = nulls or {}
+        self.fields = [name for name in columns if not name.startswith('_')] + list(self.computed)
+
+    def parse(self, args, default_limit=50, max_limit=500):
+        """Lee fields, limit y cursor de los query params de la request"""
+        fields = self.fields
+        if args.get('fields'):
+            fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in self.fields]
+            if unknown or not fields:
+                raise ListParamsError(
+                    f"Campos desconocidos: {', '.join(unknown) or '(ninguno)'}. Disponibles: {', '.join(self.fields)}"
+                )
+
+        limit = args.get('limit')
+        cursor = args.get('cursor')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise ListParamsError('limit debe ser un entero')
+            if not 1 <= limit <= max_limit:
+                raise ListParamsError(f'limit debe estar entre 1 y {max_limit}')
+        elif cursor:
+            limit = default_limit
+
+        if cursor:
+            cursor = decode_cursor(cursor, [self.columns[name] for name in self.sort])
+        return ListParams(fields, limit, cursor or None)
+
+    def fetch(self, query_factory, params):
+        """Ejecuta el listado.
+
+        query_factory(columnas) retorna la consulta con sus JOIN y filtros. Retorna
+        (lista de dicts con los campos pedidos, cursor de la página siguiente o None).
+        """
+        needed = []
+        for field in params.fields:
+            needed.extend(self.computed[field][0] if field in self.computed else [field])
+        needed.extend(self.sort)
+        needed = list(dict.fromkeys(needed))
+
+        query = query_factory([self.columns[name].label(name) for name in needed])
+        keys = [
+            func.coalesce(self.columns[name], self.nulls[name]) if name in self.nulls else self.columns[name]
+            for name in self.sort
+        ]
+        if params.cursor is not None:
+            if self.descending:
+                query = query.filter(tuple_(*keys) < tuple_(*params.cursor))
+            else:
+                query = query.filter(tuple_(*keys) > tuple_(*params.cursor))
+        query = query.order_by(*[key.desc() if self.descending else key.asc() for key in keys])
+        if params.limit is not None:
+            # Una fila extra indica si hay página siguiente
+            query = query.limit(params.limit + 1)
+
+        rows = [row._asdict() for row in query.all()]
+        next_cursor = None
+        if params.limit is not None and len(rows) > params.limit:
+            rows = rows[:params.limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([
+                self.nulls[name] if last[name] is None and name in self.nulls else last[name]
+                for name in self.sort
+            ])
+
+        items = []
+        for row in rows:
+            item = {}
+            for field in params.fields:
+                if field in self.computed:
+                    item[field] = self.computed[field][1](row)
+                else:
+                    item[field] = _to_json(row[field])
+            items.append(item)
+        return items, next_cursor
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migración de índices: crea en una base de datos existente los índices declarados en
+models.py que falten
+En PostgreSQL cada índice se crea con CREATE INDEX CONCURRENTLY (fuera de una transacción),
+así que las tablas siguen aceptando escrituras mientras se construye. Un índice que quedó
+inválido por una construcción concurrente interrumpida se elimina y se vuelve a crear.
+Después se eliminan los índices que los nuevos reemplazan.
+Ejecutar con: python migrate_indexes.py [--dry-run] [--keep-superseded]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Solo se usa la base de datos: no cargar el stack de inferencia
+os.environ.setdefault('PROCESS_ROLE', 'api')
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from app import app, db
+
+# Índices creados por versiones anteriores de setup_production_db.py que un índice
+# compuesto declarado ya cubre (prefijo de columnas): nuevo -> [reemplazados]
+SUPERSEDED = {
+    'idx_pacientes_psicologo': ['idx_pacientes_psicologo_id'],
+    'idx_emociones_sesion_timestamp': ['idx_emociones_sesion_id'],
+    'idx_sesiones_psicologo_fecha': ['idx_sesiones_fecha']
+}
+
+
+def declared_indexes():
+    return [index for table in db.metadata.sorted_tables for index in sorted(table.indexes, key=lambda i: i.name)]
+
+
+def index_state(conn, name):
+    """None si no existe, True si es válido, False si quedó inválido (solo PostgreSQL)"""
+    row = conn.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_catalog.pg_table_is_visible(c.oid)"
+    ), {'name': name}).first()
+    return None if row is None else bool(row[0])
+
+
+def create_sql(index, dialect, concurrently):
+    # La opción se activa solo para esta sentencia: create_all() crea los índices dentro
+    # de una transacción, donde CONCURRENTLY no está permitido
+    index.dialect_kwargs['postgresql_concurrently'] = concurrently
+    try:
+        return str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+    finally:
+        index.dialect_kwargs['postgresql_concurrently'] = False
+
+
+def migrate(dry_run=False, keep_superseded=False):
+    engine = db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    # CONCURRENTLY no puede ejecutarse dentro de un bloque de transacción
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for index in declared_indexes():
+            if postgres:
+                state = index_state(conn, index.name)
+                if state is True:
+                    print(f"[OK] {index.name} ya existe")
+                    continue
+                if state is False:
+                    print(f"[INFO] {index.name} quedó inválido; se elimina para reconstruirlo")
+                    if not dry_run:
+                        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+            elif index.name in {existing['name'] for existing in inspect(conn).get_indexes(index.table.name)}:
+                print(f"[OK] {index.name} ya existe")
+                continue
+
+            sql = create_sql(index, engine.dialect, concurrently=postgres)
+            print(f"[..] {sql}")
+            if dry_run:
+                continue
+            inicio = time.perf_counter()
+            conn.execute(text(sql))
+            print(f"[OK] {index.name} creado en {time.perf_counter() - inicio:.1f} s")
+
+        if keep_superseded:
+            return
+        for nuevo, reemplazados in SUPERSEDED.items():
+            if not dry_run and postgres and index_state(conn, nuevo) is not True:
+                continue
+            for viejo in reemplazados:
+                drop = f'DROP INDEX {"CONCURRENTLY " if postgres else ""}IF EXISTS "{viejo}"'
+                print(f"[..] {drop} (reemplazado por {nuevo})")
+                if not dry_run:
+                    conn.execute(text(drop))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crea los índices declarados en models.py que falten')
+    parser.add_argument('--dry-run', action='store_true', help='Solo mostrar las sentencias')
+    parser.add_argument('--keep-superseded', action='store_true', help='No eliminar los índices reemplazados')
+    args = parser.parse_args()
+
+    with app.app_context():
+        migrate(dry_run=args.dry_run, keep_superseded=args.keep_superseded)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+        print("\n[OK] Índices actualizados")
+    except Exception as e:
+        print(f"\n[ERROR] Error al crear los índices: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
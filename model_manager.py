@@ -0,0 +1,158 @@
+"""
+Ciclo de vida de los modelos de inferencia
+Carga el detector y el modelo de emociones, los calienta con frames sintéticos antes
+de declararlos listos y permite cargar una nueva versión junto a la actual para
+reemplazarla de forma atómica, sin cortar las requests en curso ni reiniciar el proceso.
+"""
+
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from face_pipeline import FACE_SIZE, load_face_detector, process_frames_for_emotion
+
+logger = logging.getLogger(__name__)
+
+
+class ModelBundle:
+    """Versión cargada de los modelos; no se modifica después de publicarse"""
+
+    def __init__(self, faceNet, emotionModel, version, load_ms, warmup_ms):
+        self.faceNet = faceNet
+        self.emotionModel = emotionModel
+        self.version = version
+        self.load_ms = load_ms
+        self.warmup_ms = warmup_ms
+        self.loaded_at = datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'load_ms': round(self.load_ms, 1),
+            'warmup_ms': round(self.warmup_ms, 1)
+        }
+
+
+def load_models(spec):
+    """Carga el detector de rostros y el modelo de emociones descritos en spec
+    (backend, model_path, detector_path, num_threads)"""
+    from inference_backends import load_emotion_backend
+
+    faceNet = load_face_detector(spec['detector_path'])
+    if faceNet is None:
+        raise RuntimeError('Archivos de detección de rostros no encontrados')
+    if not os.path.exists(spec['model_path']):
+        raise RuntimeError(f"Modelo de emociones no encontrado: {spec['model_path']}")
+    emotionModel = load_emotion_backend(spec['backend'], spec['model_path'], num_threads=spec.get('num_threads'))
+    return faceNet, emotionModel
+
+
+def model_version(spec):
+    """Identifica una versión por la etiqueta indicada o por el archivo y su fecha de modificación"""
+    if spec.get('version'):
+        return spec['version']
+    path = spec['model_path']
+    try:
+        modified = datetime.utcfromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d%H%M%S')
+    except OSError:
+        modified = 'desconocida'
+    return f"{os.path.basename(path)}@{modified}"
+
+
+def warm_up(faceNet, emotionModel, input_sizes, max_batch_size=16, runs=2):
+    """Ejecuta inferencias sobre frames sintéticos para que la primera request real no
+    pague el trazado del grafo ni la reserva de memoria de cada forma de entrada"""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    # Una caja conocida fuerza también el recorte y la clasificación
+    box = [[160, 120, 480, 360]]
+    batch_sizes = sorted({1, max(1, int(max_batch_size))})
+
+    for _ in range(max(1, runs)):
+        for size in input_sizes:
+            # Detector con cada tamaño de entrada de los niveles de calidad
+            process_frames_for_emotion([frame], faceNet, emotionModel, input_sizes=[size], default_input_size=size)
+        process_frames_for_emotion([frame], faceNet, emotionModel, boxes=[box])
+        for batch_size in batch_sizes:
+            emotionModel.predict(np.zeros((batch_size, FACE_SIZE, FACE_SIZE, 1), dtype=np.float32))
+
+
+class ModelManager:
+    """Publica el bundle de modelos vigente y lo reemplaza en caliente"""
+
+    def __init__(self, loader, warmup=None):
+        # loader(spec) retorna (faceNet, emotionModel); warmup(faceNet, emotionModel) los calienta
+        self._loader = loader
+        self._warmup = warmup
+        self._current = None
+        self._load_lock = threading.Lock()
+
+        self.state = 'idle'
+        self.last_error = None
+        self.swaps = 0
+        self.failed_loads = 0
+
+    def current(self):
+        """Bundle vigente (o None). Quien lo toma lo usa completo aunque haya un reemplazo"""
+        return self._current
+
+    @property
+    def ready(self):
+        return self._current is not None
+
+    def load(self, spec):
+        """Carga y calienta una versión junto a la vigente y la publica al terminar.
+
+        Si la carga falla la versión vigente sigue atendiendo. Retorna el nuevo bundle.
+        """
+        with self._load_lock:
+            previous = self._current
+            self.state = 'reloading' if previous is not None else 'loading'
+            version = model_version(spec)
+            logger.info(f"Cargando modelos versión {version}...")
+            try:
+                started = time.perf_counter()
+                faceNet, emotionModel = self._loader(spec)
+                loaded = time.perf_counter()
+                if self._warmup is not None:
+                    self.state = 'warming' if previous is None else 'reloading'
+                    self._warmup(faceNet, emotionModel)
+                warmed = time.perf_counter()
+            except Exception as e:
+                self.failed_loads += 1
+                self.last_error = str(e)
+                self.state = 'ready' if previous is not None else 'failed'
+                logger.error(f"Error cargando modelos versión {version}: {e}")
+                raise
+
+            bundle = ModelBundle(
+                faceNet, emotionModel, version,
+                (loaded - started) * 1000, (warmed - loaded) * 1000
+            )
+            # Reemplazo atómico de la referencia: las requests en curso terminan con el bundle
+            # que ya tomaron y el anterior se libera cuando ninguna lo usa
+            self._current = bundle
+            self.last_error = None
+            self.state = 'ready'
+            if previous is not None:
+                self.swaps += 1
+                logger.info(f"Modelos reemplazados: {previous.version} -> {bundle.version}")
+            else:
+                logger.info(f"Modelos listos (versión {bundle.version}, calentamiento {bundle.warmup_ms:.0f} ms)")
+            return bundle
+
+    def get_status(self):
+        current = self._current
+        return {
+            'state': self.state,
+            'ready': current is not None,
+            'current': current.to_dict() if current is not None else None,
+            'swaps': self.swaps,
+            'failed_loads': self.failed_loads,
+            'last_error': self.last_error
+        }
@@ -1,9 +1,67 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import json
+from sqlalchemy import SmallInteger, String, case, event, type_coerce
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy.types import TypeDecorator
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from emotion_labels import EMOTION_CLASSES, EMOTION_CODES
+
 db = SQLAlchemy()
 
+_raise_on_lazy_load = False
+_emotion_codes = False
+
+def enable_raise_on_lazy_load():
+    """Hace que acceder a una relación que la consulta no cargó lance una excepción en vez
+    de emitir un SELECT por fila (modo de pruebas para detectar consultas N+1)"""
+    global _raise_on_lazy_load
+    if _raise_on_lazy_load:
+        return
+    _raise_on_lazy_load = True
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _apply_raiseload(orm_execute_state):
+        if orm_execute_state.is_select and not orm_execute_state.is_relationship_load:
+            # sql_only: las relaciones que se resuelven desde el identity map siguen permitidas
+            orm_execute_state.statement = orm_execute_state.statement.options(raiseload('*', sql_only=True))
+
+def enable_emotion_codes():
+    """Guarda la emoción de emociones_detectadas como código smallint (esquema particionado,
+    ver partition_emotions.py). Llamar antes de la primera consulta"""
+    global _emotion_codes
+    _emotion_codes = True
+
+class EmotionLabel(TypeDecorator):
+    """Etiqueta de emoción. Con enable_emotion_codes() la columna es smallint y el valor se
+    convierte entre etiqueta y código (índice en EMOTION_CLASSES) al escribir y al leer"""
+    impl = String(50)
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        return dialect.type_descriptor(SmallInteger() if _emotion_codes else String(50))
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or not _emotion_codes:
+            return value
+        try:
+            return EMOTION_CODES[value]
+        except KeyError:
+            raise ValueError(f"Emoción desconocida: {value}")
+    
+    def process_result_value(self, value, dialect):
+        if value is None or not _emotion_codes:
+            return value
+        return EMOTION_CLASSES[value]
+
+def emotion_label_sql(column):
+    """Expresión SQL con la etiqueta de una columna EmotionLabel, para copiarla a columnas
+    de texto dentro de la base de datos (INSERT ... SELECT)"""
+    if not _emotion_codes:
+        return column
+    return case(dict(enumerate(EMOTION_CLASSES)), value=type_coerce(column, SmallInteger()))
+
 class Psicologo(db.Model):
     __tablename__ = 'psicologos'
     
@@ -53,6 +111,11 @@ class Paciente(db.Model):
     # Relación con sesiones
     sesiones = db.relationship('Sesion', backref='paciente', lazy=True)
     
+    # Listado de pacientes por psicólogo, paginado por id
+    __table_args__ = (
+        db.Index('idx_pacientes_psicologo', psicologo_id, id),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -80,6 +143,13 @@ class Sesion(db.Model):
     # Relación con emociones detectadas
     emociones = db.relationship('EmocionDetectada', backref='sesion', lazy=True)
     
+    # Sesiones del psicólogo más recientes primero (listado paginado, actividad reciente,
+    # sesiones de hoy) y búsqueda por paciente
+    __table_args__ = (
+        db.Index('idx_sesiones_psicologo_fecha', psicologo_id, fecha_sesion.desc(), id.desc()),
+        db.Index('idx_sesiones_paciente_id', paciente_id),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -92,6 +162,43 @@ class Sesion(db.Model):
             'confianza_promedio': self.confianza_promedio
         }
 
+class SesionTimeline(db.Model):
+    """Línea de tiempo compacta de las emociones de una sesión (ver emotion_timeline.py)"""
+    __tablename__ = 'sesion_timelines'
+    
+    sesion_id = db.Column(db.Integer, db.ForeignKey('sesiones.id'), primary_key=True)
+    inicio = db.Column(db.DateTime, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    duracion_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    etiquetas = db.Column(db.Text, nullable=False)  # lista JSON; el código es el índice
+    codigos = db.Column(db.LargeBinary, nullable=False)  # uint8 por emoción
+    confianzas = db.Column(db.LargeBinary, nullable=False)  # float16 por emoción
+    deltas_ms = db.Column(db.LargeBinary, nullable=False)  # uint32 por emoción
+    probabilidades = db.Column(db.LargeBinary, nullable=True)  # float16 x clases, opcional
+    ultimo_emocion_id = db.Column(db.Integer, nullable=False, default=0)
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def labels(self):
+        return json.loads(self.etiquetas) if self.etiquetas else []
+    
+    def storage_bytes(self):
+        return sum(len(column or b'') for column in (self.codigos, self.confianzas, self.deltas_ms, self.probabilidades))
+
+class EmocionResumenDiario(db.Model):
+    """Rollup diario de emociones por psicólogo (ver emotion_rollups.py).
+
+    Se mantiene al insertar y eliminar emociones; las estadísticas leen estas filas en
+    lugar de recorrer emociones_detectadas.
+    """
+    __tablename__ = 'emociones_resumen_diario'
+    
+    psicologo_id = db.Column(db.Integer, db.ForeignKey('psicologos.id'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    emotion = db.Column(db.String(50), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    suma_confianza = db.Column(db.Float, nullable=False, default=0.0)
+
 class PasswordResetToken(db.Model):
     __tablename__ = 'password_reset_tokens'
     
@@ -118,13 +225,20 @@ class PasswordResetToken(db.Model):
 
 class EmocionDetectada(db.Model):
     __tablename__ = 'emociones_detectadas'
-    
     id = db.Column(db.Integer, primary_key=True)
     sesion_id = db.Column(db.Integer, db.ForeignKey('sesiones.id'), nullable=False)
-    emotion = db.Column(db.String(50), nullable=False)
+    emotion = db.Column(EmotionLabel(), nullable=False)
     confidence = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Emociones de una sesión en orden (JOIN con sesiones, detalle, línea de tiempo, rollups)
+        db.Index('idx_emociones_sesion_timestamp', sesion_id, timestamp),
+        # Los ids no se reutilizan (SQLite sin AUTOINCREMENT reutiliza los de filas eliminadas):
+        # la línea de tiempo compacta marca hasta qué id empaquetó
+        {'sqlite_autoincrement': True}
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
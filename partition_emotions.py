@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migración de emociones_detectadas al esquema particionado (solo PostgreSQL)
+- Tabla particionada por rango de timestamp, una partición por mes
+  (emociones_detectadas_AAAA_MM), creada por adelantado y bajo demanda por la API
+- Emoción como código smallint (índice en EMOTION_CLASSES de emotion_labels.py)
+- Índice BRIN sobre timestamp además de (sesion_id, timestamp)
+
+La conversión de una tabla existente copia las filas en una sola transacción con la
+tabla bloqueada: detener la API antes de ejecutarla y activar EMOTIONS_PARTITIONED=True
+después. Con la tabla ya particionada el script solo crea las particiones siguientes.
+--detach-before AAAA-MM desacopla los meses anteriores: las tablas se conservan como
+emociones_detectadas_AAAA_MM_detached, las estadísticas siguen disponibles en
+emociones_resumen_diario y la API rechaza nuevas emociones con fecha en esos meses.
+Ejecutar con: python partition_emotions.py [--keep-old] [--detach-before AAAA-MM]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+# Solo se usa la base de datos: no cargar el stack de inferencia
+os.environ.setdefault('PROCESS_ROLE', 'api')
+
+from sqlalchemy import inspect, text
+
+from app import app, db, Config
+from emotion_labels import EMOTION_CLASSES
+import emotion_partitions
+from emotion_partitions import TABLE
+
+OLD_TABLE = f'{TABLE}_sin_particionar'
+
+
+def create_parent(conn, sequence):
+    conn.execute(text(f"""
+        CREATE TABLE {TABLE} (
+            id integer NOT NULL DEFAULT nextval('{sequence}'),
+            sesion_id integer NOT NULL REFERENCES sesiones (id),
+            emotion smallint NOT NULL CHECK (emotion BETWEEN 0 AND {len(EMOTION_CLASSES) - 1}),
+            confidence double precision NOT NULL,
+            "timestamp" timestamp without time zone NOT NULL,
+            PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """))
+
+
+def create_indexes(conn):
+    # Los índices de la tabla padre se crean en cada partición, también en las futuras
+    conn.execute(text(f'CREATE INDEX idx_emociones_sesion_timestamp ON {TABLE} (sesion_id, "timestamp")'))
+    conn.execute(text(f'CREATE INDEX idx_emociones_timestamp_brin ON {TABLE} USING brin ("timestamp")'))
+
+
+def create_new(conn):
+    """Base de datos sin emociones_detectadas: crea la tabla particionada vacía"""
+    conn.execute(text(f'CREATE SEQUENCE IF NOT EXISTS {TABLE}_id_seq'))
+    create_parent(conn, f'{TABLE}_id_seq')
+    conn.execute(text(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id'))
+    create_indexes(conn)
+    print(f"[OK] {TABLE} creada particionada")
+
+
+def convert(conn, keep_old):
+    """Copia una emociones_detectadas existente a la tabla particionada"""
+    conn.execute(text(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE'))
+
+    emotion_type = conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = :table AND column_name = 'emotion' AND table_schema = current_schema()"
+    ), {'table': TABLE}).scalar()
+    if emotion_type == 'smallint':
+        emotion_sql = 'e.emotion'
+    else:
+        unknown = conn.execute(text(
+            f"SELECT emotion, count(*) FROM {TABLE} WHERE emotion <> ALL(:labels) GROUP BY emotion"
+        ), {'labels': EMOTION_CLASSES}).all()
+        if unknown:
+            raise ValueError(
+                "Emociones sin código en EMOTION_CLASSES: "
+                + ', '.join(f"{emotion!r} ({cantidad} filas)" for emotion, cantidad in unknown)
+            )
+        emotion_sql = 'CASE e.emotion ' + ' '.join(
+            f"WHEN '{label}' THEN {code}" for code, label in enumerate(EMOTION_CLASSES)
+        ) + ' END'
+
+    # Filas sin timestamp: se usa la fecha de su sesión (la clave de partición no admite NULL)
+    timestamp_sql = "COALESCE(e.\"timestamp\", s.fecha_sesion, now() AT TIME ZONE 'utc')"
+    first, last, total = conn.execute(text(
+        f"SELECT min({timestamp_sql}), max({timestamp_sql}), count(*) "
+        f"FROM {TABLE} e JOIN sesiones s ON s.id = e.sesion_id"
+    )).one()
+    sequence = conn.execute(text(f"SELECT pg_get_serial_sequence('{TABLE}', 'id')")).scalar()
+    if sequence is None:
+        raise ValueError(f"{TABLE}.id no tiene una secuencia asociada (se esperaba SERIAL)")
+
+    # Los nombres de índices son únicos por esquema: los de la tabla vieja se renombran
+    old_indexes = conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = :table AND schemaname = current_schema()"
+    ), {'table': TABLE}).scalars().all()
+    conn.execute(text(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}'))
+    conn.execute(text(f'ALTER TABLE {OLD_TABLE} ALTER COLUMN id DROP DEFAULT'))
+    for index in old_indexes:
+        conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index[:50]}_sin_particionar"'))
+
+    create_parent(conn, sequence)
+    months = set(emotion_partitions.upcoming_months(Config.EMOTIONS_PARTITION_MONTHS_AHEAD))
+    if total:
+        months.update(emotion_partitions.months_between(first, last))
+    created = emotion_partitions.ensure_partitions(conn, months)
+    print(f"[OK] {len(created)} particiones mensuales creadas")
+
+    inicio = time.perf_counter()
+    conn.execute(text(
+        f'INSERT INTO {TABLE} (id, sesion_id, emotion, confidence, "timestamp") '
+        f"SELECT e.id, e.sesion_id, {emotion_sql}, e.confidence, {timestamp_sql} "
+        f"FROM {OLD_TABLE} e JOIN sesiones s ON s.id = e.sesion_id"
+    ))
+    print(f"[OK] {total} emociones copiadas en {time.perf_counter() - inicio:.1f} s")
+
+    # Índices después de la copia: construirlos una vez es más rápido que mantenerlos fila a fila
+    create_indexes(conn)
+    conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id'))
+    if keep_old:
+        print(f"[INFO] Tabla anterior conservada como {OLD_TABLE}")
+    else:
+        conn.execute(text(f'DROP TABLE {OLD_TABLE}'))
+
+
+def detach_before(conn, month):
+    """Desacopla las particiones de los meses anteriores a month (conn en autocommit)"""
+    for name in sorted(emotion_partitions.partition_names(conn)):
+        partition_month = emotion_partitions.partition_month(name)
+        if partition_month is None or partition_month >= month:
+            continue
+        # CONCURRENTLY (PostgreSQL 14+) no bloquea las lecturas ni escrituras de los otros meses
+        conn.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION "{name}" CONCURRENTLY'))
+        # Con otro nombre: la API rechaza las emociones de ese mes en lugar de crearle una
+        # partición nueva (ver ensure_partitions)
+        detached = emotion_partitions.detached_name(partition_month)
+        conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{detached}"'))
+        print(f"[OK] {name} desacoplada como {detached}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migra emociones_detectadas al esquema particionado')
+    parser.add_argument('--keep-old', action='store_true', help='Conservar la tabla sin particionar')
+    parser.add_argument('--detach-before', metavar='AAAA-MM', default=None,
+                        help='Desacoplar las particiones anteriores a este mes')
+    args = parser.parse_args()
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'postgresql':
+            raise ValueError("El esquema particionado requiere PostgreSQL")
+
+        # Las demás tablas (sesiones es referenciada por la llave foránea)
+        db.metadata.create_all(engine, tables=[table for table in db.metadata.sorted_tables if table.name != TABLE])
+
+        with engine.begin() as conn:
+            if not inspect(conn).has_table(TABLE):
+                create_new(conn)
+            elif emotion_partitions.is_partitioned(conn):
+                print(f"[OK] {TABLE} ya está particionada")
+            else:
+                convert(conn, args.keep_old)
+
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            created = emotion_partitions.ensure_partitions(
+                conn, emotion_partitions.upcoming_months(Config.EMOTIONS_PARTITION_MONTHS_AHEAD)
+            )
+            for name in created:
+                print(f"[OK] Partición {name} creada")
+            if args.detach_before:
+                detach_before(conn, datetime.strptime(args.detach_before, '%Y-%m'))
+            conn.execute(text(f'ANALYZE {TABLE}'))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+        print("\n[OK] Esquema particionado listo. Activar EMOTIONS_PARTITIONED=True y reiniciar la API")
+    except Exception as e:
+        print(f"\n[ERROR] Error al particionar emociones_detectadas: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Cuantización post-entrenamiento del modelo de emociones
+Genera variantes INT8 (y opcionalmente float16) de modelFEC.h5 a partir de un
+conjunto de calibración de rostros, y emite un reporte de latencia, tamaño y
+concordancia por clase frente al modelo float32
+Ejecutar con: python quantize_model.py --calibracion rostros/ [--float16] [--evaluacion otros_rostros/]
+Servir la variante con: INFERENCE_BACKEND=tflite EMOTION_MODEL_VARIANT=int8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+
+import numpy as np
+
+from config import Config
+from convert_model import cargar_frames_parity
+from emotion_labels import EMOTION_CLASSES
+from inference_backends import KerasBackend, TFLiteBackend
+
+
+def cuantizar(keras_model, destino, variante, calibracion=None):
+    """Convierte el modelo Keras a TFLite con la cuantización indicada"""
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if variante == 'int8':
+        def representative_dataset():
+            for rostro in calibracion:
+                yield [rostro[np.newaxis, ...]]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif variante == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+
+    with open(destino, 'wb') as f:
+        f.write(converter.convert())
+
+
+def medir_latencia(backend, rostros, repeticiones=50):
+    """Mediana de latencia en ms para un rostro y para un lote de 8"""
+    resultado = {}
+    for tamano in (1, 8):
+        lote = rostros[:tamano]
+        backend.predict(lote)  # Calentamiento
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            backend.predict(lote)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        resultado[f'batch_{tamano}_ms'] = round(statistics.median(tiempos), 3)
+    return resultado
+
+
+def concordancia_por_clase(referencia, salida):
+    """Porcentaje de rostros en que la variante coincide con la clase del modelo float"""
+    ref = np.argmax(referencia, axis=1)
+    pred = np.argmax(salida, axis=1)
+    por_clase = {}
+    for idx, nombre in enumerate(EMOTION_CLASSES):
+        mascara = ref == idx
+        total = int(mascara.sum())
+        por_clase[nombre] = {
+            'muestras': total,
+            'concordancia': round(float(np.mean(pred[mascara] == idx)) * 100, 2) if total else None
+        }
+    return {
+        'global': round(float(np.mean(pred == ref)) * 100, 2),
+        'error_absoluto_medio': round(float(np.mean(np.abs(salida - referencia))), 6),
+        'por_clase': por_clase
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cuantización del modelo de emociones')
+    parser.add_argument('--calibracion', required=True, help='Carpeta con recortes de rostro para calibrar')
+    parser.add_argument('--evaluacion', help='Carpeta con rostros para el reporte (por defecto, la de calibración)')
+    parser.add_argument('--float16', action='store_true', help='Generar también la variante float16')
+    parser.add_argument('--reporte', default='quantization_report.json')
+    args = parser.parse_args()
+
+    print(f"Cargando modelo float32 desde {Config.MODEL_PATH}...")
+    keras_backend = KerasBackend(Config.MODEL_PATH)
+    calibracion = cargar_frames_parity(args.calibracion)
+    evaluacion = cargar_frames_parity(args.evaluacion) if args.evaluacion else calibracion
+    print(f"Rostros de calibración: {len(calibracion)} | evaluación: {len(evaluacion)}")
+
+    referencia = keras_backend.predict(evaluacion)
+    reporte = {
+        'float32': {
+            'archivo': Config.MODEL_PATH,
+            'tamano_bytes': os.path.getsize(Config.MODEL_PATH),
+            'latencia': medir_latencia(keras_backend, evaluacion)
+        }
+    }
+
+    variantes = ['int8'] + (['float16'] if args.float16 else [])
+    for variante in variantes:
+        destino = os.path.join(os.path.dirname(Config.MODEL_PATH), Config.TFLITE_MODEL_FILES[variante])
+        print(f"\n🔄 Generando variante {variante}: {destino}")
+        cuantizar(keras_backend.model, destino, variante, calibracion)
+
+        backend = TFLiteBackend(destino)
+        salida = backend.predict(evaluacion)
+        reporte[variante] = {
+            'archivo': destino,
+            'tamano_bytes': os.path.getsize(destino),
+            'latencia': medir_latencia(backend, evaluacion),
+            'concordancia': concordancia_por_clase(referencia, salida)
+        }
+
+    print("\n" + "=" * 60)
+    print("📊 REPORTE DE CUANTIZACIÓN")
+    print("=" * 60)
+    for variante, datos in reporte.items():
+        print(f"\n{variante}: {datos['tamano_bytes'] / 1024:.1f} KB | "
+              f"1 rostro: {datos['latencia']['batch_1_ms']} ms | 8 rostros: {datos['latencia']['batch_8_ms']} ms")
+        if 'concordancia' in datos:
+            concordancia = datos['concordancia']
+            print(f"   Concordancia global: {concordancia['global']}% | "
+                  f"Error absoluto medio: {concordancia['error_absoluto_medio']}")
+            for nombre, clase in concordancia['por_clase'].items():
+                valor = f"{clase['concordancia']}%" if clase['concordancia'] is not None else 'sin muestras'
+                print(f"   {nombre:>8}: {valor} ({clase['muestras']} muestras)")
+
+    with open(args.reporte, 'w') as f:
+        json.dump(reporte, f, indent=2)
+    print(f"\nReporte guardado en {args.reporte}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
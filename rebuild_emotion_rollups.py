@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reconstruye desde cero los rollups diarios de emociones (emociones_resumen_diario)
+Ejecutar después de crear la tabla en una base de datos con historial, o si se sospecha
+que los rollups se desincronizaron:
+    python rebuild_emotion_rollups.py [--psicologo ID] [--si-vacia]
+Con --si-vacia solo se reconstruye si la tabla no tiene filas: es el paso de migración que
+ejecuta deploy.sh en cada despliegue.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Solo se usa la base de datos: no cargar el stack de inferencia
+os.environ.setdefault('PROCESS_ROLE', 'api')
+
+from app import app, db, flush_emotion_buffer
+from models import EmocionResumenDiario
+import emotion_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstruye los rollups diarios de emociones')
+    parser.add_argument('--psicologo', type=int, default=None, help='Reconstruir solo los de un psicólogo')
+    parser.add_argument('--si-vacia', action='store_true',
+                        help='Reconstruir solo si la tabla de rollups no tiene filas')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if args.si_vacia and db.session.query(EmocionResumenDiario.psicologo_id).first() is not None:
+            print("[OK] Los rollups ya existen; no se reconstruyen")
+            return
+        flush_emotion_buffer()
+        inicio = time.perf_counter()
+        filas = emotion_rollups.rebuild(args.psicologo)
+        db.session.commit()
+        alcance = f"psicólogo {args.psicologo}" if args.psicologo is not None else "todos los psicólogos"
+        print(f"[OK] Rollups reconstruidos para {alcance}: {filas} filas en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"\n[ERROR] Error al reconstruir los rollups: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
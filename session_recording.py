@@ -0,0 +1,312 @@
+"""
+Registro de emociones de sesiones en vivo en el servidor
+Elige la emoción dominante de cada frame, decide según la tasa de muestreo de la
+sesión qué frames se guardan como EmocionDetectada y los escribe en diferido: las
+filas se acumulan en memoria y se insertan en lote con un solo INSERT multi-fila.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+def dominant_emotion(results):
+    """Resultado con mayor confianza entre los rostros del frame (None si no hay rostros)"""
+    faces = [result for result in results if 'emotion' in result]
+    if not faces:
+        return None
+    return max(faces, key=lambda result: result['confidence'])
+
+
+
+# Tolerancia de reloj para timestamps enviados por el cliente
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+def _parse_timestamp(value):
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    raise ValueError
+
+
+def validate_emotion_batch(items, sesion_id, now=None, max_emotion_length=50, allowed_emotions=None):
+    """Valida un lote de emociones columna por columna.
+
+    Cada campo se valida en una pasada sobre todo el lote y los errores se acumulan por
+    índice, de modo que un ítem inválido no descarta el resto. allowed_emotions, si se
+    indica, restringe las etiquetas aceptadas. Retorna (filas válidas listas para
+    insertar, lista de {"index", "error"}).
+    """
+    now = now or datetime.utcnow()
+    errors = {}
+
+    is_object = [isinstance(item, dict) for item in items]
+    for index, ok in enumerate(is_object):
+        if not ok:
+            errors[index] = 'Cada elemento debe ser un objeto'
+
+    def column(key):
+        return [item.get(key) if ok else None for item, ok in zip(items, is_object)]
+
+    emotions = column('emotion')
+    for index, emotion in enumerate(emotions):
+        if index in errors:
+            continue
+        if not isinstance(emotion, str) or not emotion.strip():
+            errors[index] = 'emotion es requerida'
+        elif len(emotion) > max_emotion_length:
+            errors[index] = f'emotion excede {max_emotion_length} caracteres'
+        elif allowed_emotions is not None and emotion not in allowed_emotions:
+            errors[index] = f'emotion desconocida: {emotion}'
+
+    confidences = [0.0 if value is None else value for value in column('confidence')]
+    for index, confidence in enumerate(confidences):
+        if index in errors:
+            continue
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+            errors[index] = 'confidence debe ser numérica'
+        elif not 0.0 <= confidence <= 1.0:
+            errors[index] = 'confidence debe estar entre 0 y 1'
+
+    timestamps = column('timestamp')
+    parsed_timestamps = [now] * len(items)
+    for index, value in enumerate(timestamps):
+        if index in errors or value is None:
+            continue
+        try:
+            parsed = _parse_timestamp(value)
+        except (TypeError, ValueError):
+            errors[index] = 'timestamp debe ser una fecha ISO 8601'
+            continue
+        if parsed > now + CLOCK_SKEW:
+            errors[index] = 'timestamp no puede estar en el futuro'
+        else:
+            parsed_timestamps[index] = parsed
+
+    rows = [
+        {
+            'sesion_id': sesion_id,
+            'emotion': emotions[index].strip(),
+            'confidence': float(confidences[index]),
+            'timestamp': parsed_timestamps[index]
+        }
+        for index in range(len(items)) if index not in errors
+    ]
+    return rows, [{'index': index, 'error': errors[index]} for index in sorted(errors)]
+
+
+class RecordSampler:
+    """Decide qué frames de cada sesión se registran según una tasa de muestreo.
+
+    Con tasa r en (0, 1] se registra un frame de cada 1/r de forma determinista
+    (el primero siempre), acumulando r por frame con rostro.
+    """
+
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self._credits = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._offered = 0
+        self._recorded = 0
+
+    def should_record(self, key, rate):
+        now = time.monotonic()
+        with self._lock:
+            for expired in [k for k, used in self._last_used.items() if now - used > self.ttl_seconds]:
+                self._credits.pop(expired, None)
+                self._last_used.pop(expired, None)
+
+            credit = self._credits.get(key, 1.0 - rate) + rate
+            record = credit >= 1.0 - 1e-9
+            if record:
+                credit -= 1.0
+            self._credits[key] = credit
+            self._last_used[key] = now
+            self._offered += 1
+            if record:
+                self._recorded += 1
+            return record
+
+    def discard(self, key):
+        """Olvida el estado de una sesión finalizada"""
+        with self._lock:
+            self._credits.pop(key, None)
+            self._last_used.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'active_sessions': len(self._credits),
+                'frames_with_faces': self._offered,
+                'frames_recorded': self._recorded
+            }
+
+
+class EmotionWriteBuffer:
+    """Buffer de escritura diferida para las filas de EmocionDetectada del proceso.
+
+    Las filas se insertan en lote cada max_rows filas o cada max_delay_ms milisegundos,
+    lo que ocurra primero. flush() escribe de forma síncrona (finalizar una sesión,
+    apagado del proceso). Si la base de datos no responde las filas se conservan,
+    hasta max_pending, para el siguiente intento. on_insert(rows), si se indica, se
+    llama en la misma transacción que inserta las filas (p. ej. para mantener rollups).
+    """
+
+    def __init__(self, app, db, model, max_rows=200, max_delay_ms=1000, max_pending=50000, on_insert=None):
+        self.app = app
+        self.db = db
+        self.table = model.__table__
+        self.on_insert = on_insert
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_pending = max_pending
+
+        self._rows = deque()
+        self._lock = threading.Lock()
+        # Serializa las escrituras: un flush síncrono espera al del hilo de fondo
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._running = False
+
+        # Estadísticas
+        self._buffered = 0
+        self._written = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._dropped = 0
+
+    def _ensure_started(self):
+        # El hilo se crea con la primera fila, no al importar: los workers de inferencia
+        # se crean con fork y no deben heredar hilos a medio correr
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._running = True
+                    self._thread = threading.Thread(target=self._run, name='emotion-write-buffer', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.shutdown)
+
+    def add(self, sesion_id, emotion, confidence, timestamp):
+        """Encola una fila; se escribe en el próximo lote"""
+        self._ensure_started()
+        with self._lock:
+            self._rows.append({
+                'sesion_id': sesion_id,
+                'emotion': emotion,
+                'confidence': confidence,
+                'timestamp': timestamp
+            })
+            self._buffered += 1
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            if not self._running:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error escribiendo emociones en lote: {e}")
+
+    def flush(self):
+        """Escribe todas las filas pendientes; retorna cuántas se insertaron"""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._rows)
+                self._rows.clear()
+            if not rows:
+                return 0
+
+            with self.app.app_context():
+                try:
+                    self._insert(rows)
+                    self.db.session.commit()
+                    written = len(rows)
+                except IntegrityError:
+                    # Alguna fila ya no es válida (p. ej. su sesión se eliminó): se aíslan
+                    self.db.session.rollback()
+                    written = self._insert_one_by_one(rows)
+                except Exception:
+                    self.db.session.rollback()
+                    self._requeue(rows)
+                    raise
+                finally:
+                    self.db.session.remove()
+
+            with self._lock:
+                self._written += written
+                self._flushes += 1
+            return written
+
+    def _insert(self, rows):
+        # executemany sobre un INSERT: SQLAlchemy lo envía como INSERT multi-fila
+        self.db.session.execute(insert(self.table), rows)
+        if self.on_insert is not None:
+            self.on_insert(rows)
+
+    def _insert_one_by_one(self, rows):
+        written = 0
+        for row in rows:
+            try:
+                self._insert([row])
+                self.db.session.commit()
+                written += 1
+            except IntegrityError as e:
+                self.db.session.rollback()
+                with self._lock:
+                    self._dropped += 1
+                logger.warning(f"Emoción descartada para la sesión {row['sesion_id']}: {e.orig}")
+        return written
+
+    def _requeue(self, rows):
+        with self._lock:
+            self._failed_flushes += 1
+            # Las filas no escritas vuelven al frente, en orden, sin superar max_pending
+            self._rows.extendleft(reversed(rows))
+            overflow = len(self._rows) - self.max_pending
+            for _ in range(max(0, overflow)):
+                self._rows.popleft()
+                self._dropped += 1
+        if overflow > 0:
+            logger.error(f"Buffer de emociones lleno: se descartaron {overflow} filas")
+
+    def shutdown(self):
+        """Detiene el hilo de fondo y escribe lo pendiente"""
+        self._running = False
+        self._wakeup.set()
+        try:
+            written = self.flush()
+            if written:
+                logger.info(f"Buffer de emociones vaciado al apagar ({written} filas)")
+        except Exception as e:
+            logger.error(f"No se pudieron escribir las emociones pendientes al apagar: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'pending_rows': len(self._rows),
+                'rows_buffered': self._buffered,
+                'rows_written': self._written,
+                'flushes': self._flushes,
+                'failed_flushes': self._failed_flushes,
+                'rows_dropped': self._dropped,
+                'max_rows': self.max_rows,
+                'max_delay_ms': int(self.max_delay * 1000)
+            }
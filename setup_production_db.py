@@ -56,6 +56,8 @@ def create_production_database():
             password=config['password'],
             database=config['database']
         )
+        # ALTER SYSTEM y CREATE INDEX CONCURRENTLY no pueden ejecutarse dentro de una transacción
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
         cursor = conn.cursor()
         
         # Configuraciones de rendimiento
@@ -77,14 +79,13 @@ def create_production_database():
             except Exception as e:
                 logger.warning(f"No se pudo aplicar configuración: {config_sql} - {e}")
         
-        # Crear índices para optimización
+        # Crear índices para optimización (los mismos que declara models.py; en una base de
+        # datos con tablas ya creadas usar: python migrate_indexes.py)
         indexes = [
-            "CREATE INDEX IF NOT EXISTS idx_psicologos_email ON psicologos(email)",
-            "CREATE INDEX IF NOT EXISTS idx_pacientes_psicologo_id ON pacientes(psicologo_id)",
-            "CREATE INDEX IF NOT EXISTS idx_sesiones_paciente_id ON sesiones(paciente_id)",
-            "CREATE INDEX IF NOT EXISTS idx_sesiones_fecha ON sesiones(fecha_inicio)",
-            "CREATE INDEX IF NOT EXISTS idx_emociones_sesion_id ON emociones_detectadas(sesion_id)",
-            "CREATE INDEX IF NOT EXISTS idx_emociones_timestamp ON emociones_detectadas(timestamp)"
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pacientes_psicologo ON pacientes(psicologo_id, id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sesiones_paciente_id ON sesiones(paciente_id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sesiones_psicologo_fecha ON sesiones(psicologo_id, fecha_sesion DESC, id DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_emociones_sesion_timestamp ON emociones_detectadas(sesion_id, timestamp)"
         ]
         
         for index_sql in indexes:
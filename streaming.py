@@ -0,0 +1,161 @@
+"""
+Canal de streaming por WebSocket para sesiones en vivo
+El cliente se autentica una sola vez al abrir el canal y luego envía frames en
+binario de forma continua; las predicciones se devuelven por el mismo canal.
+Si la inferencia se atrasa, solo se conserva el frame más reciente: los frames
+pendientes que quedan obsoletos se descartan en lugar de encolarse.
+"""
+
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameSlot:
+    """Casilla de un solo frame: un frame nuevo reemplaza al que aún no se procesó"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, data):
+        with self._cond:
+            if self._frame is not None:
+                # El frame anterior quedó obsoleto antes de procesarse
+                self.dropped += 1
+            self._seq += 1
+            self.received += 1
+            self._frame = (self._seq, data)
+            self._cond.notify()
+
+    def take(self):
+        """Espera el próximo frame y retorna (número de frame, datos), o None si el canal se cerró"""
+        with self._cond:
+            while self._frame is None and not self._closed:
+                self._cond.wait()
+            item, self._frame = self._frame, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamStats:
+    """Contadores globales de los canales de streaming"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._opened = 0
+        self._received = 0
+        self._processed = 0
+        self._dropped = 0
+
+    def opened(self):
+        with self._lock:
+            self._active += 1
+            self._opened += 1
+
+    def closed(self, slot, processed):
+        with self._lock:
+            self._active -= 1
+            self._received += slot.received
+            self._dropped += slot.dropped
+            self._processed += processed
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'active_streams': self._active,
+                'streams_opened': self._opened,
+                'frames_received': self._received,
+                'frames_processed': self._processed,
+                'frames_dropped': self._dropped,
+                'drop_rate': round(self._dropped / self._received, 3) if self._received else 0
+            }
+
+
+stream_stats = StreamStats()
+
+
+def send_json(ws, payload):
+    ws.send(json.dumps(payload))
+
+
+def receive_auth(ws, timeout):
+    """Lee el primer mensaje del canal, que debe ser JSON con el token: {"token": "...", ...}"""
+    message = ws.receive(timeout=timeout)
+    if message is None or isinstance(message, (bytes, bytearray)):
+        return None
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and data.get('token') else None
+
+
+def serve_stream(ws, process_frame, options):
+    """Atiende un canal ya autenticado hasta que el cliente lo cierre.
+
+    process_frame(datos, opciones) retorna la lista de resultados de un frame.
+    Los mensajes de texto JSON actualizan las opciones (por ejemplo {"quality": "low"}).
+    """
+    slot = LatestFrameSlot()
+    processed = 0
+    stream_stats.opened()
+
+    def reader():
+        # Recibe continuamente para que los frames obsoletos se descarten mientras se infiere
+        try:
+            while True:
+                message = ws.receive()
+                if message is None:
+                    continue
+                if isinstance(message, (bytes, bytearray)):
+                    slot.put(message)
+                    continue
+                try:
+                    update = json.loads(message)
+                except ValueError:
+                    continue
+                if isinstance(update, dict):
+                    options.update(update)
+        except Exception:
+            # ConnectionClosed u otro error de red: el canal terminó
+            pass
+        finally:
+            slot.close()
+
+    reader_thread = threading.Thread(target=reader, name='emotion-stream-reader', daemon=True)
+    reader_thread.start()
+
+    try:
+        while True:
+            item = slot.take()
+            if item is None:
+                break
+            seq, data = item
+            try:
+                payload = {'type': 'prediction', 'frame': seq, 'results': process_frame(data, options)}
+            except ValueError as e:
+                payload = {'type': 'error', 'frame': seq, 'error': str(e)}
+            except Exception as e:
+                logger.error(f"Error procesando frame {seq} del stream: {e}")
+                payload = {'type': 'error', 'frame': seq, 'error': 'Error interno del servidor'}
+            processed += 1
+            payload['dropped'] = slot.dropped
+            send_json(ws, payload)
+    except Exception:
+        # El cliente cerró el canal mientras se enviaba una predicción
+        pass
+    finally:
+        slot.close()
+        stream_stats.closed(slot, processed)
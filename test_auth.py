@@ -0,0 +1,144 @@
+"""
+Prueba de la caché de autenticación (auth_utils.AuthCache)
+- Los psicólogos en caché vencen con AUTH_PRINCIPAL_CACHE_TTL_S
+- La invalidación de un psicólogo modificado se aplica al hacer commit y se descarta con
+  rollback
+- put_principal no guarda un resultado leído antes de una invalidación (versión)
+- Con AUTH_STATELESS los tokens con el claim usr no consultan la base de datos
+Los casos corren en un intérprete nuevo con una base de datos SQLite temporal.
+Ejecutar con: python test_auth.py  (o con pytest)
+"""
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+CACHE_AUTENTICACION = """
+import json, time
+from sqlalchemy import event
+import app
+from models import db, Psicologo
+from auth_utils import AuthenticatedPsicologo, auth_cache, authenticate, configure_auth, generate_token
+from utilidades_pruebas import sembrar
+
+semilla = sembrar(num_pacientes=0, usuario='a1')
+psicologo_id, token = semilla.psicologo_id, semilla.token
+resultado = {}
+with app.app.app_context():
+    token_usr = generate_token(psicologo_id, 'a1')
+
+    consultas = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: consultas.append(1))
+
+    def autenticar(token):
+        consultas.clear()
+        principal = authenticate(token)
+        db.session.remove()
+        return {'usuario': principal.nombre_usuario if principal else None, 'consultas': len(consultas)}
+
+    # Vencimiento por TTL
+    configure_auth(principal_ttl_s=0.2, token_memo_size=16)
+    resultado['ttl'] = [autenticar(token), autenticar(token)]
+    time.sleep(0.3)
+    resultado['ttl'].append(autenticar(token))
+
+    # Invalidación al hacer commit: una request que leyó los datos anteriores entre el flush
+    # y el commit no deja una entrada vieja en la caché
+    configure_auth(principal_ttl_s=60, token_memo_size=16)
+    autenticar(token)
+    db.session.get(Psicologo, psicologo_id).nombre_usuario = 'a1_nuevo'
+    db.session.flush()
+    auth_cache.put_principal(AuthenticatedPsicologo(psicologo_id, 'a1'), auth_cache.version(psicologo_id))
+    antes_del_commit = auth_cache.get_principal(psicologo_id)
+    db.session.commit()
+    db.session.remove()
+    resultado['commit'] = {
+        'antes_del_commit': antes_del_commit.nombre_usuario if antes_del_commit else None,
+        'despues': autenticar(token)
+    }
+
+    # Rollback: la invalidación pendiente se descarta y no afecta al siguiente commit
+    db.session.get(Psicologo, psicologo_id).nombre_usuario = 'a1_descartado'
+    db.session.flush()
+    db.session.rollback()
+    pendientes = 'auth_invalidate' in db.session.info
+    autenticar(token)
+    db.session.commit()
+    db.session.remove()
+    resultado['rollback'] = {'pendientes': pendientes, 'despues': autenticar(token)}
+
+    # Versión: un resultado leído antes de una invalidación no se guarda
+    configure_auth(principal_ttl_s=60, token_memo_size=16)
+    version = auth_cache.version(psicologo_id)
+    auth_cache.invalidate(psicologo_id)
+    auth_cache.put_principal(AuthenticatedPsicologo(psicologo_id, 'viejo'), version)
+    guardado_viejo = auth_cache.get_principal(psicologo_id) is not None
+    auth_cache.put_principal(AuthenticatedPsicologo(psicologo_id, 'actual'), auth_cache.version(psicologo_id))
+    actual = auth_cache.get_principal(psicologo_id)
+    resultado['version'] = {'guardado_viejo': guardado_viejo, 'actual': actual.nombre_usuario if actual else None}
+
+    # Sin estado: el token con usr no consulta la base de datos, ni siquiera si el psicólogo
+    # ya no existe; un token sin usr sí la consulta
+    configure_auth(principal_ttl_s=0, token_memo_size=16, stateless=True)
+    db.session.delete(db.session.get(Psicologo, psicologo_id))
+    db.session.commit()
+    db.session.remove()
+    resultado['stateless'] = {'con_usr': autenticar(token_usr), 'sin_usr': autenticar(token)}
+
+print(json.dumps(resultado))
+"""
+
+
+def ejecutar():
+    """Corre los casos en un intérprete nuevo y retorna sus resultados"""
+    return ejecutar_script(CACHE_AUTENTICACION, {'EMOTION_BUFFER_ENABLED': 'False'})
+
+
+_resultado = None
+
+
+def resultado():
+    global _resultado
+    if _resultado is None:
+        _resultado = ejecutar()
+    return _resultado
+
+
+def test_vencimiento_por_ttl():
+    """El psicólogo en caché se reutiliza hasta que vence su TTL y luego se consulta de nuevo"""
+    primera, segunda, vencida = resultado()['ttl']
+    assert primera == {'usuario': 'a1', 'consultas': 1}, primera
+    assert segunda == {'usuario': 'a1', 'consultas': 0}, segunda
+    assert vencida == {'usuario': 'a1', 'consultas': 1}, vencida
+
+
+def test_invalidacion_al_hacer_commit():
+    """Al hacer commit de un psicólogo modificado su entrada en caché se invalida"""
+    commit = resultado()['commit']
+    assert commit['antes_del_commit'] == 'a1', commit
+    assert commit['despues'] == {'usuario': 'a1_nuevo', 'consultas': 1}, commit
+
+
+def test_rollback_descarta_la_invalidacion():
+    """Con rollback la invalidación pendiente se descarta y la caché sigue sirviendo"""
+    rollback = resultado()['rollback']
+    assert rollback['pendientes'] is False, rollback
+    assert rollback['despues'] == {'usuario': 'a1_nuevo', 'consultas': 0}, rollback
+
+
+def test_version_descarta_lecturas_viejas():
+    """put_principal ignora un psicólogo leído antes de la última invalidación"""
+    version = resultado()['version']
+    assert version == {'guardado_viejo': False, 'actual': 'actual'}, version
+
+
+def test_tokens_sin_estado():
+    """Con AUTH_STATELESS el token con usr no consulta la base de datos; sin usr sí"""
+    stateless = resultado()['stateless']
+    assert stateless['con_usr'] == {'usuario': 'a1', 'consultas': 0}, stateless
+    assert stateless['sin_usr'] == {'usuario': None, 'consultas': 1}, stateless
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🔐 PRUEBAS DE LA CACHÉ DE AUTENTICACIÓN", [
+        test_vencimiento_por_ttl, test_invalidacion_al_hacer_commit, test_rollback_descarta_la_invalidacion,
+        test_version_descarta_lecturas_viejas, test_tokens_sin_estado
+    ])
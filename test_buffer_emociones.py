@@ -0,0 +1,174 @@
+"""
+Prueba del buffer de escritura diferida de emociones (EMOTION_BUFFER_ENABLED)
+- El buffer es opcional y solo se usa con PROCESS_ROLE=both: por defecto, y en un proceso
+  de API con los roles separados, cada emoción se guarda en su request
+- Con el buffer POST /api/sesiones/<id>/emociones responde 202 con pendiente=true y la
+  emoción sin id; sin el buffer responde 201 con el id de la fila
+- Una fila inválida en el lote no descarta las demás (inserción fila por fila)
+- Si la base de datos falla las filas vuelven al buffer, sin superar max_pending
+- Las filas pendientes se escriben al terminar el proceso (atexit)
+Cada caso corre en un intérprete nuevo con una base de datos SQLite temporal.
+Ejecutar con: python test_buffer_emociones.py  (o con pytest)
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+SEMBRAR = """
+import json
+import app
+from models import db, EmocionDetectada
+from utilidades_pruebas import sembrar
+
+semilla = sembrar()
+sesion_id, headers = semilla.sesion_id, semilla.headers
+
+def filas():
+    with app.app.app_context():
+        return db.session.query(EmocionDetectada).filter(EmocionDetectada.sesion_id == sesion_id).count()
+"""
+
+GUARDAR_EMOCION = SEMBRAR + """
+cliente = app.app.test_client()
+respuesta = cliente.post(f'/api/sesiones/{sesion_id}/emociones', json={'emotion': 'happy', 'confidence': 0.8},
+                         headers=headers)
+antes = filas()
+app.flush_emotion_buffer()
+print(json.dumps({'status': respuesta.status_code, 'cuerpo': respuesta.get_json(), 'antes': antes, 'despues': filas()}))
+"""
+
+FILA_INVALIDA = SEMBRAR + """
+from datetime import datetime
+buffer = app.emotion_buffer
+for confianza in (0.1, 0.2, None, 0.4):
+    # confidence es NOT NULL: el INSERT del lote falla con IntegrityError
+    buffer.add(sesion_id, 'happy', confianza, datetime.utcnow())
+escritas = buffer.flush()
+print(json.dumps({'escritas': escritas, 'filas': filas(), 'stats': buffer.get_stats()}))
+"""
+
+REENCOLAR = SEMBRAR + """
+from datetime import datetime
+from sqlalchemy import text
+from session_recording import EmotionWriteBuffer
+buffer = EmotionWriteBuffer(app.app, db, EmocionDetectada, max_rows=1000, max_delay_ms=60000, max_pending=3)
+for confianza in (0.1, 0.2, 0.3, 0.4):
+    buffer.add(sesion_id, 'happy', confianza, datetime.utcnow())
+
+# Base de datos no disponible: la tabla no existe durante el flush
+with app.app.app_context():
+    with db.engine.begin() as conn:
+        conn.execute(text('ALTER TABLE emociones_detectadas RENAME TO emociones_fuera'))
+try:
+    buffer.flush()
+    error = None
+except Exception as e:
+    error = type(e).__name__
+pendientes = buffer.get_stats()['pending_rows']
+with app.app.app_context():
+    with db.engine.begin() as conn:
+        conn.execute(text('ALTER TABLE emociones_fuera RENAME TO emociones_detectadas'))
+
+escritas = buffer.flush()
+with app.app.app_context():
+    confianzas = [fila.confidence for fila in db.session.query(EmocionDetectada).order_by(EmocionDetectada.id)]
+print(json.dumps({'error': error, 'pendientes': pendientes, 'escritas': escritas, 'confianzas': confianzas,
+                  'stats': buffer.get_stats()}))
+"""
+
+SALIR_CON_PENDIENTES = SEMBRAR + """
+from datetime import datetime
+for confianza in (0.1, 0.2, 0.3):
+    app.emotion_buffer.add(sesion_id, 'happy', confianza, datetime.utcnow())
+print(json.dumps({'sesion_id': sesion_id, 'pendientes': app.emotion_buffer.get_stats()['pending_rows']}))
+"""
+
+
+def ejecutar(script, carpeta=None, buffer=True, rol='both'):
+    """Corre script en un intérprete nuevo y retorna el JSON de su última línea.
+
+    buffer=None no define EMOTION_BUFFER_ENABLED (valor por defecto).
+    """
+    env = {
+        'PROCESS_ROLE': rol,
+        # Sin escrituras del hilo de fondo durante la prueba: solo los flush explícitos
+        'EMOTION_BUFFER_MAX_DELAY_MS': '60000'
+    }
+    if buffer is not None:
+        env['EMOTION_BUFFER_ENABLED'] = str(buffer)
+    return ejecutar_script(script, env, carpeta=carpeta)
+
+
+def test_respuesta_con_buffer():
+    """Con el buffer la emoción se acepta con 202, pendiente=true y sin id hasta el flush"""
+    resultado = ejecutar(GUARDAR_EMOCION)
+    assert resultado['status'] == 202, resultado
+    assert resultado['cuerpo']['pendiente'] is True, resultado
+    assert resultado['cuerpo']['emocion']['id'] is None, resultado
+    assert (resultado['antes'], resultado['despues']) == (0, 1), resultado
+
+
+def test_respuesta_sin_buffer():
+    """Sin el buffer la emoción se guarda en la request y responde 201 con su id"""
+    resultado = ejecutar(GUARDAR_EMOCION, buffer=False)
+    assert resultado['status'] == 201, resultado
+    assert 'pendiente' not in resultado['cuerpo'], resultado
+    assert resultado['cuerpo']['emocion']['id'] is not None, resultado
+    assert (resultado['antes'], resultado['despues']) == (1, 1), resultado
+
+
+def test_buffer_desactivado_por_defecto():
+    """Sin EMOTION_BUFFER_ENABLED la emoción se guarda en la request"""
+    resultado = ejecutar(GUARDAR_EMOCION, buffer=None)
+    assert resultado['status'] == 201, resultado
+    assert resultado['cuerpo']['emocion']['id'] is not None, resultado
+
+
+def test_buffer_ignorado_con_roles_separados():
+    """Con PROCESS_ROLE=api el buffer se ignora: finalizar la sesión no vería el de otro proceso"""
+    resultado = ejecutar(GUARDAR_EMOCION, rol='api')
+    assert resultado['status'] == 201, resultado
+    assert (resultado['antes'], resultado['despues']) == (1, 1), resultado
+
+
+def test_fila_invalida():
+    """Una fila inválida se descarta y las demás del lote se insertan una por una"""
+    resultado = ejecutar(FILA_INVALIDA)
+    assert resultado['escritas'] == 3, resultado
+    assert resultado['filas'] == 3, resultado
+    assert resultado['stats']['rows_dropped'] == 1, resultado
+    assert resultado['stats']['pending_rows'] == 0, resultado
+
+
+def test_reencolar_si_falla_la_base_de_datos():
+    """Si el INSERT falla las filas vuelven al buffer (las más antiguas se descartan sobre max_pending)"""
+    resultado = ejecutar(REENCOLAR)
+    assert resultado['error'] == 'OperationalError', resultado
+    assert resultado['pendientes'] == 3, resultado
+    assert resultado['escritas'] == 3, resultado
+    assert resultado['confianzas'] == [0.2, 0.3, 0.4], resultado
+    assert resultado['stats']['failed_flushes'] == 1, resultado
+    assert resultado['stats']['rows_dropped'] == 1, resultado
+
+
+def test_flush_al_salir():
+    """Las emociones pendientes se escriben cuando el proceso termina"""
+    with tempfile.TemporaryDirectory() as carpeta:
+        resultado = ejecutar(SALIR_CON_PENDIENTES, carpeta)
+        with sqlite3.connect(os.path.join(carpeta, 'prueba.db')) as conn:
+            filas = conn.execute(
+                'SELECT count(*) FROM emociones_detectadas WHERE sesion_id = ?', (resultado['sesion_id'],)
+            ).fetchone()[0]
+    assert resultado['pendientes'] == 3, resultado
+    assert filas == 3, filas
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🗃️  PRUEBAS DEL BUFFER DE EMOCIONES", [
+        test_respuesta_con_buffer, test_respuesta_sin_buffer, test_buffer_desactivado_por_defecto,
+        test_buffer_ignorado_con_roles_separados, test_fila_invalida,
+        test_reencolar_si_falla_la_base_de_datos, test_flush_al_salir
+    ])
@@ -0,0 +1,78 @@
+"""
+Prueba de regresión de consultas N+1 en los endpoints de listados y estadísticas
+Siembra un psicólogo con pocas y con muchas sesiones y verifica que el número de
+consultas SQL por request no crezca con el número de filas. Los procesos corren con
+DB_RAISE_ON_LAZY_LOAD=True: acceder a una relación que la consulta no cargó falla.
+Ejecutar con: python test_consultas.py  (o con pytest)
+"""
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+CONTAR_CONSULTAS = """
+import json, sys
+from sqlalchemy import event
+import app
+from models import db, Sesion, EmocionDetectada
+from utilidades_pruebas import sembrar
+
+semilla = sembrar(num_pacientes=int(sys.argv[1]), sesiones_por_paciente=2)
+psicologo_id, sesion_id = semilla.psicologo_id, semilla.sesion_id
+with app.app.app_context():
+    for id_sesion in semilla.sesion_ids:
+        db.session.add(EmocionDetectada(sesion_id=id_sesion, emotion='happy', confidence=0.9))
+    db.session.commit()
+    db.session.remove()
+
+    # Con el modo activo el acceso perezoso a una relación debe fallar
+    try:
+        db.session.get(Sesion, sesion_id).paciente
+        lazy_load_falla = False
+    except Exception:
+        lazy_load_falla = True
+    db.session.remove()
+
+    consultas = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: consultas.append(1))
+
+cliente = app.app.test_client()
+resultado = {'lazy_load_falla': lazy_load_falla}
+for nombre, url in {
+    'sesiones': f'/api/sesiones/psicologo/{psicologo_id}',
+    'sesion_detalle': f'/api/sesiones/{sesion_id}',
+    'pacientes': f'/api/pacientes/psicologo/{psicologo_id}',
+    'dashboard': f'/api/dashboard/stats/{psicologo_id}',
+    'estadisticas_emociones': f'/api/estadisticas/emociones/{psicologo_id}',
+}.items():
+    consultas.clear()
+    respuesta = cliente.get(url, headers=semilla.headers)
+    resultado[nombre] = {'status': respuesta.status_code, 'consultas': len(consultas)}
+print(json.dumps(resultado))
+"""
+
+
+def ejecutar(num_pacientes):
+    """Siembra la base de datos en un intérprete nuevo y retorna las consultas por endpoint"""
+    return ejecutar_script(
+        CONTAR_CONSULTAS, {'DB_RAISE_ON_LAZY_LOAD': 'True', 'EMOTION_BUFFER_ENABLED': 'False'}, [num_pacientes]
+    )
+
+
+def test_modo_raise_on_lazy_load():
+    """Con DB_RAISE_ON_LAZY_LOAD=True acceder a una relación no cargada lanza una excepción"""
+    assert ejecutar(1)['lazy_load_falla']
+
+
+def test_consultas_constantes():
+    """Las consultas por request no dependen del número de pacientes ni de sesiones"""
+    pocas = ejecutar(2)
+    muchas = ejecutar(40)
+    for endpoint in ('sesiones', 'sesion_detalle', 'pacientes', 'dashboard', 'estadisticas_emociones'):
+        assert pocas[endpoint]['status'] == 200, (endpoint, pocas[endpoint])
+        assert muchas[endpoint]['status'] == 200, (endpoint, muchas[endpoint])
+        print(f"   {endpoint}: {pocas[endpoint]['consultas']} consultas con 4 sesiones, "
+              f"{muchas[endpoint]['consultas']} con 80")
+        assert pocas[endpoint]['consultas'] == muchas[endpoint]['consultas'], (endpoint, pocas, muchas)
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🗄️  PRUEBAS DE CONSULTAS N+1", [test_modo_raise_on_lazy_load, test_consultas_constantes])
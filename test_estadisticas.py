@@ -0,0 +1,75 @@
+"""
+Prueba del resumen de estadísticas (GET /api/estadisticas/resumen/<id>)
+- Los totales, la confianza promedio y la emoción predominante se calculan en SQL con los
+  mismos resultados que el cálculo anterior en Python: las sesiones sin confianza cuentan
+  como 0 y los empates de la emoción predominante se resuelven por nombre
+- Solo cuentan las sesiones y los pacientes del psicólogo, y el resumen se obtiene con una
+  sola consulta
+Ejecutar con: python test_estadisticas.py  (o con pytest)
+"""
+
+import json
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+RESUMEN = """
+import json, sys
+from sqlalchemy import event
+import app
+from models import db, Sesion
+from utilidades_pruebas import sembrar
+
+semilla = sembrar(num_pacientes=3, sesiones_por_paciente=2)
+vacio = sembrar(num_pacientes=0, usuario='vacio')
+valores = json.loads(sys.argv[1])
+with app.app.app_context():
+    for sesion_id, (emocion, confianza) in zip(semilla.sesion_ids, valores):
+        sesion = db.session.get(Sesion, sesion_id)
+        sesion.emocion_predominante, sesion.confianza_promedio = emocion, confianza
+    db.session.commit()
+    db.session.remove()
+
+    consultas = []
+    event.listen(db.engine, 'before_cursor_execute',
+                 lambda conn, cursor, sql, *args: consultas.append(1) if 'sesiones' in sql else None)
+
+cliente = app.app.test_client()
+respuesta = cliente.get(f'/api/estadisticas/resumen/{semilla.psicologo_id}', headers=semilla.headers)
+print(json.dumps({
+    'resumen': respuesta.get_json(),
+    'consultas': len(consultas),
+    'vacio': cliente.get(f'/api/estadisticas/resumen/{vacio.psicologo_id}', headers=vacio.headers).get_json(),
+    'ajeno': cliente.get(f'/api/estadisticas/resumen/{vacio.psicologo_id}', headers=semilla.headers).status_code
+}))
+"""
+
+
+def ejecutar(valores):
+    """Siembra 3 pacientes con 6 sesiones con (emoción, confianza) y pide el resumen"""
+    return ejecutar_script(RESUMEN, {'EMOTION_BUFFER_ENABLED': 'False'}, [json.dumps(valores)])
+
+
+def test_resumen_de_estadisticas():
+    """Totales, confianza promedio (sin confianza cuenta 0) y emoción predominante"""
+    resultado = ejecutar([
+        ['sad', 0.8], ['happy', 0.6], [None, None], ['sad', 0.4], ['happy', 0.7], ['', 0.5]
+    ])
+    # (0.8 + 0.6 + 0 + 0.4 + 0.7 + 0.5) / 6; happy y sad empatan: gana happy por nombre
+    assert resultado['resumen'] == {
+        'total_sesiones': 6, 'total_pacientes': 3, 'confianza_promedio': 0.5, 'emocion_predominante': 'Felicidad'
+    }, resultado
+    assert resultado['consultas'] == 1, resultado
+
+
+def test_resumen_sin_sesiones():
+    """Un psicólogo sin sesiones ni pacientes obtiene ceros y N/A; el de otro psicólogo no se ve"""
+    resultado = ejecutar([['angry', 0.9]])
+    assert resultado['resumen']['emocion_predominante'] == 'Enojo', resultado
+    assert resultado['vacio'] == {
+        'total_sesiones': 0, 'total_pacientes': 0, 'confianza_promedio': 0, 'emocion_predominante': 'N/A'
+    }, resultado
+    assert resultado['ajeno'] == 403, resultado
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("📈 PRUEBAS DEL RESUMEN DE ESTADÍSTICAS", [test_resumen_de_estadisticas, test_resumen_sin_sesiones])
@@ -0,0 +1,93 @@
+"""
+Prueba de los índices declarados en models.py y de migrate_indexes.py
+- En una base de datos creada antes de los índices compuestos la migración crea los que
+  faltan y elimina los que estos reemplazan; una segunda ejecución no cambia nada
+- Las consultas por psicólogo y rango de fechas usan los índices compuestos (predicados
+  sargables, sin funciones sobre la columna indexada)
+Corre en un intérprete nuevo con una base de datos SQLite temporal.
+Ejecutar con: python test_indices.py  (o con pytest)
+"""
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+MIGRAR_INDICES = """
+import contextlib, io, json
+from datetime import datetime
+from sqlalchemy import inspect, text
+import app
+import migrate_indexes
+from models import db
+
+def indices():
+    inspector = inspect(db.engine)
+    return sorted(i['name'] for tabla in ('pacientes', 'sesiones', 'emociones_detectadas')
+                  for i in inspector.get_indexes(tabla) if i['name'].startswith('idx_'))
+
+def plan(sql, **params):
+    with db.engine.connect() as conn:
+        return ' | '.join(fila[-1] for fila in conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params))
+
+with app.app.app_context():
+    db.create_all()
+    # Esquema anterior: sin los índices compuestos y con los índices simples que reemplazan
+    with db.engine.begin() as conn:
+        for nombre in migrate_indexes.SUPERSEDED:
+            conn.execute(text(f'DROP INDEX {nombre}'))
+        conn.execute(text('CREATE INDEX idx_pacientes_psicologo_id ON pacientes(psicologo_id)'))
+        conn.execute(text('CREATE INDEX idx_emociones_sesion_id ON emociones_detectadas(sesion_id)'))
+        conn.execute(text('CREATE INDEX idx_sesiones_fecha ON sesiones(fecha_sesion)'))
+    antes = indices()
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_indexes.migrate()
+    despues = indices()
+    salida = io.StringIO()
+    with contextlib.redirect_stdout(salida):
+        migrate_indexes.migrate()
+    creados_otra_vez = [linea for linea in salida.getvalue().splitlines() if 'CREATE INDEX' in linea]
+
+    desde = datetime(2024, 5, 1)
+    planes = {
+        'sesiones': plan('SELECT id FROM sesiones WHERE psicologo_id = :p AND fecha_sesion >= :desde '
+                         'ORDER BY fecha_sesion DESC, id DESC', p=1, desde=desde),
+        'emociones': plan('SELECT emotion FROM emociones_detectadas WHERE sesion_id = :s '
+                          'AND timestamp >= :desde AND timestamp < :hasta', s=1, desde=desde, hasta=datetime(2024, 5, 2)),
+        'pacientes': plan('SELECT id FROM pacientes WHERE psicologo_id = :p ORDER BY id', p=1),
+    }
+print(json.dumps({'antes': antes, 'despues': despues, 'creados_otra_vez': creados_otra_vez, 'planes': planes}))
+"""
+
+
+_resultado = None
+
+
+def resultado():
+    global _resultado
+    if _resultado is None:
+        _resultado = ejecutar_script(MIGRAR_INDICES)
+    return _resultado
+
+
+def test_migracion_de_indices():
+    """La migración crea los índices compuestos, elimina los reemplazados y es idempotente"""
+    assert resultado()['antes'] == [
+        'idx_emociones_sesion_id', 'idx_pacientes_psicologo_id', 'idx_sesiones_fecha', 'idx_sesiones_paciente_id'
+    ], resultado()
+    assert resultado()['despues'] == [
+        'idx_emociones_sesion_timestamp', 'idx_pacientes_psicologo', 'idx_sesiones_paciente_id',
+        'idx_sesiones_psicologo_fecha'
+    ], resultado()
+    assert resultado()['creados_otra_vez'] == [], resultado()
+
+
+def test_consultas_usan_los_indices():
+    """Los filtros por psicólogo o sesión y rango de fechas se resuelven con los índices compuestos"""
+    planes = resultado()['planes']
+    assert 'idx_sesiones_psicologo_fecha' in planes['sesiones'], planes
+    # El orden ya lo da el índice: no hay un paso de ordenamiento aparte
+    assert 'TEMP B-TREE' not in planes['sesiones'], planes
+    assert 'idx_emociones_sesion_timestamp (sesion_id=? AND timestamp>? AND timestamp<?)' in planes['emociones'], planes
+    assert 'idx_pacientes_psicologo' in planes['pacientes'] and 'TEMP B-TREE' not in planes['pacientes'], planes
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🗂️  PRUEBAS DE ÍNDICES", [test_migracion_de_indices, test_consultas_usan_los_indices])
@@ -0,0 +1,440 @@
+"""
+Prueba del pipeline de inferencia de emociones
+- Todos los rostros de todos los frames se clasifican en una sola llamada al modelo
+  (face_pipeline.py); el post-procesamiento vectorizado da las mismas cajas y recortes
+  que recorrer los rostros uno por uno
+- Los frames se decodifican reducidos si exceden la resolución útil (frame_decoding.py) y
+  las cajas vuelven a coordenadas de la imagen original; cada tamaño de entrada del
+  detector se procesa en su propio blob
+- El planificador (inference_scheduler.py) agrupa frames de requests concurrentes sin
+  superar el lote máximo y entrega a cada request su resultado o el error del lote
+- Los backends (inference_backends.py) retornan (N, 7) para cualquier tamaño de lote; el
+  de ONNX Runtime se prueba con un modelo generado si onnx y onnxruntime están instalados
+- Variantes cuantizadas: EMOTION_MODEL_VARIANT elige el archivo TFLite, la entrada y la
+  salida INT8 se convierten con la escala del tensor y el reporte de quantize_model.py
+  mide la concordancia por clase
+- El ciclo de vida de los modelos (model_manager.py): una versión se calienta antes de
+  publicarse y, si la nueva falla, la vigente sigue atendiendo
+- El seguimiento por sesión (face_tracker.py) sigue un rostro que se mueve y pide una
+  detección completa cada FACE_TRACKING_REDETECT_INTERVAL frames o al perder confianza
+Los casos usan un detector y un modelo simulados en el mismo proceso.
+Ejecutar con: python test_inferencia.py  (o con pytest)
+"""
+
+import importlib.util
+import os
+import tempfile
+
+import numpy as np
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+
+class DetectorSimulado:
+    """Detector SSD simulado: retorna las detecciones indicadas y cuenta las llamadas"""
+
+    def __init__(self, detecciones):
+        self.detecciones = np.asarray(detecciones, np.float32).reshape(1, 1, -1, 7)
+        self.llamadas = 0
+
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self):
+        self.llamadas += 1
+        return self.detecciones
+
+
+class ModeloSimulado:
+    """Modelo de emociones simulado: la clase de cada rostro sale de su brillo medio"""
+
+    def __init__(self):
+        self.lotes = []
+
+    def predict(self, rostros):
+        self.lotes.append(len(rostros))
+        salida = np.full((len(rostros), 7), 0.01, np.float32)
+        salida[np.arange(len(rostros)), (rostros.reshape(len(rostros), -1).mean(axis=1) // 37).astype(int) % 7] = 0.94
+        return salida
+
+
+def frame_de_prueba(brillos, alto=240, ancho=320):
+    """Frame BGR con una franja vertical de brillo uniforme por rostro"""
+    frame = np.zeros((alto, ancho, 3), np.uint8)
+    franja = ancho // max(1, len(brillos))
+    for k, brillo in enumerate(brillos):
+        frame[:, k * franja:(k + 1) * franja] = brillo
+    return frame
+
+
+def test_un_solo_llamado_al_modelo():
+    """Los rostros de varios frames se clasifican en una sola llamada al modelo, en orden"""
+    from face_pipeline import EMOTION_CLASSES, process_frames_for_emotion
+
+    frames = [frame_de_prueba([40, 120]), frame_de_prueba([200]), frame_de_prueba([90])]
+    detector = DetectorSimulado([
+        [0, 1, 0.9, 0.05, 0.1, 0.45, 0.9],   # frame 0, franja izquierda
+        [0, 1, 0.8, 0.55, 0.1, 0.95, 0.9],   # frame 0, franja derecha
+        [1, 1, 0.9, 0.2, 0.2, 0.8, 0.8],     # frame 1
+        [2, 1, 0.1, 0.2, 0.2, 0.8, 0.8],     # frame 2: bajo el umbral
+    ])
+    modelo = ModeloSimulado()
+
+    resultados = process_frames_for_emotion(frames, detector, modelo)
+    assert detector.llamadas == 1, detector.llamadas
+    assert detector.blob.shape[0] == 3, detector.blob.shape
+    assert modelo.lotes == [3], modelo.lotes
+    assert [len(r) for r in resultados] == [2, 1, 0], resultados
+
+    # Cada rostro conserva su frame y su caja: la clase sigue al brillo de su franja
+    emociones = [[rostro['emotion'] for rostro in r] for r in resultados]
+    assert emociones == [[EMOTION_CLASSES[40 // 37], EMOTION_CLASSES[120 // 37]], [EMOTION_CLASSES[200 // 37]], []], emociones
+    assert resultados[0][0]['box'] == [16, 24, 144, 216], resultados[0][0]['box']
+    assert abs(resultados[1][0]['confidence'] - 0.94) < 1e-6, resultados[1][0]
+    assert sorted(resultados[1][0]['all_predictions']) == sorted(EMOTION_CLASSES), resultados[1][0]
+
+
+def test_sin_rostros_no_llama_al_modelo():
+    """Sin rostros detectados el modelo de emociones no se llama"""
+    from face_pipeline import process_frames_for_emotion
+
+    modelo = ModeloSimulado()
+    resultados = process_frames_for_emotion([frame_de_prueba([90])] * 2, DetectorSimulado([[0, 1, 0.1, 0, 0, 1, 1]]), modelo)
+    assert resultados == [[], []], resultados
+    assert modelo.lotes == [], modelo.lotes
+
+
+def test_cajas_de_las_detecciones():
+    """Las detecciones se filtran por umbral, se escalan al tamaño de su frame y se limitan a él"""
+    from face_pipeline import detections_to_boxes
+
+    detecciones = np.array([
+        [1, 1, 0.9, 0.1, 0.2, 0.5, 0.6],
+        [0, 1, 0.2, 0.1, 0.1, 0.2, 0.2],    # bajo el umbral
+        [0, 1, 0.7, -0.1, 0.5, 1.2, 1.0],   # fuera del frame: se limita
+        [1, 1, 0.5, 0.0, 0.0, 0.25, 0.25],
+    ], np.float32).reshape(1, 1, -1, 7)
+    cajas = detections_to_boxes(detecciones, [(100, 200), (480, 640)])
+    assert [c.tolist() for c in cajas] == [[[0, 50, 200, 100]], [[64, 96, 320, 288], [0, 0, 160, 120]]], cajas
+
+
+def test_recortes_vectorizados():
+    """crop_faces da los mismos recortes 48x48 que convertir y redimensionar cada rostro"""
+    import cv2
+    from face_pipeline import FACE_SIZE, crop_faces
+
+    rng = np.random.default_rng(1)
+    frames = [rng.integers(0, 255, (240, 320, 3), dtype=np.uint8) for _ in range(3)]
+    cajas = [
+        np.array([[10, 10, 110, 120], [100, 20, 200, 140]]),   # rostros juntos: región común
+        np.array([[0, 0, 40, 40], [270, 190, 320, 240]]),      # rostros dispersos: recorte por rostro
+        np.array([[50, 50, 50, 90]]),                          # caja vacía: se descarta
+    ]
+    lote, duenos, validas = crop_faces(frames, cajas)
+    assert lote.shape == (4, FACE_SIZE, FACE_SIZE, 1) and lote.dtype == np.float32, lote.shape
+    assert duenos.tolist() == [0, 0, 1, 1], duenos
+    assert validas.tolist() == [c for caja in cajas[:2] for c in caja.tolist()], validas
+
+    for rostro, dueno, (x0, y0, x1, y1) in zip(lote, duenos.tolist(), validas.tolist()):
+        gris = cv2.cvtColor(frames[dueno][y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        esperado = cv2.resize(gris, (FACE_SIZE, FACE_SIZE)).astype(np.float32)
+        assert np.array_equal(rostro[..., 0], esperado), (dueno, x0, y0)
+
+
+def test_dimensiones_desde_la_cabecera():
+    """Las dimensiones de JPEG (base y progresivo) y PNG se leen sin decodificar la imagen"""
+    import cv2
+    from frame_decoding import image_dimensions
+
+    frame = np.zeros((90, 160, 3), np.uint8)
+    assert image_dimensions(cv2.imencode('.jpg', frame)[1].tobytes()) == (160, 90)
+    progresivo = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_PROGRESSIVE, 1])[1].tobytes()
+    assert image_dimensions(progresivo) == (160, 90)
+    assert image_dimensions(cv2.imencode('.png', frame)[1].tobytes()) == (160, 90)
+    assert image_dimensions(b'no es una imagen') is None
+
+
+def test_decodificacion_reducida():
+    """Un frame mayor que la resolución útil se decodifica reducido y las cajas se reescalan"""
+    import cv2
+    from frame_decoding import decode_frame, scale_results
+
+    grande = cv2.imencode('.jpg', np.zeros((1080, 1920, 3), np.uint8))[1].tobytes()
+    frame, escala = decode_frame(grande, max_useful_size=640)
+    assert frame.shape == (540, 960, 3) and escala == (2.0, 2.0), (frame.shape, escala)
+    frame, escala = decode_frame(grande, max_useful_size=300)
+    assert frame.shape == (270, 480, 3) and escala == (4.0, 4.0), (frame.shape, escala)
+    frame, escala = decode_frame(grande)
+    assert frame.shape == (1080, 1920, 3) and escala == (1.0, 1.0), (frame.shape, escala)
+
+    resultados = scale_results([{'box': [10, 20, 30, 41]}, {'error': 'sin caja'}], (2.0, 2.0))
+    assert resultados == [{'box': [20, 40, 60, 82]}, {'error': 'sin caja'}], resultados
+
+
+def test_tamano_de_entrada_por_frame():
+    """Los frames con distinto tamaño de entrada van en blobs separados y un solo lote al modelo"""
+    from face_pipeline import process_frames_for_emotion
+
+    class DetectorPorTamano(DetectorSimulado):
+        def setInput(self, blob):
+            self.tamanos = getattr(self, 'tamanos', []) + [(blob.shape[0], blob.shape[2])]
+
+        def forward(self):
+            self.llamadas += 1
+            # Un rostro por frame del blob
+            return np.array([[k, 1, 0.9, 0.2, 0.2, 0.8, 0.8] for k in range(self.tamanos[-1][0])],
+                            np.float32).reshape(1, 1, -1, 7)
+
+    detector = DetectorPorTamano([])
+    modelo = ModeloSimulado()
+    frames = [frame_de_prueba([90])] * 3
+    resultados = process_frames_for_emotion(frames, detector, modelo, input_sizes=[160, None, 160],
+                                            default_input_size=300)
+    assert sorted(detector.tamanos) == [(1, 300), (2, 160)], detector.tamanos
+    assert modelo.lotes == [3], modelo.lotes
+    assert [len(r) for r in resultados] == [1, 1, 1], resultados
+
+
+def test_planificador_agrupa_frames():
+    """Los frames encolados a la vez se procesan en lotes de hasta max_batch_size"""
+    from inference_scheduler import InferenceScheduler
+
+    lotes = []
+
+    def procesar(frames, cajas, tamanos):
+        lotes.append(len(frames))
+        return [[{'frame': frame, 'tamano': tamano}] for frame, tamano in zip(frames, tamanos)]
+
+    planificador = InferenceScheduler(procesar, max_batch_size=4, max_wait_ms=200)
+    futuros = [planificador.submit(n, input_size=100 + n) for n in range(10)]
+    planificador.start()
+    resultados = [futuro.result(timeout=5) for futuro in futuros]
+
+    assert resultados == [[{'frame': n, 'tamano': 100 + n}] for n in range(10)], resultados
+    assert lotes == [4, 4, 2], lotes
+    stats = planificador.get_stats()
+    assert stats['batches_processed'] == 3 and stats['frames_processed'] == 10, stats
+    assert stats['batch_size_histogram'] == {'2': 1, '4': 2}, stats
+
+
+def test_planificador_propaga_errores():
+    """Si el lote falla cada request recibe la excepción y el planificador sigue atendiendo"""
+    from inference_scheduler import InferenceScheduler
+
+    def procesar(frames, cajas, tamanos):
+        if 'falla' in frames:
+            raise RuntimeError('lote fallido')
+        return [[frame] for frame in frames]
+
+    planificador = InferenceScheduler(procesar, max_batch_size=8, max_wait_ms=50)
+    futuros = [planificador.submit(frame) for frame in ('a', 'falla')]
+    planificador.start()
+    errores = []
+    for futuro in futuros:
+        try:
+            futuro.result(timeout=5)
+        except RuntimeError as e:
+            errores.append(str(e))
+    assert errores == ['lote fallido', 'lote fallido'], errores
+    assert planificador.submit('b').result(timeout=5) == ['b']
+    assert planificador.get_stats()['errors'] == 1, planificador.get_stats()
+
+
+def test_backend_desconocido():
+    """Un backend desconocido se rechaza con la lista de opciones"""
+    from inference_backends import backend_available, load_emotion_backend
+
+    assert not backend_available('caffe')
+    try:
+        load_emotion_backend('caffe', 'modelo.caffemodel')
+        error = None
+    except ValueError as e:
+        error = str(e)
+    assert error is not None and 'keras, tflite, onnx' in error, error
+
+
+def modelo_onnx_lineal(ruta, pesos):
+    """Guarda un modelo ONNX (N, 48, 48, 1) -> softmax(x @ pesos) con lote dinámico"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    grafo = helper.make_graph(
+        [
+            helper.make_node('Reshape', ['input', 'forma'], ['plano']),
+            helper.make_node('MatMul', ['plano', 'pesos'], ['logits']),
+            helper.make_node('Softmax', ['logits'], ['output'], axis=1),
+        ],
+        'emociones',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, ['N', 48, 48, 1])],
+        [helper.make_tensor_value_info('output', TensorProto.FLOAT, ['N', 7])],
+        [numpy_helper.from_array(np.array([-1, 48 * 48], np.int64), 'forma'),
+         numpy_helper.from_array(pesos, 'pesos')]
+    )
+    modelo = helper.make_model(grafo, opset_imports=[helper.make_opsetid('', 13)])
+    modelo.ir_version = 8
+    onnx.save(modelo, ruta)
+
+
+def test_backend_onnx():
+    """El backend de ONNX Runtime acepta lotes de cualquier tamaño y retorna (N, 7)"""
+    from inference_backends import backend_available, load_emotion_backend
+
+    if not backend_available('onnx') or importlib.util.find_spec('onnx') is None:
+        print("   onnx u onnxruntime no instalados: se omite")
+        return
+
+    rng = np.random.default_rng(0)
+    pesos = rng.normal(0, 0.01, (48 * 48, 7)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'modelFEC.onnx')
+        modelo_onnx_lineal(ruta, pesos)
+        backend = load_emotion_backend('onnx', ruta, num_threads=1)
+
+        for tamano in (1, 5):
+            lote = rng.uniform(0, 255, (tamano, 48, 48, 1)).astype(np.float32)
+            salida = backend.predict(lote)
+            logits = lote.reshape(tamano, -1) @ pesos
+            esperado = np.exp(logits - logits.max(axis=1, keepdims=True))
+            esperado /= esperado.sum(axis=1, keepdims=True)
+            assert salida.shape == (tamano, 7), salida.shape
+            assert np.allclose(salida, esperado, atol=1e-5), (salida, esperado)
+
+        # El pipeline usa el backend como a cualquier modelo
+        from face_pipeline import EMOTION_CLASSES, process_frames_for_emotion
+        resultados = process_frames_for_emotion(
+            [frame_de_prueba([90])], DetectorSimulado([[0, 1, 0.9, 0.1, 0.1, 0.9, 0.9]]), backend
+        )
+        assert len(resultados[0]) == 1 and resultados[0][0]['emotion'] in EMOTION_CLASSES, resultados
+
+
+RUTA_VARIANTE = """
+import json, os
+from config import Config
+print(json.dumps({backend: os.path.basename(Config.emotion_model_path(backend)) for backend in ('keras', 'tflite', 'onnx')}))
+"""
+
+
+def test_variante_del_modelo():
+    """EMOTION_MODEL_VARIANT elige el archivo TFLite de la variante cuantizada"""
+    assert ejecutar_script(RUTA_VARIANTE, {'EMOTION_MODEL_VARIANT': 'INT8'}) == {
+        'keras': 'modelFEC.h5', 'tflite': 'modelFEC_int8.tflite', 'onnx': 'modelFEC.onnx'
+    }
+    assert ejecutar_script(RUTA_VARIANTE, {'EMOTION_MODEL_VARIANT': 'float16'})['tflite'] == 'modelFEC_float16.tflite'
+
+
+def test_cuantizacion_int8():
+    """La entrada float se lleva a la escala INT8 del tensor (con saturación) y la salida vuelve a float"""
+    from inference_backends import TFLiteBackend
+
+    detalles = {'quantization': (0.5, -10), 'dtype': np.int8}
+    entrada = np.array([0.0, 1.2, 100.0, -100.0], np.float32)
+    cuantizada = TFLiteBackend._quantize(entrada, detalles)
+    assert cuantizada.dtype == np.int8, cuantizada.dtype
+    assert cuantizada.tolist() == [-10, -8, 127, -128], cuantizada.tolist()
+
+    salida = TFLiteBackend._dequantize(np.array([-128, -10, 0, 127], np.int8), {'quantization': (1 / 256, -128)})
+    assert salida.dtype == np.float32 and np.allclose(salida, [0, 118 / 256, 0.5, 255 / 256]), salida
+
+
+def test_reporte_de_concordancia():
+    """El reporte cuenta por clase del modelo float cuántas predicciones de la variante coinciden"""
+    from quantize_model import concordancia_por_clase
+
+    referencia = np.eye(7, dtype=np.float32)[[0, 0, 3, 3, 3, 6]]
+    salida = np.eye(7, dtype=np.float32)[[0, 1, 3, 3, 5, 6]] * 0.9
+    reporte = concordancia_por_clase(referencia, salida)
+    assert reporte['global'] == 66.67, reporte
+    assert reporte['por_clase']['angry'] == {'muestras': 2, 'concordancia': 50.0}, reporte
+    assert reporte['por_clase']['happy'] == {'muestras': 3, 'concordancia': 66.67}, reporte
+    assert reporte['por_clase']['surprise'] == {'muestras': 1, 'concordancia': 100.0}, reporte
+    assert reporte['por_clase']['sad'] == {'muestras': 0, 'concordancia': None}, reporte
+
+
+def test_ciclo_de_vida_de_los_modelos():
+    """La nueva versión se publica después de calentarse; si falla, la vigente sigue"""
+    from model_manager import ModelManager, warm_up
+
+    eventos = []
+
+    def cargar(spec):
+        if spec['version'] == 'rota':
+            raise RuntimeError('archivo corrupto')
+        eventos.append(('carga', spec['version']))
+        return DetectorSimulado([[0, 1, 0.9, 0.2, 0.2, 0.8, 0.8]]), ModeloSimulado()
+
+    def calentar(detector, modelo):
+        # Durante el calentamiento la versión aún no está publicada
+        eventos.append(('calentamiento', manager.current().version if manager.current() else None))
+        warm_up(detector, modelo, [160, 224], max_batch_size=4, runs=1)
+
+    manager = ModelManager(cargar, calentar)
+    assert not manager.ready and manager.get_status()['state'] == 'idle'
+    v1 = manager.load({'version': 'v1', 'model_path': 'modelo.h5'})
+    v2 = manager.load({'version': 'v2', 'model_path': 'modelo.h5'})
+    assert eventos == [('carga', 'v1'), ('calentamiento', None), ('carga', 'v2'), ('calentamiento', 'v1')], eventos
+    # El calentamiento pasó por cada tamaño del detector y por los lotes de 1 y del máximo
+    assert v2.faceNet.llamadas == 2 and sorted(v2.emotionModel.lotes) == [1, 1, 1, 1, 4], v2.emotionModel.lotes
+
+    try:
+        manager.load({'version': 'rota', 'model_path': 'modelo.h5'})
+        error = None
+    except RuntimeError as e:
+        error = str(e)
+    estado = manager.get_status()
+    assert error == 'archivo corrupto', error
+    assert manager.current() is v2 and v1 is not v2, manager.current()
+    assert estado['state'] == 'ready' and estado['swaps'] == 1 and estado['failed_loads'] == 1, estado
+    assert estado['last_error'] == 'archivo corrupto', estado
+
+
+def escena(x, y, alto=480, ancho=640, semilla=0):
+    """Frame con un fondo fijo y un parche con textura de 120x120 en (x, y)"""
+    import cv2
+    rng = np.random.default_rng(semilla)
+    fondo = cv2.GaussianBlur(rng.integers(0, 255, (alto, ancho, 3), dtype=np.uint8), (31, 31), 0)
+    parche = cv2.GaussianBlur(np.random.default_rng(99).integers(0, 255, (120, 120, 3), dtype=np.uint8), (5, 5), 0)
+    fondo[y:y + 120, x:x + 120] = parche
+    return fondo
+
+
+def test_seguimiento_de_rostros():
+    """El tracker sigue el rostro entre detecciones y fuerza una nueva cada redetect_interval frames"""
+    from face_tracker import FaceTracker
+
+    tracker = FaceTracker(redetect_interval=4, min_score=0.6)
+    assert tracker.track(escena(200, 150)) is None  # Sin detección previa
+    tracker.reset(escena(200, 150), [[200, 150, 320, 270]])
+
+    cajas = [tracker.track(escena(200 + 8 * k, 150 + 4 * k)) for k in (1, 2, 3)]
+    for k, caja in zip((1, 2, 3), cajas):
+        esperada = [200 + 8 * k, 150 + 4 * k, 320 + 8 * k, 270 + 4 * k]
+        assert caja is not None and len(caja) == 1, cajas
+        # El seguimiento corre a la mitad de resolución: error de hasta 2 px por coordenada
+        assert all(abs(a - b) <= 2 for a, b in zip(caja[0], esperada)), (caja, esperada)
+
+    # Al cuarto frame toca una detección completa
+    assert tracker.track(escena(232, 166)) is None
+    assert (tracker.tracked_frames, tracker.detected_frames) == (3, 1)
+
+
+def test_seguimiento_pierde_el_rostro():
+    """Si el rostro desaparece o cambia la resolución el tracker pide una detección"""
+    from face_tracker import FaceTracker
+
+    tracker = FaceTracker(redetect_interval=10, min_score=0.6)
+    tracker.reset(escena(200, 150), [[200, 150, 320, 270]])
+    sin_rostro = escena(200, 150)
+    sin_rostro[150:270, 200:320] = escena(0, 0, semilla=5)[300:420, 300:420]
+    assert tracker.track(sin_rostro) is None
+    assert tracker.track(escena(100, 100, alto=360, ancho=480)) is None
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🧠 PRUEBAS DEL PIPELINE DE INFERENCIA", [
+        test_un_solo_llamado_al_modelo, test_sin_rostros_no_llama_al_modelo, test_cajas_de_las_detecciones,
+        test_recortes_vectorizados, test_dimensiones_desde_la_cabecera, test_decodificacion_reducida,
+        test_tamano_de_entrada_por_frame, test_planificador_agrupa_frames,
+        test_planificador_propaga_errores, test_backend_desconocido, test_backend_onnx, test_variante_del_modelo,
+        test_cuantizacion_int8, test_reporte_de_concordancia, test_ciclo_de_vida_de_los_modelos,
+        test_seguimiento_de_rostros, test_seguimiento_pierde_el_rostro
+    ])
@@ -0,0 +1,148 @@
+"""
+Prueba de la línea de tiempo compacta de emociones (emotion_timeline.py)
+- encode/decode conserva códigos, desplazamientos en ms y confianzas (con la precisión
+  de float16) y rechaza intervalos que no caben en un delta uint32 (~49.7 días)
+- Con SESSION_TIMELINE_PRUNE_ROWS los rollups recalculados con rebuild() desde las líneas
+  de tiempo coinciden con los calculados desde las filas sin podar
+Ejecutar con: python test_linea_de_tiempo.py  (o con pytest)
+"""
+
+from datetime import datetime, timedelta
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+# Un float16 en [0, 1] redondea con un error de a lo sumo 2**-12
+TOLERANCIA_FLOAT16 = 2 ** -12
+
+RECALCULAR_ROLLUPS = """
+import json
+from datetime import datetime, timedelta
+import app
+import emotion_rollups
+from models import db, EmocionDetectada, EmocionResumenDiario
+from utilidades_pruebas import sembrar
+
+semilla = sembrar(sesiones_por_paciente=2)
+psicologo_id, sesiones, headers = semilla.psicologo_id, semilla.sesion_ids, semilla.headers
+
+cliente = app.app.test_client()
+# Emociones de varios días (cruzan la medianoche) con confianzas que float16 no representa exactas
+inicio = datetime(2024, 5, 1, 22, 0)
+emociones = ['happy', 'sad', 'neutral', 'angry']
+for numero, sesion_id in enumerate(sesiones):
+    lote = [{
+        'emotion': emociones[(i * 7 + numero) % len(emociones)],
+        'confidence': round(((i * 37 + numero * 11) % 1000) / 1000 + 0.0003, 4),
+        'timestamp': (inicio + timedelta(days=numero, seconds=i * 97)).isoformat()
+    } for i in range(300)]
+    cliente.post(f'/api/sesiones/{sesion_id}/emociones/lote', json={'emociones': lote}, headers=headers)
+    cliente.put(f'/api/sesiones/{sesion_id}/finalizar', json={'duracion_minutos': 10}, headers=headers)
+
+with app.app.app_context():
+    filas = db.session.query(EmocionDetectada).count()
+    emotion_rollups.rebuild(psicologo_id)
+    db.session.commit()
+    rollups = sorted(
+        [str(fila.dia), fila.emotion, fila.cantidad, fila.suma_confianza]
+        for fila in db.session.query(EmocionResumenDiario).filter(EmocionResumenDiario.psicologo_id == psicologo_id)
+    )
+print(json.dumps({'filas': filas, 'rollups': rollups}))
+"""
+
+
+def ejecutar(podar):
+    """Siembra, finaliza las sesiones y recalcula los rollups en un intérprete nuevo"""
+    return ejecutar_script(RECALCULAR_ROLLUPS, {
+        'EMOTION_BUFFER_ENABLED': 'False',
+        'SESSION_TIMELINE_ENABLED': 'True',
+        'SESSION_TIMELINE_PRUNE_ROWS': str(podar)
+    })
+
+
+def test_codificar_y_decodificar():
+    """Los códigos, desplazamientos y confianzas sobreviven a encode/decode"""
+    import numpy as np
+    import emotion_timeline
+
+    inicio = datetime(2024, 5, 1, 12, 0)
+    emociones = ['happy', 'sad', 'happy', 'fear', 'neutral']
+    confianzas = [0.1234, 0.9876, 0.5, 0.3333, 1.0]
+    timestamps = [inicio + timedelta(milliseconds=ms) for ms in (0, 1, 500, 500, 86_400_000)]
+
+    # Las etiquetas existentes conservan su código; las nuevas se agregan al final
+    encoded = emotion_timeline.encode(emociones, confianzas, timestamps, labels=['sad', 'neutral'])
+    assert encoded['labels'] == ['sad', 'neutral', 'happy', 'fear'], encoded['labels']
+    assert encoded['count'] == 5 and encoded['end_offset_ms'] == 86_400_000, encoded
+
+    decoded = emotion_timeline.decode(encoded['codes'], encoded['confidences'], encoded['deltas'])
+    assert decoded['codes'].tolist() == [2, 0, 2, 3, 1], decoded['codes']
+    assert decoded['offsets_ms'].tolist() == [0, 1, 500, 500, 86_400_000], decoded['offsets_ms']
+    assert np.allclose(decoded['confidences'], confianzas, rtol=0, atol=TOLERANCIA_FLOAT16), decoded['confidences']
+
+    columns = emotion_timeline.to_columns(decoded, encoded['labels'], encoded['start'])
+    assert columns['emotion'] == emociones, columns['emotion']
+    assert columns['timestamp'] == [t.isoformat(timespec='milliseconds') for t in timestamps], columns['timestamp']
+
+
+def test_continuar_linea_de_tiempo():
+    """Una línea de tiempo continuada decodifica igual que una codificada de una vez"""
+    import emotion_timeline
+
+    inicio = datetime(2024, 5, 1, 12, 0)
+    timestamps = [inicio + timedelta(seconds=s) for s in (0, 2, 3, 10)]
+    primera = emotion_timeline.encode(['happy', 'sad'], [0.5, 0.6], timestamps[:2])
+    resto = emotion_timeline.encode(
+        ['sad', 'fear'], [0.7, 0.8], timestamps[2:],
+        labels=primera['labels'], start=primera['start'], end_offset_ms=primera['end_offset_ms']
+    )
+    completa = emotion_timeline.encode(['happy', 'sad', 'sad', 'fear'], [0.5, 0.6, 0.7, 0.8], timestamps)
+    assert primera['codes'] + resto['codes'] == completa['codes']
+    assert primera['deltas'] + resto['deltas'] == completa['deltas']
+    assert resto['end_offset_ms'] == completa['end_offset_ms'] == 10_000
+
+
+def test_delta_fuera_de_rango():
+    """Un intervalo de hasta 2**32 - 1 ms se codifica; uno mayor se rechaza en lugar de truncarse"""
+    import emotion_timeline
+
+    inicio = datetime(2024, 5, 1, 12, 0)
+    maximo = 2 ** 32 - 1
+    encoded = emotion_timeline.encode(
+        ['happy', 'sad'], [0.5, 0.5], [inicio, inicio + timedelta(milliseconds=maximo)]
+    )
+    decoded = emotion_timeline.decode(encoded['codes'], encoded['confidences'], encoded['deltas'])
+    assert decoded['offsets_ms'].tolist() == [0, maximo], decoded['offsets_ms']
+
+    for emociones, timestamps, opciones in (
+        (['happy', 'sad'], [inicio, inicio + timedelta(milliseconds=maximo + 1)], {}),
+        (['happy', 'sad'], [inicio, inicio + timedelta(days=50)], {}),
+        # Al continuar, el primer delta se mide desde el final de la línea de tiempo
+        (['happy'], [inicio + timedelta(days=51)], {'start': inicio, 'end_offset_ms': 86_400_000}),
+    ):
+        try:
+            emotion_timeline.encode(emociones, [0.5] * len(emociones), timestamps, **opciones)
+            rechazado = False
+        except ValueError:
+            rechazado = True
+        assert rechazado, timestamps
+
+
+def test_rebuild_con_filas_podadas():
+    """rebuild() desde las líneas de tiempo de filas podadas coincide con el cálculo desde las filas"""
+    sin_podar = ejecutar(False)
+    podado = ejecutar(True)
+    assert sin_podar['filas'] == 600, sin_podar['filas']
+    assert podado['filas'] == 0, podado['filas']
+    print(f"   {len(sin_podar['rollups'])} filas de rollup")
+    assert len(podado['rollups']) == len(sin_podar['rollups']), (podado['rollups'], sin_podar['rollups'])
+    for (dia, emocion, cantidad, suma), esperado in zip(podado['rollups'], sin_podar['rollups']):
+        # Conteos exactos; las sumas de confianza vienen de float16 en la línea de tiempo
+        assert [dia, emocion, cantidad] == esperado[:3], ([dia, emocion, cantidad], esperado)
+        assert abs(suma - esperado[3]) <= cantidad * TOLERANCIA_FLOAT16, (dia, emocion, suma, esperado[3])
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🧬 PRUEBAS DE LA LÍNEA DE TIEMPO DE EMOCIONES", [
+        test_codificar_y_decodificar, test_continuar_linea_de_tiempo, test_delta_fuera_de_rango,
+        test_rebuild_con_filas_podadas
+    ])
@@ -0,0 +1,81 @@
+"""
+Prueba de paginación por cursor (keyset) de los listados
+Siembra sesiones con fecha y sin fecha (fecha_sesion NULL) y recorre el listado de
+sesiones página por página: las páginas juntas deben traer exactamente las mismas
+sesiones, en el mismo orden, que el listado completo sin paginar.
+Ejecutar con: python test_listados.py  (o con pytest)
+"""
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+PAGINAR_SESIONES = """
+import json, sys
+from datetime import datetime, timedelta
+import app
+from models import db, Sesion
+from utilidades_pruebas import sembrar
+
+limite = int(sys.argv[1])
+inicio = datetime(2024, 3, 1, 10, 0)
+# Dos sesiones con la misma fecha: el orden lo desempata el id
+fechas = [inicio, inicio + timedelta(days=1), inicio + timedelta(days=1), inicio + timedelta(days=2), None, None, inicio]
+semilla = sembrar(sesiones_por_paciente=len(fechas))
+sin_fecha = [sesion_id for sesion_id, fecha in zip(semilla.sesion_ids, fechas) if fecha is None]
+with app.app.app_context():
+    for sesion_id, fecha in zip(semilla.sesion_ids, fechas):
+        db.session.execute(db.update(Sesion).where(Sesion.id == sesion_id).values(fecha_sesion=fecha))
+    db.session.commit()
+
+headers = semilla.headers
+url = f'/api/sesiones/psicologo/{semilla.psicologo_id}'
+cliente = app.app.test_client()
+completo = cliente.get(url, headers=headers)
+
+paginas = []
+cursor = None
+while len(paginas) <= len(fechas):
+    respuesta = cliente.get(url, headers=headers, query_string={'limit': limite, **({'cursor': cursor} if cursor else {})})
+    if respuesta.status_code != 200:
+        paginas.append({'status': respuesta.status_code})
+        break
+    cuerpo = respuesta.get_json()
+    paginas.append({'status': 200, 'ids': [sesion['id'] for sesion in cuerpo['sesiones']]})
+    cursor = cuerpo.get('siguiente_cursor')
+    if not cursor:
+        break
+
+print(json.dumps({
+    'status': completo.status_code,
+    'completo': [sesion['id'] for sesion in completo.get_json()['sesiones']],
+    'paginas': paginas,
+    'sin_fecha': sin_fecha
+}))
+"""
+
+
+def ejecutar(limite):
+    """Siembra la base de datos en un intérprete nuevo y recorre el listado con limit=limite"""
+    return ejecutar_script(PAGINAR_SESIONES, {'EMOTION_BUFFER_ENABLED': 'False'}, [limite])
+
+
+def test_paginas_con_sesiones_sin_fecha():
+    """Las páginas del listado de sesiones incluyen las sesiones sin fecha, sin repetir ninguna"""
+    for limite in (1, 2, 3):
+        resultado = ejecutar(limite)
+        assert resultado['status'] == 200, resultado
+        assert len(resultado['completo']) == 7, resultado
+        assert all(pagina['status'] == 200 for pagina in resultado['paginas']), resultado
+        paginado = [sesion_id for pagina in resultado['paginas'] for sesion_id in pagina['ids']]
+        print(f"   limit={limite}: {len(resultado['paginas'])} páginas, {len(paginado)} sesiones")
+        assert paginado == resultado['completo'], (limite, resultado)
+
+
+def test_sesiones_sin_fecha_al_final():
+    """Las sesiones sin fecha van al final del listado, de la más nueva a la más antigua"""
+    resultado = ejecutar(2)
+    assert resultado['completo'][-2:] == sorted(resultado['sin_fecha'], reverse=True), resultado
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("📄 PRUEBAS DE PAGINACIÓN DE LISTADOS",
+                     [test_paginas_con_sesiones_sin_fecha, test_sesiones_sin_fecha_al_final])
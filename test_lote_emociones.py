@@ -0,0 +1,122 @@
+"""
+Prueba de la ingesta de emociones por lote (POST /api/sesiones/<id>/emociones/lote)
+- Los ítems válidos se insertan con una sola sentencia y los inválidos se reportan por
+  índice sin descartar el resto
+- Lotes vacíos, sin ítems válidos, demasiado grandes o de una sesión inexistente se
+  rechazan
+- validate_emotion_batch normaliza los timestamps con zona horaria a UTC y rechaza los
+  que están en el futuro
+Ejecutar con: python test_lote_emociones.py  (o con pytest)
+"""
+
+from datetime import datetime
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+GUARDAR_LOTE = """
+import json
+from sqlalchemy import event
+import app
+from models import db, EmocionDetectada
+from utilidades_pruebas import sembrar
+
+semilla = sembrar()
+cliente = app.app.test_client()
+url = f'/api/sesiones/{semilla.sesion_id}/emociones/lote'
+
+def enviar(cuerpo, url=url):
+    respuesta = cliente.post(url, json=cuerpo, headers=semilla.headers)
+    return [respuesta.status_code, respuesta.get_json()]
+
+inserts = []
+with app.app.app_context():
+    event.listen(db.engine, 'before_cursor_execute',
+                 lambda conn, cursor, sql, *args: inserts.append(1) if sql.startswith('INSERT INTO emociones_detectadas') else None)
+
+resultado = {
+    'mixto': enviar({'emociones': [
+        {'emotion': 'happy', 'confidence': 0.9, 'timestamp': '2024-05-01T10:00:00'},
+        {'emotion': '', 'confidence': 0.5},
+        {'emotion': 'sad', 'confidence': 1.5},
+        'no es un objeto',
+        {'emotion': 'sad', 'confidence': 0.4, 'timestamp': '2024-05-01T12:00:00+02:00'},
+        {'emotion': 'fear', 'confidence': 0.3, 'timestamp': 'ayer'},
+    ]}),
+    'lista_directa': enviar([{'emotion': 'neutral', 'confidence': 0.7, 'timestamp': '2024-05-02T09:00:00'}]),
+    'sin_validos': enviar([{'emotion': 'happy', 'confidence': True}]),
+    'vacio': enviar({'emociones': []}),
+    'excedido': enviar([{'emotion': 'happy', 'confidence': 0.5}] * 7),
+    'sin_sesion': enviar([{'emotion': 'happy', 'confidence': 0.5}], url='/api/sesiones/999/emociones/lote'),
+}
+resultado['inserts'] = len(inserts)
+with app.app.app_context():
+    resultado['filas'] = [
+        [fila.emotion, fila.confidence, fila.timestamp.isoformat()]
+        for fila in db.session.query(EmocionDetectada).order_by(EmocionDetectada.timestamp)
+    ]
+print(json.dumps(resultado))
+"""
+
+
+_resultado = None
+
+
+def resultado():
+    global _resultado
+    if _resultado is None:
+        _resultado = ejecutar_script(GUARDAR_LOTE, {'EMOTION_BUFFER_ENABLED': 'False', 'BULK_EMOTIONS_MAX_ITEMS': '6'})
+    return _resultado
+
+
+def test_lote_con_items_invalidos():
+    """Los ítems válidos se guardan en un solo INSERT y los inválidos se reportan por índice"""
+    status, cuerpo = resultado()['mixto']
+    assert status == 201, cuerpo
+    assert (cuerpo['insertadas'], cuerpo['rechazadas']) == (2, 4), cuerpo
+    assert [error['index'] for error in cuerpo['errores']] == [1, 2, 3, 5], cuerpo
+    assert resultado()['lista_directa'][0] == 201, resultado()
+    # Un INSERT por lote aceptado, sin importar cuántas filas tenga
+    assert resultado()['inserts'] == 2, resultado()
+    assert resultado()['filas'] == [
+        ['happy', 0.9, '2024-05-01T10:00:00'],
+        ['sad', 0.4, '2024-05-01T10:00:00'],
+        ['neutral', 0.7, '2024-05-02T09:00:00'],
+    ], resultado()
+
+
+def test_lotes_rechazados():
+    """Lotes sin ítems válidos, vacíos, demasiado grandes o de una sesión inexistente se rechazan"""
+    assert resultado()['sin_validos'][0] == 400, resultado()
+    assert resultado()['sin_validos'][1]['errores'] == [{'index': 0, 'error': 'confidence debe ser numérica'}], resultado()
+    assert resultado()['vacio'][0] == 400, resultado()
+    assert resultado()['excedido'][0] == 413, resultado()
+    assert resultado()['sin_sesion'][0] == 404, resultado()
+
+
+def test_validacion_de_timestamps():
+    """Los timestamps con zona horaria se llevan a UTC y los futuros se rechazan"""
+    from session_recording import validate_emotion_batch
+
+    ahora = datetime(2024, 5, 1, 12, 0)
+    filas, errores = validate_emotion_batch([
+        {'emotion': 'happy', 'confidence': 1},
+        {'emotion': 'sad', 'confidence': 0.5, 'timestamp': '2024-05-01T09:00:00-03:00'},
+        {'emotion': 'sad', 'confidence': 0.5, 'timestamp': '2024-05-01T12:04:00'},
+        {'emotion': 'sad', 'confidence': 0.5, 'timestamp': '2024-05-01T12:06:00'},
+        {'emotion': 'rage', 'confidence': 0.5},
+    ], sesion_id=7, now=ahora, allowed_emotions={'happy', 'sad'})
+
+    assert [(f['emotion'], f['timestamp']) for f in filas] == [
+        ('happy', ahora), ('sad', datetime(2024, 5, 1, 12, 0)), ('sad', datetime(2024, 5, 1, 12, 4))
+    ], filas
+    assert all(f['sesion_id'] == 7 and isinstance(f['confidence'], float) for f in filas), filas
+    assert errores == [
+        {'index': 3, 'error': 'timestamp no puede estar en el futuro'},
+        {'index': 4, 'error': 'emotion desconocida: rage'},
+    ], errores
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("📦 PRUEBAS DE LA INGESTA DE EMOCIONES POR LOTE", [
+        test_lote_con_items_invalidos, test_lotes_rechazados, test_validacion_de_timestamps
+    ])
@@ -0,0 +1,205 @@
+"""
+Prueba del esquema particionado de emociones_detectadas (emotion_partitions.py, EmotionLabel)
+- Los meses y los nombres de las particiones siguen la convención de partition_emotions.py
+- ensure_partitions crea solo las particiones que faltan y rechaza los meses desacoplados
+- EmotionPartitions recuerda los meses verificados y la primera vez crea los siguientes
+- Con enable_emotion_codes() la emoción se guarda como código y se lee como etiqueta
+- EMOTIONS_PARTITIONED requiere PostgreSQL
+Las particiones se prueban con una conexión simulada del catálogo de PostgreSQL; los
+códigos de emoción corren en un intérprete nuevo con una base de datos SQLite temporal.
+Ejecutar con: python test_particiones.py  (o con pytest)
+"""
+
+import re
+from datetime import datetime
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+CODIGOS_DE_EMOCION = """
+import json
+from datetime import datetime
+from sqlalchemy import select, text
+import app
+from models import db, enable_emotion_codes, emotion_label_sql, EmocionDetectada
+from utilidades_pruebas import sembrar
+
+enable_emotion_codes()
+semilla = sembrar()
+with app.app.app_context():
+    for emocion in ('happy', 'sad'):
+        db.session.add(EmocionDetectada(sesion_id=semilla.sesion_id, emotion=emocion, confidence=0.5,
+                                        timestamp=datetime(2024, 5, 1)))
+    db.session.commit()
+    db.session.remove()
+    try:
+        db.session.add(EmocionDetectada(sesion_id=semilla.sesion_id, emotion='rage', confidence=0.5))
+        db.session.commit()
+        desconocida = None
+    except Exception as error:
+        db.session.rollback()
+        desconocida = str(error)
+    resultado = {
+        'guardadas': [list(fila) for fila in db.session.execute(
+            text('SELECT emotion, typeof(emotion) FROM emociones_detectadas ORDER BY id'))],
+        'leidas': [fila.emotion for fila in db.session.query(EmocionDetectada).order_by(EmocionDetectada.id)],
+        'sql': list(db.session.execute(
+            select(emotion_label_sql(EmocionDetectada.emotion)).order_by(EmocionDetectada.id)).scalars()),
+        'desconocida': desconocida,
+    }
+print(json.dumps(resultado))
+"""
+
+SOLO_POSTGRESQL = """
+import json
+try:
+    import config
+    error = None
+except ValueError as e:
+    error = str(e)
+print(json.dumps(error))
+"""
+
+
+class ResultadoSimulado:
+    def __init__(self, filas):
+        self.filas = list(filas)
+
+    def scalars(self):
+        return self.filas
+
+    def scalar(self):
+        return self.filas[0] if self.filas else None
+
+
+class ConexionSimulada:
+    """Catálogo de PostgreSQL simulado: tablas es {nombre: adjunta a emociones_detectadas}"""
+
+    def __init__(self, tablas=None):
+        self.tablas = dict(tablas or {})
+        self.sentencias = []
+
+    def execute(self, sentencia, parametros=None):
+        sql = str(sentencia)
+        self.sentencias.append(sql)
+        if 'pg_inherits' in sql:
+            return ResultadoSimulado(nombre for nombre, adjunta in self.tablas.items() if adjunta)
+        if 'ANY(:names)' in sql:
+            return ResultadoSimulado(nombre for nombre in parametros['names'] if nombre in self.tablas)
+        if sql.startswith('CREATE TABLE IF NOT EXISTS'):
+            nombre = re.search(r'"(\w+)"', sql).group(1)
+            self.tablas.setdefault(nombre, True)
+        return ResultadoSimulado([])
+
+    def execution_options(self, **opciones):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class BaseSimulada:
+    """Sustituto de db para EmotionPartitions: db.engine.connect() da la conexión simulada"""
+
+    def __init__(self, conexion):
+        self.engine = self
+        self.conexion = conexion
+
+    def connect(self):
+        return self.conexion
+
+
+def creadas(conexion):
+    return [sql for sql in conexion.sentencias if sql.startswith('CREATE TABLE')]
+
+
+def test_meses_y_nombres():
+    """Inicio de mes, meses de un rango y nombres de las particiones"""
+    from emotion_partitions import (
+        create_partition_sql, detached_name, month_start, months_between, next_month, partition_month,
+        partition_name
+    )
+
+    assert month_start(datetime(2024, 5, 17, 13, 45)) == datetime(2024, 5, 1)
+    assert next_month(datetime(2024, 12, 1)) == datetime(2025, 1, 1)
+    assert list(months_between(datetime(2024, 11, 20), datetime(2025, 2, 1))) == [
+        datetime(2024, 11, 1), datetime(2024, 12, 1), datetime(2025, 1, 1), datetime(2025, 2, 1)
+    ]
+    assert partition_name(datetime(2024, 5, 1)) == 'emociones_detectadas_2024_05'
+    assert detached_name(datetime(2024, 5, 1)) == 'emociones_detectadas_2024_05_detached'
+    assert partition_month('emociones_detectadas_2024_05') == datetime(2024, 5, 1)
+    assert partition_month('emociones_detectadas_2024_05_detached') is None
+    assert partition_month('emociones_detectadas_default') is None
+    assert create_partition_sql(datetime(2024, 12, 1)) == (
+        'CREATE TABLE IF NOT EXISTS "emociones_detectadas_2024_12" PARTITION OF emociones_detectadas '
+        "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+    )
+
+
+def test_crea_las_particiones_que_faltan():
+    """Solo se crean los meses sin partición; los desacoplados se rechazan sin crear nada"""
+    from emotion_partitions import PartitionDetachedError, ensure_partitions
+
+    conexion = ConexionSimulada({'emociones_detectadas_2024_05': True})
+    assert ensure_partitions(conexion, [datetime(2024, 5, 1), datetime(2024, 6, 1), datetime(2024, 6, 1)]) == [
+        'emociones_detectadas_2024_06'
+    ]
+    assert ensure_partitions(conexion, [datetime(2024, 5, 1), datetime(2024, 6, 1)]) == []
+    assert len(creadas(conexion)) == 1, conexion.sentencias
+
+    for tablas in ({'emociones_detectadas_2024_04_detached': False}, {'emociones_detectadas_2024_04': False}):
+        conexion = ConexionSimulada(tablas)
+        try:
+            ensure_partitions(conexion, [datetime(2024, 4, 1), datetime(2024, 7, 1)])
+            assert False, 'se esperaba PartitionDetachedError'
+        except PartitionDetachedError as error:
+            assert '2024-04' in str(error), error
+        assert creadas(conexion) == [], conexion.sentencias
+
+
+def test_particiones_bajo_demanda():
+    """La primera verificación crea también los meses siguientes; las demás no consultan"""
+    from emotion_partitions import EmotionPartitions, month_start, partition_name, upcoming_months
+
+    conexion = ConexionSimulada()
+    particiones = EmotionPartitions(BaseSimulada(conexion), months_ahead=2, lock_timeout_ms=500)
+    particiones.ensure([datetime(2024, 5, 3), datetime(2024, 5, 20)])
+
+    esperadas = {partition_name(mes) for mes in upcoming_months(2)} | {'emociones_detectadas_2024_05'}
+    assert set(conexion.tablas) == esperadas, conexion.tablas
+    assert conexion.sentencias[0] == 'SET lock_timeout = 500', conexion.sentencias
+
+    sentencias = len(conexion.sentencias)
+    particiones.ensure([datetime(2024, 5, 31), datetime.utcnow()])
+    assert len(conexion.sentencias) == sentencias, conexion.sentencias
+    # Un mes nuevo solo crea ese mes
+    particiones.ensure([datetime(2024, 6, 2)])
+    assert set(conexion.tablas) == esperadas | {partition_name(month_start(datetime(2024, 6, 2)))}, conexion.tablas
+
+
+def test_codigos_de_emocion():
+    """Con códigos la emoción se guarda como entero, se lee como etiqueta y una desconocida falla"""
+    resultado = ejecutar_script(CODIGOS_DE_EMOCION, {'EMOTION_BUFFER_ENABLED': 'False'})
+    from emotion_labels import EMOTION_CODES
+
+    assert resultado['guardadas'] == [
+        [EMOTION_CODES['happy'], 'integer'], [EMOTION_CODES['sad'], 'integer']
+    ], resultado
+    assert resultado['leidas'] == ['happy', 'sad'], resultado
+    assert resultado['sql'] == ['happy', 'sad'], resultado
+    assert 'Emoción desconocida: rage' in resultado['desconocida'], resultado
+
+
+def test_requiere_postgresql():
+    """EMOTIONS_PARTITIONED con SQLite falla al cargar la configuración"""
+    error = ejecutar_script(SOLO_POSTGRESQL, {'EMOTIONS_PARTITIONED': 'True'})
+    assert error == 'EMOTIONS_PARTITIONED requiere PostgreSQL', error
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🗓️  PRUEBAS DE LAS PARTICIONES DE EMOCIONES", [
+        test_meses_y_nombres, test_crea_las_particiones_que_faltan, test_particiones_bajo_demanda,
+        test_codigos_de_emocion, test_requiere_postgresql
+    ])
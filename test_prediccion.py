@@ -0,0 +1,314 @@
+"""
+Prueba de predicción de frames en sesiones en vivo con cada modo del caché de frames
+Cada modo (md5, dhash, phash) corre en un intérprete nuevo con modelos simulados: el
+segundo frame idéntico de una sesión reutiliza el resultado con huellas perceptuales y
+se vuelve a inferir con md5, pero ningún modo debe fallar. Con INFERENCE_WORKERS, si
+ningún worker puede cargar los modelos los frames fallan de inmediato, sin esperar el
+timeout. Un Content-Length mayor que MAX_CONTENT_LENGTH se rechaza sin reservar memoria.
+/predict/frame recibe la imagen en binario (image/jpeg, image/png o multipart) y /predict
+acepta el base64 con o sin prefijo data:. /predict/sesiones/<id> predice y registra la
+emoción dominante del frame en la misma request, con la tasa de muestreo indicada. Un frame grande se decodifica reducido
+y sus cajas se reportan en coordenadas de la imagen original. POST /predict/modelos/recargar publica una
+nueva versión de los modelos con el token de administración.
+Ejecutar con: python test_prediccion.py  (o con pytest)
+"""
+
+from utilidades_pruebas import ENTORNO_INFERENCIA, ejecutar_pruebas, ejecutar_script
+
+PREDECIR_EN_SESION = """
+import json
+from utilidades_pruebas import iniciar_inferencia_simulada, imagen_de_prueba, sembrar
+
+detector, modelo = iniciar_inferencia_simulada()
+import app
+semilla = sembrar()
+
+imagen = imagen_de_prueba()
+cliente = app.app.test_client()
+headers = {**semilla.headers, 'Content-Type': 'image/jpeg'}
+estados = []
+llamadas = modelo.llamadas
+for _ in range(2):
+    respuesta = cliente.post(f'/predict/frame?sesion_id={semilla.sesion_id}', data=imagen, headers=headers)
+    estados.append(respuesta.status_code)
+print(json.dumps({'estados': estados, 'llamadas': modelo.llamadas - llamadas}))
+"""
+
+PREDECIR_BASE64 = """
+import base64, json
+from utilidades_pruebas import iniciar_inferencia_simulada, imagen_de_prueba, sembrar
+
+iniciar_inferencia_simulada()
+import app
+semilla = sembrar()
+imagen = base64.b64encode(imagen_de_prueba()).decode()
+cliente = app.app.test_client()
+resultado = {}
+for nombre, valor in {'data_url': 'data:image/jpeg;base64,' + imagen, 'base64': imagen, 'invalido': 'no-es-base64'}.items():
+    respuesta = cliente.post('/predict', json={'image': valor}, headers=semilla.headers)
+    cuerpo = respuesta.get_json()
+    resultado[nombre] = {'status': respuesta.status_code, 'rostros': len(cuerpo) if isinstance(cuerpo, list) else 0}
+print(json.dumps(resultado))
+"""
+
+CUERPO_DECLARADO_ENORME = """
+import json, resource
+import app
+from utilidades_pruebas import sembrar
+
+semilla = sembrar()
+cliente = app.app.test_client()
+antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# 3 GB declarados en Content-Length, 3 bytes enviados
+respuesta = cliente.post('/predict/frame', data=b'abc', headers={**semilla.headers, 'Content-Type': 'image/jpeg'},
+                         environ_overrides={'CONTENT_LENGTH': str(3 * 2 ** 30)})
+print(json.dumps({
+    'status': respuesta.status_code,
+    'memoria_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - antes) / 1024
+}))
+"""
+
+WORKERS_SIN_MODELOS = """
+import json, sys, time
+import numpy as np
+import inference_workers
+
+espera_s = float(sys.argv[1])
+def cargar_falla(settings):
+    time.sleep(espera_s)
+    raise RuntimeError('modelo no encontrado')
+inference_workers.load_worker_models = cargar_falla
+
+pool = inference_workers.InferenceWorkerPool(2, {'model_path': 'modelo.keras', 'default_input_size': 224},
+                                             slot_bytes=1 << 20, timeout=30)
+pool.start()
+if not espera_s:
+    # Los workers ya fallaron antes de recibir el frame
+    for _ in range(200):
+        if pool.get_stats()['failed_workers'] == 2:
+            break
+        time.sleep(0.05)
+inicio = time.perf_counter()
+try:
+    pool.submit(np.zeros((32, 32, 3), np.uint8)).result(timeout=30)
+    error = None
+except Exception as e:
+    error = type(e).__name__
+segundos = time.perf_counter() - inicio
+stats = pool.get_stats()
+pool.shutdown()
+print(json.dumps({'error': error, 'segundos': segundos, 'stats': stats}))
+"""
+
+
+PREDECIR_BINARIO = """
+import io, json
+import cv2
+import numpy as np
+from utilidades_pruebas import iniciar_inferencia_simulada, imagen_de_prueba, sembrar
+
+iniciar_inferencia_simulada()
+import app
+semilla = sembrar()
+cliente = app.app.test_client()
+jpeg = imagen_de_prueba()
+png = cv2.imencode('.png', cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))[1].tobytes()
+
+def enviar(**kwargs):
+    respuesta = cliente.post('/predict/frame', headers=semilla.headers, **kwargs)
+    cuerpo = respuesta.get_json()
+    return [respuesta.status_code, len(cuerpo) if isinstance(cuerpo, list) else cuerpo]
+
+print(json.dumps({
+    'jpeg': enviar(data=jpeg, content_type='image/jpeg'),
+    'png': enviar(data=png, content_type='image/png'),
+    'multipart': enviar(data={'image': (io.BytesIO(jpeg), 'frame.jpg')}, content_type='multipart/form-data'),
+    'vacio': enviar(data=b'', content_type='image/jpeg'),
+    'corrupto': enviar(data=b'no es una imagen', content_type='image/jpeg'),
+    'tipo': enviar(data=jpeg, content_type='text/plain')
+}))
+"""
+
+PREDECIR_Y_REGISTRAR = """
+import base64, json
+from utilidades_pruebas import iniciar_inferencia_simulada, imagen_de_prueba, sembrar
+
+iniciar_inferencia_simulada(rostros=2)
+import app
+from models import db, EmocionDetectada
+semilla = sembrar()
+cliente = app.app.test_client()
+headers = {**semilla.headers, 'Content-Type': 'image/jpeg'}
+url = f'/predict/sesiones/{semilla.sesion_id}'
+
+respuestas = []
+for n in range(4):
+    respuesta = cliente.post(f'{url}?sample_rate=0.5', data=imagen_de_prueba(semilla=n), headers=headers)
+    cuerpo = respuesta.get_json()
+    respuestas.append([respuesta.status_code, len(cuerpo['results']), cuerpo['recorded'] and cuerpo['recorded']['emotion']])
+imagen = base64.b64encode(imagen_de_prueba(semilla=9)).decode()
+json_base64 = cliente.post(url, json={'image': imagen}, headers=semilla.headers).get_json()['recorded']
+
+with app.app.app_context():
+    filas = [fila.emotion for fila in db.session.query(EmocionDetectada).filter(EmocionDetectada.sesion_id == semilla.sesion_id)]
+print(json.dumps({
+    'respuestas': respuestas,
+    'json_base64': json_base64 and json_base64['emotion'],
+    'filas': filas,
+    'muestreo_invalido': cliente.post(f'{url}?sample_rate=0', data=imagen_de_prueba(), headers=headers).status_code,
+    'sin_sesion': cliente.post('/predict/sesiones/999', data=imagen_de_prueba(), headers=headers).status_code
+}))
+"""
+
+PREDECIR_FRAME_GRANDE = """
+import json
+from utilidades_pruebas import iniciar_inferencia_simulada, imagen_de_prueba, sembrar
+
+iniciar_inferencia_simulada()
+import app
+semilla = sembrar()
+cliente = app.app.test_client()
+headers = {**semilla.headers, 'Content-Type': 'image/jpeg'}
+imagen = imagen_de_prueba(1920, 1080)
+respuesta = cliente.post('/predict/frame?quality=low', data=imagen, headers=headers)
+invalida = cliente.post('/predict/frame?quality=ultra', data=imagen, headers=headers)
+print(json.dumps({'status': respuesta.status_code, 'cuerpo': respuesta.get_json(), 'invalida': invalida.status_code}))
+"""
+
+RECARGAR_MODELOS = """
+import json
+from utilidades_pruebas import iniciar_inferencia_simulada
+
+iniciar_inferencia_simulada()
+import app
+import inference
+cliente = app.app.test_client()
+url = '/predict/modelos/recargar'
+resultado = {
+    'sin_token': cliente.post(url, json={'version': 'v2'}).status_code,
+    'token_invalido': cliente.post(url, json={'version': 'v2'}, headers={'X-Admin-Token': 'otro'}).status_code,
+    'backend_invalido': cliente.post(url, json={'backend': 'caffe'}, headers={'X-Admin-Token': 'admin'}).status_code,
+    'ruta_fuera': cliente.post(url, json={'model_path': '../modelo.h5'}, headers={'X-Admin-Token': 'admin'}).status_code
+}
+respuesta = cliente.post(url, json={'version': 'v2'}, headers={'X-Admin-Token': 'admin'})
+resultado['recarga'] = respuesta.status_code
+resultado['version'] = inference.get_status()['models']['current']['version']
+print(json.dumps(resultado))
+"""
+
+
+def ejecutar(modo):
+    """Predice dos veces el mismo frame de una sesión con FRAME_CACHE_MODE=modo"""
+    return ejecutar_script(PREDECIR_EN_SESION, {
+        **ENTORNO_INFERENCIA, 'FRAME_CACHE_ENABLED': 'True', 'FRAME_CACHE_MODE': modo
+    })
+
+
+def ejecutar_workers(espera_s):
+    """Envía un frame a un pool cuyos workers fallan al cargar los modelos tras espera_s"""
+    return ejecutar_script(WORKERS_SIN_MODELOS, {'PROCESS_ROLE': 'both'}, [espera_s])
+
+
+def test_sesion_modo_md5():
+    """Con FRAME_CACHE_MODE=md5 la predicción en sesión responde sin usar el caché de frames"""
+    resultado = ejecutar('md5')
+    assert resultado['estados'] == [200, 200], resultado
+    assert resultado['llamadas'] == 2, resultado
+
+
+def test_sesion_modo_dhash():
+    """Con FRAME_CACHE_MODE=dhash el frame repetido reutiliza el resultado"""
+    resultado = ejecutar('dhash')
+    assert resultado['estados'] == [200, 200], resultado
+    assert resultado['llamadas'] == 1, resultado
+
+
+def test_sesion_modo_phash():
+    """Con FRAME_CACHE_MODE=phash el frame repetido reutiliza el resultado"""
+    resultado = ejecutar('phash')
+    assert resultado['estados'] == [200, 200], resultado
+    assert resultado['llamadas'] == 1, resultado
+
+
+def test_predict_base64_sin_prefijo():
+    """/predict acepta la imagen como data URL o como base64 sin prefijo"""
+    resultado = ejecutar_script(PREDECIR_BASE64, ENTORNO_INFERENCIA)
+    assert resultado['data_url'] == {'status': 200, 'rostros': 1}, resultado
+    assert resultado['base64'] == {'status': 200, 'rostros': 1}, resultado
+    assert resultado['invalido']['status'] == 400, resultado
+
+
+def test_content_length_excedido():
+    """Un Content-Length mayor al máximo responde 413 sin reservar un búfer de ese tamaño"""
+    resultado = ejecutar_script(CUERPO_DECLARADO_ENORME, {'PROCESS_ROLE': 'inference'})
+    assert resultado['status'] == 413, resultado
+    assert resultado['memoria_mb'] < 100, resultado
+
+
+def test_frame_binario():
+    """/predict/frame acepta JPEG, PNG y multipart y rechaza cuerpos vacíos, corruptos o de otro tipo"""
+    resultado = ejecutar_script(PREDECIR_BINARIO, ENTORNO_INFERENCIA)
+    assert resultado['jpeg'] == [200, 1], resultado
+    assert resultado['png'] == [200, 1], resultado
+    assert resultado['multipart'] == [200, 1], resultado
+    assert resultado['vacio'][0] == 400, resultado
+    assert resultado['corrupto'][0] == 400, resultado
+    assert resultado['tipo'][0] == 415, resultado
+
+
+def test_predecir_y_registrar():
+    """/predict/sesiones/<id> registra la emoción dominante de uno de cada 1/sample_rate frames"""
+    resultado = ejecutar_script(PREDECIR_Y_REGISTRAR, {**ENTORNO_INFERENCIA, 'EMOTION_BUFFER_ENABLED': 'False'})
+    assert resultado['respuestas'] == [[200, 2, 'happy'], [200, 2, None], [200, 2, 'happy'], [200, 2, None]], resultado
+    assert resultado['json_base64'] == 'happy', resultado
+    assert resultado['filas'] == ['happy'] * 3, resultado
+    assert resultado['muestreo_invalido'] == 400, resultado
+    assert resultado['sin_sesion'] == 404, resultado
+
+
+def test_frame_grande():
+    """Las cajas de un frame 1920x1080 decodificado reducido vuelven a coordenadas originales"""
+    resultado = ejecutar_script(PREDECIR_FRAME_GRANDE, {**ENTORNO_INFERENCIA, 'FRAME_MAX_USEFUL_SIZE': '640'})
+    assert resultado['status'] == 200, resultado
+    assert resultado['invalida'] == 400, resultado
+    # El detector simulado ubica el rostro entre 5% y 77% del ancho y 20% y 60% del alto
+    caja = resultado['cuerpo'][0]['box']
+    esperada = [0.05 * 1920, 0.2 * 1080, 0.77 * 1920, 0.6 * 1080]
+    assert all(abs(a - b) <= 4 for a, b in zip(caja, esperada)), (caja, esperada)
+
+
+def test_recargar_modelos():
+    """/predict/modelos/recargar exige el token de administración y publica la nueva versión"""
+    resultado = ejecutar_script(RECARGAR_MODELOS, {**ENTORNO_INFERENCIA, 'MODEL_ADMIN_TOKEN': 'admin'})
+    assert resultado['sin_token'] == 401 and resultado['token_invalido'] == 401, resultado
+    assert resultado['backend_invalido'] == 400 and resultado['ruta_fuera'] == 400, resultado
+    assert resultado['recarga'] == 200, resultado
+    assert resultado['version'] == 'v2', resultado
+
+
+def test_workers_fallidos():
+    """Sin workers que puedan cargar los modelos el frame se rechaza sin encolarlo"""
+    resultado = ejecutar_workers(0)
+    assert resultado['error'] == 'RuntimeError', resultado
+    assert resultado['segundos'] < 1, resultado
+    assert resultado['stats']['failed_workers'] == 2, resultado
+    assert resultado['stats']['frames_submitted'] == 0, resultado
+    assert resultado['stats']['free_slots'] == 8, resultado
+
+
+def test_workers_fallan_con_frames_encolados():
+    """Los frames encolados mientras los workers cargaban fallan cuando la carga falla"""
+    resultado = ejecutar_workers(0.5)
+    assert resultado['error'] == 'RuntimeError', resultado
+    assert resultado['segundos'] < 10, resultado
+    assert resultado['stats']['in_flight'] == 0, resultado
+    assert resultado['stats']['free_slots'] == 8, resultado
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("🎞️  PRUEBAS DE PREDICCIÓN EN SESIÓN", [
+        test_sesion_modo_md5, test_sesion_modo_dhash, test_sesion_modo_phash, test_predict_base64_sin_prefijo,
+        test_content_length_excedido, test_frame_binario, test_predecir_y_registrar, test_frame_grande, test_recargar_modelos,
+        test_workers_fallidos,
+        test_workers_fallan_con_frames_encolados
+    ])
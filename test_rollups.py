@@ -0,0 +1,88 @@
+"""
+Prueba de los rollups diarios de emociones (emotion_rollups.py)
+- Las emociones insertadas y las sesiones eliminadas actualizan los rollups que leen
+  /api/estadisticas/emociones y el dashboard
+- En una base de datos con historial y la tabla de rollups vacía, la migración
+  (rebuild_emotion_rollups.py --si-vacia) los reconstruye; con rollups ya existentes no
+  los toca
+Ejecutar con: python test_rollups.py  (o con pytest)
+"""
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+ROLLUPS = """
+import json, sys
+import app
+import rebuild_emotion_rollups
+from models import db, EmocionResumenDiario
+from utilidades_pruebas import sembrar
+
+semilla = sembrar(sesiones_por_paciente=2)
+psicologo_id, sesiones, headers = semilla.psicologo_id, semilla.sesion_ids, semilla.headers
+cliente = app.app.test_client()
+
+def estadisticas():
+    cuerpo = cliente.get(f'/api/estadisticas/emociones/{psicologo_id}', headers=headers).get_json()
+    return {fila['emotion']: fila['count'] for fila in cuerpo}
+
+def migrar():
+    sys.argv = ['rebuild_emotion_rollups.py', '--si-vacia']
+    rebuild_emotion_rollups.main()
+    return estadisticas()
+
+for sesion_id, emociones in zip(sesiones, (['happy', 'happy', 'sad'], ['happy', 'angry'])):
+    lote = [{'emotion': emocion, 'confidence': 0.5, 'timestamp': f'2024-05-0{i + 1}T10:00:00'}
+            for i, emocion in enumerate(emociones)]
+    cliente.post(f'/api/sesiones/{sesion_id}/emociones/lote', json={'emociones': lote}, headers=headers)
+resultado = {'insertadas': estadisticas()}
+
+cliente.delete(f'/api/sesiones/{sesiones[1]}', headers=headers)
+resultado['eliminada'] = estadisticas()
+
+# Historial previo a los rollups: la tabla existe pero está vacía
+with app.app.app_context():
+    db.session.query(EmocionResumenDiario).delete()
+    db.session.commit()
+resultado['vacia'] = estadisticas()
+resultado['migrada'] = migrar()
+
+# Con rollups existentes la migración no reconstruye (un cambio manual se conserva)
+with app.app.app_context():
+    db.session.query(EmocionResumenDiario).filter(EmocionResumenDiario.emotion == 'sad').delete()
+    db.session.commit()
+resultado['remigrada'] = migrar()
+print(json.dumps(resultado))
+"""
+
+
+_resultado = None
+
+
+def resultado():
+    global _resultado
+    if _resultado is None:
+        _resultado = ejecutar_script(ROLLUPS, {'EMOTION_BUFFER_ENABLED': 'False'})
+    return _resultado
+
+
+def test_rollups_incrementales():
+    """Insertar emociones y eliminar una sesión actualiza las estadísticas"""
+    assert resultado()['insertadas'] == {'happy': 3, 'sad': 1, 'angry': 1}, resultado()
+    assert resultado()['eliminada'] == {'happy': 2, 'sad': 1}, resultado()
+
+
+def test_migracion_con_tabla_vacia():
+    """La migración reconstruye los rollups de una base de datos con historial"""
+    assert resultado()['vacia'] == {}, resultado()
+    assert resultado()['migrada'] == {'happy': 2, 'sad': 1}, resultado()
+
+
+def test_migracion_con_rollups_existentes():
+    """Con rollups existentes --si-vacia no reconstruye"""
+    assert resultado()['remigrada'] == {'happy': 2}, resultado()
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("📊 PRUEBAS DE LOS ROLLUPS DE EMOCIONES", [
+        test_rollups_incrementales, test_migracion_con_tabla_vacia, test_migracion_con_rollups_existentes
+    ])
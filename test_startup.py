@@ -0,0 +1,87 @@
+"""
+Prueba de regresión del tiempo de arranque de la API
+Verifica que un proceso con PROCESS_ROLE=api importe app.py sin cargar el stack de
+inferencia (TensorFlow, OpenCV, NumPy) y dentro del presupuesto de arranque.
+Ejecutar con: python test_startup.py  (o con pytest)
+Presupuesto configurable con STARTUP_BUDGET_S (por defecto 1.0 segundos)
+"""
+
+import os
+
+from utilidades_pruebas import ejecutar_pruebas, ejecutar_script
+
+STARTUP_BUDGET_S = float(os.environ.get('STARTUP_BUDGET_S', 1.0))
+MEDICIONES = 3
+
+# Módulos que un proceso de API no debe importar
+MODULOS_PESADOS = ['tensorflow', 'keras', 'cv2', 'numpy', 'onnxruntime', 'tflite_runtime', 'inference']
+
+MEDIR_IMPORTACION = """
+import json, sys, time
+inicio = time.perf_counter()
+import app
+duracion = time.perf_counter() - inicio
+print(json.dumps({
+    'segundos': duracion,
+    'pesados': sorted(m for m in %r if m in sys.modules)
+}))
+""" % (MODULOS_PESADOS,)
+
+VERIFICAR_ROLES = """
+import json
+import app
+with app.app.app_context():
+    app.db.create_all()
+cliente = app.app.test_client()
+print(json.dumps({
+    'predict': cliente.post('/predict', json={}).status_code,
+    'recargar': cliente.post('/predict/modelos/recargar', json={}).status_code,
+    'psicologos': cliente.get('/api/psicologos').status_code,
+    'status': cliente.get('/api/status').status_code,
+    'ready': cliente.get('/ready').status_code
+}))
+"""
+
+
+def ejecutar(codigo, rol):
+    """Ejecuta código en un intérprete nuevo con el rol indicado y retorna su salida JSON"""
+    return ejecutar_script(codigo, {'PROCESS_ROLE': rol})
+
+
+def test_api_sin_stack_de_inferencia():
+    """Con PROCESS_ROLE=api no se importa TensorFlow, OpenCV ni NumPy"""
+    medicion = ejecutar(MEDIR_IMPORTACION, 'api')
+    assert medicion['pesados'] == [], f"Módulos de inferencia importados: {medicion['pesados']}"
+
+
+def test_api_presupuesto_de_arranque():
+    """La importación de app.py con PROCESS_ROLE=api cabe en el presupuesto"""
+    # Se toma la mejor de varias mediciones para no depender del ruido de la máquina
+    mejor = min(ejecutar(MEDIR_IMPORTACION, 'api')['segundos'] for _ in range(MEDICIONES))
+    print(f"   Importación de app.py (rol api): {mejor:.3f}s (presupuesto {STARTUP_BUDGET_S:.2f}s)")
+    assert mejor < STARTUP_BUDGET_S, f"Arranque de {mejor:.3f}s excede el presupuesto de {STARTUP_BUDGET_S:.2f}s"
+
+
+def test_endpoints_por_rol():
+    """Cada rol atiende solo sus endpoints"""
+    api = ejecutar(VERIFICAR_ROLES, 'api')
+    assert api['predict'] == 503, api
+    # La recarga de modelos va al proceso de inferencia (nginx envía /predict al puerto 5010)
+    assert api['recargar'] == 503, api
+    assert api['psicologos'] == 200, api
+    assert api['status'] == 200, api
+    assert api['ready'] == 200, api
+
+    inferencia = ejecutar(VERIFICAR_ROLES, 'inference')
+    assert inferencia['predict'] == 401, inferencia
+    # Sin MODEL_ADMIN_TOKEN la recarga queda deshabilitada
+    assert inferencia['recargar'] == 404, inferencia
+    assert inferencia['psicologos'] == 404, inferencia
+    assert inferencia['status'] == 200, inferencia
+    # Sin modelos cargados el proceso de inferencia no se declara listo
+    assert inferencia['ready'] == 503, inferencia
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("⏱️  PRUEBAS DE ARRANQUE POR ROL DE PROCESO",
+                     [test_api_sin_stack_de_inferencia, test_api_presupuesto_de_arranque, test_endpoints_por_rol])
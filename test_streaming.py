@@ -0,0 +1,145 @@
+"""
+Prueba del canal de streaming por WebSocket (streaming.py)
+- El canal se autentica con el primer mensaje y responde una predicción por frame binario
+- Si la inferencia se atrasa solo se procesa el frame más reciente y los obsoletos se
+  cuentan como descartados; los mensajes JSON actualizan las opciones del canal
+- El primer mensaje debe ser JSON con el token
+El caso de extremo a extremo corre en un intérprete nuevo con un servidor local y
+modelos simulados.
+Ejecutar con: python test_streaming.py  (o con pytest)
+"""
+
+import json
+import queue
+import threading
+import time
+
+from utilidades_pruebas import ENTORNO_INFERENCIA, ejecutar_pruebas, ejecutar_script
+
+CANAL_EN_VIVO = """
+import json, threading
+from werkzeug.serving import make_server
+from simple_websocket import Client
+from utilidades_pruebas import iniciar_inferencia_simulada, imagen_de_prueba, sembrar
+
+iniciar_inferencia_simulada()
+import app
+semilla = sembrar()
+servidor = make_server('127.0.0.1', 0, app.app, threaded=True)
+threading.Thread(target=servidor.serve_forever, daemon=True).start()
+url = f'ws://127.0.0.1:{servidor.server_port}/ws/sesiones/{semilla.sesion_id}/stream'
+
+def canal(*mensajes, respuestas=1):
+    cliente = Client.connect(url)
+    try:
+        for mensaje in mensajes:
+            cliente.send(mensaje)
+        return [json.loads(cliente.receive(timeout=10)) for _ in range(respuestas)]
+    finally:
+        cliente.close()
+
+token = json.dumps({'token': semilla.token, 'quality': 'low'})
+resultado = {
+    'sin_token': canal('hola'),
+    'token_invalido': canal(json.dumps({'token': 'x.y.z'})),
+    'prediccion': canal(token, imagen_de_prueba(), respuestas=2),
+    'calidad_invalida': canal(token, json.dumps({'quality': 'ultra'}), imagen_de_prueba(), respuestas=2)
+}
+servidor.shutdown()
+print(json.dumps(resultado))
+"""
+
+
+class CanalSimulado:
+    """WebSocket simulado: receive() lee de una cola y send() guarda los mensajes"""
+
+    def __init__(self):
+        self.entrantes = queue.Queue()
+        self.enviados = []
+
+    def receive(self, timeout=None):
+        mensaje = self.entrantes.get(timeout=timeout)
+        if mensaje is ConnectionError:
+            raise ConnectionError('canal cerrado')
+        return mensaje
+
+    def send(self, mensaje):
+        self.enviados.append(json.loads(mensaje))
+
+
+def test_canal_de_extremo_a_extremo():
+    """El canal autentica una vez y responde cada frame; rechaza tokens y calidades inválidas"""
+    resultado = ejecutar_script(CANAL_EN_VIVO, ENTORNO_INFERENCIA)
+    assert resultado['sin_token'] == [{'type': 'error', 'error': 'Token de acceso requerido'}], resultado
+    assert resultado['token_invalido'][0]['type'] == 'error', resultado
+
+    listo, prediccion = resultado['prediccion']
+    assert listo['type'] == 'ready' and 'low' in listo['quality_tiers'], listo
+    assert prediccion['type'] == 'prediction' and prediccion['frame'] == 1, prediccion
+    assert len(prediccion['results']) == 1 and prediccion['results'][0]['emotion'] == 'happy', prediccion
+
+    error = resultado['calidad_invalida'][1]
+    assert error['type'] == 'error' and 'Calidad inválida' in error['error'], error
+
+
+def test_descarta_frames_obsoletos():
+    """Mientras se infiere un frame, los que llegan se reemplazan por el más reciente"""
+    from streaming import serve_stream
+
+    canal = CanalSimulado()
+    procesando = threading.Event()
+    continuar = threading.Event()
+    procesados = []
+
+    def procesar(datos, opciones):
+        procesados.append((datos, opciones.get('quality')))
+        if len(procesados) == 1:
+            procesando.set()
+            continuar.wait(5)
+        return [{'frame': datos.decode()}]
+
+    hilo = threading.Thread(target=serve_stream, args=(canal, procesar, {'quality': 'low'}), daemon=True)
+    hilo.start()
+    canal.entrantes.put(b'f1')
+    assert procesando.wait(5)
+    for mensaje in (b'f2', b'f3', json.dumps({'quality': 'high'}), b'f4'):
+        canal.entrantes.put(mensaje)
+
+    # Se espera a que el lector consuma los mensajes antes de liberar la inferencia
+    while not canal.entrantes.empty():
+        time.sleep(0.01)
+    time.sleep(0.05)
+    continuar.set()
+    for _ in range(500):
+        if len(canal.enviados) == 2:
+            break
+        time.sleep(0.01)
+    canal.entrantes.put(ConnectionError)
+    hilo.join(5)
+
+    assert procesados == [(b'f1', 'low'), (b'f4', 'high')], procesados
+    # dropped acumula los frames descartados del canal hasta el envío
+    assert [(m['frame'], m['dropped']) for m in canal.enviados] == [(1, 2), (4, 2)], canal.enviados
+    assert not hilo.is_alive()
+
+
+def test_autenticacion_del_canal():
+    """Solo un primer mensaje JSON con token autentica el canal"""
+    from streaming import receive_auth
+
+    for mensaje, esperado in (
+        (json.dumps({'token': 'abc', 'quality': 'low'}), {'token': 'abc', 'quality': 'low'}),
+        (json.dumps({'quality': 'low'}), None),
+        (b'\xff\xd8', None),
+        ('no es json', None),
+        (json.dumps(['abc']), None),
+    ):
+        canal = CanalSimulado()
+        canal.entrantes.put(mensaje)
+        assert receive_auth(canal, timeout=1) == esperado, mensaje
+
+
+if __name__ == "__main__":
+    ejecutar_pruebas("📡 PRUEBAS DEL CANAL DE STREAMING", [
+        test_canal_de_extremo_a_extremo, test_descarta_frames_obsoletos, test_autenticacion_del_canal
+    ])
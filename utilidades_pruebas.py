@@ -0,0 +1,177 @@
+"""
+Utilidades comunes de las pruebas (test_*.py)
+Cada caso corre en un intérprete nuevo: la configuración se lee del entorno al importar
+app.py, así que cada combinación de variables necesita su propio proceso. ejecutar_script
+lo lanza con una base de datos SQLite temporal y retorna el JSON de su última línea;
+dentro del script, sembrar() crea las tablas, un psicólogo con sus pacientes y sesiones
+y su token, e iniciar_inferencia_simulada() reemplaza el detector y el modelo de
+emociones por versiones simuladas que cuentan sus llamadas. ejecutar_pruebas es el
+main() de los archivos de prueba.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date
+from types import SimpleNamespace
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def ejecutar_script(codigo, env=None, args=(), carpeta=None, timeout=120):
+    """Ejecuta codigo en un intérprete nuevo y retorna el JSON de su última línea de salida.
+
+    Por defecto el proceso tiene PROCESS_ROLE=api y una base de datos SQLite en carpeta
+    (temporal si no se indica); env agrega o reemplaza variables de entorno.
+    """
+    if carpeta is None:
+        with tempfile.TemporaryDirectory() as temporal:
+            return ejecutar_script(codigo, env, args, temporal, timeout)
+
+    entorno = dict(os.environ)
+    entorno['PROCESS_ROLE'] = 'api'
+    entorno['DATABASE_URL'] = f"sqlite:///{os.path.join(carpeta, 'prueba.db')}"
+    entorno.update(env or {})
+    resultado = subprocess.run(
+        [sys.executable, '-c', codigo, *[str(arg) for arg in args]], cwd=BASE_DIR, env=entorno,
+        capture_output=True, text=True, timeout=timeout
+    )
+    assert resultado.returncode == 0, resultado.stderr[-2000:]
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+def sembrar(num_pacientes=1, sesiones_por_paciente=1, usuario='prueba'):
+    """Crea las tablas, un psicólogo, sus pacientes y sus sesiones (dentro del script de prueba).
+
+    Retorna psicologo_id, paciente_ids, sesion_ids, sesion_id (la última sesión), token y
+    headers con el token. Desactiva el límite de requests de la aplicación.
+    """
+    import app
+    from models import db, Psicologo, Paciente, Sesion
+    from auth_utils import generate_token
+
+    app.limiter.enabled = False
+    with app.app.app_context():
+        db.create_all()
+        psicologo = Psicologo(nombre_completo='Dra. Prueba', cedula_profesional=usuario.upper(),
+                              especializacion='Clínica', telefono='5550000000',
+                              email=f'{usuario}@example.com', nombre_usuario=usuario)
+        psicologo.set_password('prueba')
+        db.session.add(psicologo)
+        db.session.flush()
+        paciente_ids, sesion_ids = [], []
+        for n in range(num_pacientes):
+            paciente = Paciente(nombre_completo=f'Paciente {n}', fecha_nacimiento=date(1990, 1, 1),
+                                telefono='5550000000', email=f'p{n}@example.com', psicologo_id=psicologo.id)
+            db.session.add(paciente)
+            db.session.flush()
+            paciente_ids.append(paciente.id)
+            for _ in range(sesiones_por_paciente):
+                sesion = Sesion(paciente_id=paciente.id, psicologo_id=psicologo.id)
+                db.session.add(sesion)
+                db.session.flush()
+                sesion_ids.append(sesion.id)
+        db.session.commit()
+        token = generate_token(psicologo.id)
+        semilla = SimpleNamespace(
+            psicologo_id=psicologo.id, paciente_ids=paciente_ids, sesion_ids=sesion_ids,
+            sesion_id=sesion_ids[-1] if sesion_ids else None, token=token,
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        db.session.remove()
+    return semilla
+
+
+# Variables de entorno de un proceso con inferencia en el mismo proceso y modelos simulados
+ENTORNO_INFERENCIA = {
+    'PROCESS_ROLE': 'both',
+    'INFERENCE_WORKERS': '0',
+    'INFERENCE_BACKEND': 'keras',
+    'MODEL_WARMUP_RUNS': '0'
+}
+
+
+def iniciar_inferencia_simulada(rostros=1, emocion=3):
+    """Carga modelos simulados en inference.py e inicia la inferencia (dentro del script de prueba).
+
+    El detector encuentra `rostros` rostros por frame, uno al lado del otro, y el modelo
+    clasifica todos con el índice `emocion`. Retorna (detector, modelo): sus atributos de
+    clase llamadas y rostros cuentan las llamadas y los rostros procesados.
+    """
+    import time
+    import numpy as np
+    import inference_backends
+    inference_backends.backend_available = lambda name: True
+
+    class DetectorSimulado:
+        llamadas = 0
+
+        def setInput(self, blob):
+            self.frames = blob.shape[0]
+
+        def forward(self):
+            DetectorSimulado.llamadas += 1
+            ancho = 0.9 / rostros
+            return np.array([
+                [frame, 1, 0.9, 0.05 + k * ancho, 0.2, 0.05 + k * ancho + ancho * 0.8, 0.6]
+                for frame in range(self.frames) for k in range(rostros)
+            ], np.float32).reshape(1, 1, -1, 7)
+
+    class ModeloSimulado:
+        llamadas = 0
+        rostros = 0
+
+        def predict(self, entradas, verbose=0):
+            ModeloSimulado.llamadas += 1
+            ModeloSimulado.rostros += len(entradas)
+            salida = np.zeros((len(entradas), 7), np.float32)
+            salida[:, emocion] = 1
+            return salida
+
+    import inference
+    inference.model_manager._loader = lambda spec: (DetectorSimulado(), ModeloSimulado())
+    inference.INFERENCE_AVAILABLE = True
+    # La aplicación se importa antes de iniciar la inferencia, como en run_server.py
+    import app
+    inference.start()
+    for _ in range(100):
+        if inference.models_ready():
+            break
+        time.sleep(0.05)
+    return DetectorSimulado, ModeloSimulado
+
+
+def imagen_de_prueba(ancho=320, alto=240, semilla=0):
+    """JPEG de un frame con textura (las huellas perceptuales no son triviales)"""
+    import cv2
+    import numpy as np
+    frame = cv2.GaussianBlur(
+        np.random.default_rng(semilla).integers(0, 255, (alto, ancho, 3), dtype=np.uint8), (15, 15), 0
+    )
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def ejecutar_pruebas(titulo, pruebas):
+    """Ejecuta las pruebas, imprime PASS/FAIL por prueba y termina con el código de salida"""
+    print("=" * 60)
+    print(titulo)
+    print("=" * 60)
+
+    resultados = {}
+    for prueba in pruebas:
+        print(f"\n🔍 {prueba.__doc__}")
+        try:
+            prueba()
+            resultados[prueba.__name__] = True
+        except AssertionError as e:
+            print(f"   ❌ {e}")
+            resultados[prueba.__name__] = False
+
+    print("\n" + "=" * 60)
+    for nombre, paso in resultados.items():
+        print(f"{'✅ PASS' if paso else '❌ FAIL'} - {nombre}")
+    print("=" * 60)
+
+    sys.exit(0 if all(resultados.values()) else 1)